@@ -0,0 +1,179 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+
+import discord
+
+from metrics import RollingStats, current_trace
+
+ACTION_BUCKET_CONCURRENCY = int(os.getenv("ACTION_BUCKET_CONCURRENCY", "5"))  # Requests in flight per route bucket
+ACTION_GLOBAL_CONCURRENCY = int(os.getenv("ACTION_GLOBAL_CONCURRENCY", "40"))  # Discord allows 50 requests/s per bot
+ACTION_MAX_RETRIES = int(os.getenv("ACTION_MAX_RETRIES", "3"))
+ACTION_RETRY_BASE = 1.0  # Seconds; doubled on every retry
+ACTION_MAX_BUCKETS = 2000  # Idle buckets beyond this are forgotten, oldest first
+
+
+def channel_bucket(channel, action: str) -> str:
+    """Bucket key for a route whose major parameter is a channel."""
+    return f"channel:{channel.id}:{action}"
+
+
+def guild_bucket(guild, action: str) -> str:
+    """Bucket key for a route whose major parameter is a guild."""
+    return f"guild:{guild.id}:{action}"
+
+
+def user_bucket(user, action: str) -> str:
+    """Bucket key for a route on a user: DMs to them, or edits of the bot's own account."""
+    return f"user:{user.id}:{action}"
+
+
+def _retry_after(error: discord.HTTPException) -> float:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Bucket:
+    __slots__ = (
+        "semaphore", "queued", "in_flight", "blocked_until",
+        "wait_times", "calls", "retries", "throttled", "failures",
+    )
+
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.queued = 0
+        self.in_flight = 0
+        self.blocked_until = 0.0  # Monotonic time the bucket is paused until after a 429
+        self.wait_times = RollingStats(200)
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
+
+class ActionExecutor:
+    """
+    Runs every Discord REST mutation the bot makes, grouped by route
+    bucket (e.g. edits of one channel, role changes in one guild). That
+    includes replies, sends and progress edits of the bot's own messages,
+    which go through DiscordAgent.send_message, reply_to and edit_message.
+    Only the answers to the ! diagnostic commands in bot.py are sent
+    directly with ctx.send.
+
+    Each bucket has its own concurrency cap, and all buckets share a global
+    cap, so a bulk operation in one guild can't starve another. A 429
+    pauses the whole bucket for its Retry-After and is retried with
+    exponential backoff. 5xx errors are retried only for calls marked
+    idempotent (PUT/PATCH/DELETE routes): discord.py has already retried
+    them, and a create that failed after the server applied it would
+    otherwise be made twice.
+    """
+
+    def __init__(self, bucket_concurrency: int = ACTION_BUCKET_CONCURRENCY,
+                 global_concurrency: int = ACTION_GLOBAL_CONCURRENCY,
+                 max_retries: int = ACTION_MAX_RETRIES):
+        self.bucket_concurrency = bucket_concurrency
+        self.max_retries = max_retries
+        self._global = asyncio.Semaphore(global_concurrency)
+        self._buckets = OrderedDict()  # bucket key -> _Bucket, least recently used first
+
+    def _bucket(self, key: str) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.bucket_concurrency)
+            self._prune()
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def _prune(self):
+        excess = len(self._buckets) - ACTION_MAX_BUCKETS
+        if excess <= 0:
+            return
+        for key in list(self._buckets):
+            bucket = self._buckets[key]
+            if not bucket.queued and not bucket.in_flight:
+                del self._buckets[key]
+                excess -= 1
+                if excess <= 0:
+                    return
+
+    async def run(self, bucket_key: str, func, *args, idempotent: bool = False, **kwargs):
+        """
+        Awaits func(*args, **kwargs) within the bucket's limits and returns
+        its result. Pass idempotent=True for calls that are safe to repeat.
+        """
+        bucket = self._bucket(bucket_key)
+        enqueued_at = time.monotonic()
+        bucket.queued += 1
+        try:
+            await bucket.semaphore.acquire()
+        finally:
+            bucket.queued -= 1
+        bucket.in_flight += 1
+        bucket.calls += 1
+        try:
+            for attempt in range(self.max_retries + 1):
+                pause = bucket.blocked_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                if attempt == 0:
+                    bucket.wait_times.add(time.monotonic() - enqueued_at)
+                try:
+                    async with self._global:
+                        trace = current_trace.get()
+                        if trace is None:
+                            return await func(*args, **kwargs)
+                        with trace.span("rest." + bucket_key.rsplit(":", 1)[-1]):
+                            return await func(*args, **kwargs)
+                except discord.HTTPException as e:
+                    retryable = e.status == 429 or (idempotent and e.status >= 500)
+                    if not retryable or attempt == self.max_retries:
+                        bucket.failures += 1
+                        raise
+                    bucket.retries += 1
+                    delay = max(_retry_after(e), ACTION_RETRY_BASE * 2 ** attempt * random.uniform(0.5, 1.0))
+                    if e.status == 429:
+                        bucket.throttled += 1
+                        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + delay)
+                    else:
+                        await asyncio.sleep(delay)
+        finally:
+            bucket.in_flight -= 1
+            bucket.semaphore.release()
+
+    def stats(self) -> dict:
+        """Per-bucket queue depth, in-flight count, wait times and retry counts."""
+        return {
+            key: {
+                "queued": bucket.queued,
+                "in_flight": bucket.in_flight,
+                "calls": bucket.calls,
+                "retries": bucket.retries,
+                "throttled": bucket.throttled,
+                "failures": bucket.failures,
+                "wait_p50": bucket.wait_times.percentile(50),
+                "wait_p95": bucket.wait_times.percentile(95),
+            }
+            for key, bucket in self._buckets.items()
+        }
+
+    def report(self, limit: int = 10) -> str:
+        """Renders the busiest buckets for the !actionstats command."""
+        stats = self.stats()
+        if not stats:
+            return "No Discord actions have run yet."
+        busiest = sorted(stats.items(), key=lambda item: (item[1]["queued"], item[1]["calls"]), reverse=True)
+        lines = [f"**Discord actions** ({len(stats)} buckets)"]
+        for key, bucket in busiest[:limit]:
+            lines.append(
+                f"• {key}: {bucket['queued']} queued, {bucket['in_flight']} in flight, "
+                f"{bucket['calls']} calls, wait p50 {bucket['wait_p50']:.2f}s / p95 {bucket['wait_p95']:.2f}s, "
+                f"{bucket['retries']} retries, {bucket['throttled']} rate limited, {bucket['failures']} failed"
+            )
+        return "\n".join(lines)
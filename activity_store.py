@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_activity (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    messages INTEGER NOT NULL DEFAULT 0,
+    media INTEGER NOT NULL DEFAULT 0,
+    reactions INTEGER NOT NULL DEFAULT 0,
+    links INTEGER NOT NULL DEFAULT 0,
+    mentions INTEGER NOT NULL DEFAULT 0,
+    last_message_id INTEGER,
+    PRIMARY KEY (guild_id, channel_id)
+);
+CREATE TABLE IF NOT EXISTS member_activity (
+    guild_id INTEGER NOT NULL,
+    member_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    messages INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, member_id)
+);
+"""
+
+
+class ActivityStore:
+    """
+    On-disk SQLite store for activity aggregates. Each channel row carries the
+    ID of the last message folded into it, so a restart only has to read
+    history after that checkpoint.
+
+    Methods are blocking; callers on the event loop should run them through
+    asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = "activity.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def load_guild(self, guild_id: int):
+        """Returns (channel_rows, member_rows) previously saved for a guild."""
+        with self._lock:
+            channels = self._conn.execute(
+                "SELECT channel_id, name, messages, media, reactions, links, mentions, last_message_id "
+                "FROM channel_activity WHERE guild_id = ?",
+                (guild_id,),
+            ).fetchall()
+            members = self._conn.execute(
+                "SELECT member_id, name, messages FROM member_activity WHERE guild_id = ?",
+                (guild_id,),
+            ).fetchall()
+        return channels, members
+
+    def save_guild(self, guild_id: int, channel_rows: list, member_rows: list):
+        """Replaces a guild's saved aggregates in a single transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO channel_activity "
+                "(guild_id, channel_id, name, messages, media, reactions, links, mentions, last_message_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(guild_id, *row) for row in channel_rows],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO member_activity (guild_id, member_id, name, messages) "
+                "VALUES (?, ?, ?, ?)",
+                [(guild_id, *row) for row in member_rows],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,447 @@
+import asyncio
+import datetime
+import heapq
+import logging
+import os
+import time
+from collections import Counter, deque
+
+import discord
+
+from activity_store import ActivityStore
+
+logger = logging.getLogger("discord")
+
+ACTIVITY_DB_PATH = os.getenv("ACTIVITY_DB_PATH", "activity.db")
+FLUSH_INTERVAL = 30  # Seconds between writes of dirty guilds to the store
+SUMMARY_CACHE_TTL = 60  # Seconds a rendered summary may be reused without new activity
+
+# History scans fan out across channels. The concurrency cap keeps us well
+# under the global REST rate limit; the per-channel caps bound how long the
+# slowest channel can hold up a sync (0 disables a cap).
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "5"))
+SCAN_CHANNEL_MESSAGE_CAP = int(os.getenv("SCAN_CHANNEL_MESSAGE_CAP", "0"))
+SCAN_CHANNEL_TIME_BUDGET = float(os.getenv("SCAN_CHANNEL_TIME_BUDGET", "0"))
+
+
+def count_message(msg: discord.Message):
+    """Returns the (media, reactions, links, mentions) counters for a single message."""
+    media = len(msg.attachments)
+    reactions = sum(reaction.count for reaction in msg.reactions)
+    links = 1 if "http://" in msg.content or "https://" in msg.content else 0
+    mentions = len(msg.mentions) + len(msg.role_mentions) + len(msg.channel_mentions)
+    return media, reactions, links, mentions
+
+
+class ChannelActivity:
+    """Running counters for a single text channel."""
+
+    __slots__ = ("name", "messages", "media", "reactions", "links", "mentions", "last_message_id")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.messages = 0
+        self.media = 0
+        self.reactions = 0
+        self.links = 0
+        self.mentions = 0
+        self.last_message_id = None  # Checkpoint: newest message folded into the counters
+
+
+class ChannelScan:
+    """Counters collected by a single channel's history scan, merged into the guild when it finishes."""
+
+    def __init__(self, channel: discord.TextChannel):
+        self.channel = channel
+        self.counters = ChannelActivity(channel.name)
+        self.member_messages = Counter()
+        self.member_names = {}
+        self.truncated = False  # Hit the message cap or time budget
+
+    def add_message(self, msg: discord.Message):
+        media, reactions, links, mentions = count_message(msg)
+        counters = self.counters
+        counters.messages += 1
+        counters.media += media
+        counters.reactions += reactions
+        counters.links += links
+        counters.mentions += mentions
+        if (counters.last_message_id or 0) < msg.id:
+            counters.last_message_id = msg.id
+        self.member_messages[msg.author.id] += 1
+        self.member_names.setdefault(msg.author.id, msg.author.display_name)
+
+
+class GuildActivity:
+    """Running counters for a single guild, updated from gateway events."""
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.channels = {}  # channel_id -> ChannelActivity
+        self.member_messages = Counter()  # member_id -> message count
+        self.member_names = {}  # member_id -> latest display name
+        self.total_messages = 0
+        self.media = 0
+        self.reactions = 0
+        self.links = 0
+        self.mentions = 0
+        self.bots = 0
+        self.recent_joins = deque()  # (joined_at, member_id), oldest first
+        self.backfilled = False
+        self.scan_progress = None  # (channels_done, channels_total) while a sync is running
+        self.version = 0  # Bumped on every change, used to invalidate cached summaries
+
+    def load(self, channel_rows: list, member_rows: list):
+        """Merges aggregates loaded from the store into the live counters."""
+        for channel_id, name, messages, media, reactions, links, mentions, last_id in channel_rows:
+            channel = self.channels.get(channel_id)
+            if channel is None:
+                channel = self.channels[channel_id] = ChannelActivity(name)
+            channel.messages += messages
+            channel.media += media
+            channel.reactions += reactions
+            channel.links += links
+            channel.mentions += mentions
+            if last_id and (channel.last_message_id or 0) < last_id:
+                channel.last_message_id = last_id
+
+            self.total_messages += messages
+            self.media += media
+            self.reactions += reactions
+            self.links += links
+            self.mentions += mentions
+
+        for member_id, name, messages in member_rows:
+            self.member_messages[member_id] += messages
+            self.member_names.setdefault(member_id, name)
+        self.version += 1
+
+    def rows(self):
+        """Returns (channel_rows, member_rows) in the store's column order."""
+        channel_rows = [
+            (channel_id, c.name, c.messages, c.media, c.reactions, c.links, c.mentions, c.last_message_id)
+            for channel_id, c in self.channels.items()
+        ]
+        member_rows = [
+            (member_id, self.member_names.get(member_id, str(member_id)), count)
+            for member_id, count in self.member_messages.items()
+        ]
+        return channel_rows, member_rows
+
+    def merge_scan(self, scan: ChannelScan):
+        """Folds a finished channel scan into the live counters."""
+        counters = scan.counters
+        channel = self._channel(scan.channel)
+        channel.messages += counters.messages
+        channel.media += counters.media
+        channel.reactions += counters.reactions
+        channel.links += counters.links
+        channel.mentions += counters.mentions
+        if counters.last_message_id and (channel.last_message_id or 0) < counters.last_message_id:
+            channel.last_message_id = counters.last_message_id
+
+        self.total_messages += counters.messages
+        self.media += counters.media
+        self.reactions += counters.reactions
+        self.links += counters.links
+        self.mentions += counters.mentions
+
+        self.member_messages.update(scan.member_messages)
+        for member_id, name in scan.member_names.items():
+            self.member_names.setdefault(member_id, name)
+        self.version += 1
+
+    def _channel(self, channel):
+        activity = self.channels.get(channel.id)
+        if activity is None:
+            activity = self.channels[channel.id] = ChannelActivity(channel.name)
+        else:
+            activity.name = channel.name
+        return activity
+
+    def add_message(self, msg: discord.Message):
+        media, reactions, links, mentions = count_message(msg)
+        channel = self._channel(msg.channel)
+        channel.messages += 1
+        channel.media += media
+        channel.reactions += reactions
+        channel.links += links
+        channel.mentions += mentions
+        if (channel.last_message_id or 0) < msg.id:
+            channel.last_message_id = msg.id
+
+        self.total_messages += 1
+        self.media += media
+        self.reactions += reactions
+        self.links += links
+        self.mentions += mentions
+
+        self.member_messages[msg.author.id] += 1
+        self.member_names[msg.author.id] = msg.author.display_name
+        self.version += 1
+
+    def add_reaction(self, channel, delta: int = 1):
+        self._channel(channel).reactions += delta
+        self.reactions += delta
+        self.version += 1
+
+    def add_member(self, member: discord.Member):
+        if member.bot:
+            self.bots += 1
+        if member.joined_at:
+            self.recent_joins.append((member.joined_at, member.id))
+        self.version += 1
+
+    def remove_member(self, member: discord.Member):
+        if member.bot:
+            self.bots = max(0, self.bots - 1)
+        self.version += 1
+
+    def new_members(self, guild: discord.Guild):
+        """Returns members who joined in the last 24 hours, dropping older entries."""
+        day_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+        while self.recent_joins and self.recent_joins[0][0] <= day_ago:
+            self.recent_joins.popleft()
+        members = []
+        for _, member_id in self.recent_joins:
+            member = guild.get_member(member_id)
+            if member:
+                members.append(member)
+        return members
+
+
+class ActivityTracker:
+    """
+    Keeps live per-guild activity counters so summaries never have to walk
+    the full message history. Counters are fed from on_message,
+    on_reaction_add/remove and on_member_join/remove, and seeded per guild
+    by a sync when the bot starts.
+
+    Aggregates are persisted to an ActivityStore together with a per-channel
+    checkpoint, so a sync only reads messages newer than what was already
+    counted.
+    """
+
+    def __init__(self, store: ActivityStore = None):
+        self.guilds = {}  # guild_id -> GuildActivity
+        self.store = store if store is not None else ActivityStore(ACTIVITY_DB_PATH)
+        self._syncs = {}  # guild_id -> asyncio.Task
+        self._saved_versions = {}  # guild_id -> version last written to the store
+        self._summary_cache = {}  # guild_id -> (version, rendered_at, summary)
+        self._flush_task = None
+
+    def get(self, guild: discord.Guild) -> GuildActivity:
+        activity = self.guilds.get(guild.id)
+        if activity is None:
+            activity = self.guilds[guild.id] = GuildActivity(guild.id)
+        return activity
+
+    def record_message(self, message: discord.Message):
+        if message.guild and isinstance(message.channel, discord.TextChannel):
+            self.get(message.guild).add_message(message)
+
+    def record_reaction(self, reaction: discord.Reaction, delta: int = 1):
+        message = reaction.message
+        if message.guild and isinstance(message.channel, discord.TextChannel):
+            self.get(message.guild).add_reaction(message.channel, delta)
+
+    def record_member_join(self, member: discord.Member):
+        self.get(member.guild).add_member(member)
+
+    def record_member_remove(self, member: discord.Member):
+        self.get(member.guild).remove_member(member)
+
+    def start_sync(self, guild: discord.Guild):
+        """
+        Schedules a history sync for a guild, reusing one that is already
+        running. Safe to call on every on_ready: after the first sync only
+        the messages missed while disconnected are read.
+        """
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        task = self._syncs.get(guild.id)
+        if task is None or task.done():
+            task = self._syncs[guild.id] = asyncio.create_task(self.sync(guild))
+        return task
+
+    async def sync(self, guild: discord.Guild):
+        """
+        Brings the counters up to date with history. Each channel is read
+        from its checkpoint up to the moment the sync started, since anything
+        newer arrives through on_message and is already counted.
+        """
+        activity = self.get(guild)
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+
+        if not activity.backfilled:
+            # First sync: restore saved aggregates and take checkpoints only
+            # from the store, never from live messages seen since startup.
+            channel_rows, member_rows = await asyncio.to_thread(self.store.load_guild, guild.id)
+            checkpoints = {row[0]: row[7] for row in channel_rows}
+            activity.load(channel_rows, member_rows)
+            self._saved_versions[guild.id] = activity.version
+
+            day_ago = started_at - datetime.timedelta(days=1)
+            joins = sorted(
+                (m.joined_at, m.id)
+                for m in guild.members
+                if m.joined_at and day_ago < m.joined_at <= started_at
+            )
+            # The member list already includes anyone add_member saw since
+            # startup, so it replaces those counts rather than adding to them.
+            activity.recent_joins = deque(sorted(set(joins).union(activity.recent_joins)))
+            activity.bots = sum(1 for m in guild.members if m.bot)
+        else:
+            checkpoints = {
+                channel_id: channel.last_message_id
+                for channel_id, channel in activity.channels.items()
+            }
+
+        # Scan channels concurrently and merge each one as soon as it
+        # finishes, so summaries see partial results while the slowest
+        # channel is still paginating.
+        semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+        channels = guild.text_channels
+        scans = [
+            self._scan_channel(channel, checkpoints.get(channel.id), started_at, semaphore)
+            for channel in channels
+        ]
+        activity.scan_progress = (0, len(scans))
+        truncated = 0
+        for done, next_scan in enumerate(asyncio.as_completed(scans), start=1):
+            scan = await next_scan
+            if scan:
+                activity.merge_scan(scan)
+                truncated += scan.truncated
+            activity.scan_progress = (done, len(scans))
+
+        activity.scan_progress = None
+        activity.backfilled = True
+        await self.flush(guild.id)
+        logger.info(
+            f"Activity sync finished for {guild.name} "
+            f"({len(scans)} channels, {truncated} truncated by scan caps)"
+        )
+
+    async def _scan_channel(self, channel, checkpoint, before, semaphore):
+        """
+        Reads one channel's history after its checkpoint, newest first, so
+        that when the message cap or time budget cuts the scan short the
+        most recent activity is the part that gets counted.
+        """
+        scan = ChannelScan(channel)
+        after = discord.Object(id=checkpoint) if checkpoint else None
+        limit = SCAN_CHANNEL_MESSAGE_CAP or None
+        async with semaphore:
+            try:
+                async with asyncio.timeout(SCAN_CHANNEL_TIME_BUDGET or None):
+                    async for msg in channel.history(limit=limit, after=after, before=before, oldest_first=False):
+                        scan.add_message(msg)
+            except TimeoutError:
+                scan.truncated = True
+            except discord.Forbidden:
+                return None
+            except discord.HTTPException as e:
+                logger.warning(f"Activity sync failed for #{channel.name}: {e}")
+        if limit and scan.counters.messages >= limit:
+            scan.truncated = True
+        return scan
+
+    async def flush(self, guild_id: int = None):
+        """Writes changed guilds to the store. Guilds mid-way through their first sync are skipped."""
+        guild_ids = [guild_id] if guild_id is not None else list(self.guilds)
+        for gid in guild_ids:
+            activity = self.guilds.get(gid)
+            # Saving before the first sync completes could move a checkpoint
+            # past messages that haven't been read yet.
+            if activity is None or not activity.backfilled:
+                continue
+            version = activity.version
+            if self._saved_versions.get(gid) == version:
+                continue
+            channel_rows, member_rows = activity.rows()
+            await asyncio.to_thread(self.store.save_guild, gid, channel_rows, member_rows)
+            self._saved_versions[gid] = version
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Failed to save activity counters: {e}")
+
+    def is_syncing(self, guild: discord.Guild) -> bool:
+        task = self._syncs.get(guild.id)
+        return task is not None and not task.done()
+
+    def pending_sync(self, guild: discord.Guild):
+        """
+        Returns the guild's running sync, starting one if the guild has never
+        been backfilled, or None when the live counters are already current.
+        """
+        if self.is_syncing(guild):
+            return self._syncs[guild.id]
+        if not self.get(guild).backfilled:
+            return self.start_sync(guild)
+        return None
+
+    def render_summary(self, guild: discord.Guild) -> str:
+        """Returns the cached summary, rebuilding it only when activity changed or it went stale."""
+        activity = self.get(guild)
+        cached = self._summary_cache.get(guild.id)
+        now = time.monotonic()
+        if cached and cached[0] == activity.version and now - cached[1] < SUMMARY_CACHE_TTL:
+            return cached[2]
+
+        summary = self._build_summary(guild, activity)
+        self._summary_cache[guild.id] = (activity.version, now, summary)
+        return summary
+
+    def _build_summary(self, guild: discord.Guild, activity: GuildActivity) -> str:
+        """Builds the summary message from the in-memory counters."""
+        total_members = guild.member_count or len(guild.members)
+        online_members = len([m for m in guild.members if m.status != discord.Status.offline])
+        new_members = activity.new_members(guild)
+
+        active_channels = [c for c in activity.channels.values() if c.messages]
+        top_channels = heapq.nlargest(5, active_channels, key=lambda c: c.messages)
+        top_members = activity.member_messages.most_common(5)
+
+        summary = []
+        summary.append(f"**📊 Server Activity Summary for {guild.name}**\n")
+        if activity.scan_progress:
+            done, total = activity.scan_progress
+            summary.append(f"_Indexing message history ({done}/{total} channels), counts may be incomplete._\n")
+        elif not activity.backfilled:
+            summary.append("_Still indexing message history, counts may be incomplete._\n")
+
+        # Member Statistics
+        summary.append("**👥 Member Statistics:**")
+        summary.append(f"• Total Members: {total_members}")
+        summary.append(f"• Currently Online: {online_members}")
+        summary.append(f"• Bots: {activity.bots}")
+        summary.append(f"• New Members (24h): {len(new_members)}")
+        if new_members:
+            summary.append(f"• Recent Joins: {', '.join([m.display_name for m in new_members])}")
+
+        # Activity Statistics
+        summary.append("\n**📈 Activity Statistics:**")
+        summary.append(f"• Total Messages: {activity.total_messages}")
+        summary.append(f"• Media Shared: {activity.media}")
+        summary.append(f"• Reactions Added: {activity.reactions}")
+        summary.append(f"• Links Shared: {activity.links}")
+        summary.append(f"• Mentions: {activity.mentions}")
+        summary.append(f"• Active Channels: {len(active_channels)}")
+
+        # Top Channels
+        summary.append("\n**📝 Most Active Channels:**")
+        for channel in top_channels:
+            summary.append(f"• #{channel.name}: {channel.messages} messages")
+
+        # Top Members
+        summary.append("\n**🏆 Most Active Members:**")
+        for member_id, count in top_members:
+            summary.append(f"• {activity.member_names.get(member_id, member_id)}: {count} messages")
+
+        return "\n".join(summary)
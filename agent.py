@@ -1,127 +1,92 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import random
+import time
 from mistralai import Mistral
+from mistralai.models import SDKError
 import discord
 from discord_agent import DiscordAgent
+from command_registry import (
+    REGISTRY,
+    CommandArgumentError,
+    CommandParseError,
+    ParsedCall,
+    find_call,
+    make_tool_call,
+    channel_mention_id,
+    parse_command,
+    parse_tool_call,
+    prompt_section,
+    tool_definitions,
+    user_mention_id,
+    validate,
+)
 import re
-from collections import deque
-from datetime import datetime, timezone
+from channel_context import ChannelContextBuffer
+from conversation_history import (
+    HISTORY_MAX_TURNS,
+    HISTORY_MODE,
+    HISTORY_SUMMARY_TOKENS,
+    HISTORY_TOKEN_BUDGET,
+    ConversationHistory,
+)
+from fast_path import FastPathRouter
+from llm_gateway import GatewayBusy, LLMGateway
+from member_context import MemberContextBuilder, estimate_tokens
+from metrics import RollingStats, StageMetrics, current_trace
+from response_cache import ResponseCache, depends_on_context, normalize_request
+from usage_tracker import BUDGET_EXCEEDED, BUDGET_OK, BUDGET_REDUCED, PromptUsage, UsageTracker
+
+logger = logging.getLogger("discord")
 
 MISTRAL_MODEL = "mistral-large-latest"
 
-POSSIBLE_COMMANDS = [  # (command_name, description, arguments)
-    (
-        "create_channel",
-        "Creates a new channel in the server.",
-        [
-            ("channel_name", "string"),
-            ("channel_type", "optional string: 'text' or 'voice'"),
-            ("category", "optional string"),
-            ("private", "optional boolean"),
-        ],
-    ),
-    (
-        "create_group_chat",
-        "Creates a private thread with the mentioned users.",
-        [("user_mentions", "array")],
-    ),
-    (
-        "invite_user_to_channel",
-        "Add user(s) to exitsing channel.",
-        [("user_mentions", "array"), ("channels_mention", "array")],
-    ),
-    (
-        "mute_member_from_channel",
-        "Mute user(s) in exitsing channel.",
-        [("user_mentions", "array"), ("channels_mention", "array")],
-    ),
-    (
-        "unmute_member_from_channel",
-        "Unmute user(s) in exitsing channel.",
-        [("user_mentions", "array"), ("channels_mention", "array")],
-    ),
-    (
-        "create_poll",
-        "Creates a poll in the channel.",
-        [
-            ("question", "string"),
-            ("answers", "array of strings"),
-            ("duration", "optional int in hours"),
-        ],
-    ),
-    (
-        "change_bot_avatar",
-        "Changes the bot's avatar.",
-        [("bot_mention", "mention"), ("url", "string")],
-    ),
-    (
-        "change_bot_name",
-        "Changes the bot's name.",
-        [("bot_mention", "mention"), ("new_name", "string")],
-    ),
-    (
-        "assign_role",
-        "Assigns a role to a user.",
-        [("member", "mention"), ("role_name", "string")],
-    ),
-    (
-        "create_role",
-        "Creates a new role.",
-        [("role_name", "string")],
-    ),
-    (
-        "revoke_role",
-        "Revokes a role from a user.",
-        [("member", "mention"), ("role_name", "string")],
-    ),
-    (
-        "create_scheduled_event",
-        "Creates a new scheduled event.",
-        [
-            ("event_name", "string"),
-            ("start_datetime", "string (e.g., '2025-03-10 15:30' or '03/10/2025 3:30 PM')"),
-            ("voice_channel", "string (channel mention or ID)"),
-            ("event_topic", "string")
-            
-        ]
-    ),
-    (
-        "summarize_server_activity",
-        "Generates a summary of recent server activity.",
-        []
-    ),
-    (
-        "send_automated_message",
-        "Sends or schedules automated messages.",
-        [
-            ("target_type", "string: 'dm' or 'channel'"),
-            ("target", "mention: user or channel"),
-            ("message", "string"),
-            ("schedule_time", "optional string: time to send message"),
-        ]
-    ),
-    (
-        "send_welcome_message",
-        "Sends a welcome message to a user.",
-        [
-            ("target", "mention"),
-            ("custom_message", "optional string"),
-        ]
-    ),
-    (
-        "change_channel_name",
-        "Changes a channel's name.",
-        [
-            ("channel", "channel mention"),
-            ("new_name", "string"),
-        ]
-    ),
-]
+# "tools" sends commands as structured tool definitions, "text" uses the
+# few-shot prompt below, "ab" picks one at random per request for comparison.
+AGENT_MODE = os.getenv("AGENT_MODE", "tools")
+
+# Stream responses: chat answers are posted early and edited as tokens arrive
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = 1.0  # Seconds between edits of a streamed reply
+
+# Cheaper model that keeps the rolling conversation summary in tokens history mode
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "mistral-small-latest")
+HISTORY_SUMMARY_PROMPT = (
+    "You maintain a running summary of a Discord conversation with a server management bot. "
+    "Merge the new messages into the summary. Keep who asked for what, names, channels, roles "
+    "and anything still unresolved. Reply with the updated summary only, in under 120 words."
+)
+DISCORD_MESSAGE_LIMIT = 2000
+
+# While the output is still a bare identifier it may turn out to be a command name
+_IDENTIFIER_PREFIX_RE = re.compile(r"\s*\w*")
+
+BUSY_REPLY = "I'm handling a lot of requests right now, please try again in a moment."
+OVER_BUDGET_REPLY = "This server has used up today's AI budget, please try again tomorrow."
+
+# Member list budget once a guild is past its soft daily budget; history and channel context are dropped
+REDUCED_MEMBER_TOKEN_BUDGET = 100
+
+VALID_BOT_NAME_RE = re.compile(r"[a-zA-Z0-9_-]+")
+
+TOOLS = tool_definitions()
+
+TOOL_SYSTEM_PROMPT = """
+You are a friendly discord assistant.
+You live on a discord server and help users with their discord usage.
+If the user wants to perform one of the available actions, call the matching tool; otherwise answer normally.
+Pass users as mentions like <@id> and channels as <#id>, using the IDs from the message context.
+When the user refers to themselves, use the sender's ID. Leave out arguments the user did not provide.
+"""
 
 SYSTEM_PROMPT = f"""
 You are a friendly discord assistant. 
 You live on a discord server and help users with their discord usage. You have access to the following
 commands:
-{POSSIBLE_COMMANDS}
+{prompt_section()}
 
 If you think a user wants to use a command, please only respond with the command name and the arguments.
 For example,
@@ -218,405 +183,622 @@ You: send_automated_message(target_type="dm", target=easecord, message="Hi there
 """
 
 
+def _looks_like_chat(content: str) -> bool:
+    """True once streamed text can no longer be the start of a command call."""
+    return bool(content.strip()) and not _IDENTIFIER_PREFIX_RE.fullmatch(content)
+
+
+# Local estimate of the system part of each mode's prompt, tool definitions included
+SYSTEM_TOKENS = {
+    "text": estimate_tokens(SYSTEM_PROMPT),
+    "tools": estimate_tokens(TOOL_SYSTEM_PROMPT) + estimate_tokens(json.dumps(TOOLS)),
+}
+
+# Part of the response cache key, so cached calls don't outlive prompt changes
+PROMPT_VERSION = hashlib.sha256((SYSTEM_PROMPT + TOOL_SYSTEM_PROMPT).encode()).hexdigest()[:12]
+
+
 class MistralAgent:
     def __init__(self, bot):
         MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
         self.client = Mistral(api_key=MISTRAL_API_KEY)
+        self.bot = bot
+        self.gateway = LLMGateway(self.client)  # Adaptive concurrency limit and load shedding
         self.discord_agent = DiscordAgent(bot)
-        self.conversation_history = {}  # guild_id -> deque of messages
-        self.history_limit = 10  # Keep last 10 messages per guild
+        self.member_context = MemberContextBuilder()
+        self.channel_context = ChannelContextBuffer()  # Last few messages of every channel, fed by bot.py
+        self.response_cache = ResponseCache()
+        self.fast_path = FastPathRouter()
+        self.metrics = StageMetrics()  # Per-stage latency histograms for !stats and the metrics endpoint
+        self.usage = UsageTracker()  # Tokens and cost per guild, user and command, and daily budgets
+        # Last 10 messages per guild, or a token-budgeted window plus rolling summary
+        if HISTORY_MODE == "tokens":
+            self.history = ConversationHistory(
+                limit=HISTORY_MAX_TURNS, token_budget=HISTORY_TOKEN_BUDGET, summarizer=self._summarize_history
+            )
+        else:
+            self.history = ConversationHistory()
+        # Command name -> handler, one entry per registry spec
+        self.handlers = {name: getattr(self, f"_cmd_{name}") for name in REGISTRY}
+        self.mode = AGENT_MODE
+        self.mode_stats = {
+            mode: {"latency": RollingStats(), "first_token": RollingStats(), "prompt_tokens": RollingStats()}
+            for mode in ("text", "tools")
+        }
+        self.streaming = LLM_STREAMING
+        self._attachments = {}  # message_id -> attachment bytes read during prefetch
         
     def _add_to_history(self, guild_id: int, message: discord.Message):
         """Add message to conversation history for the guild."""
-        if guild_id not in self.conversation_history:
-            self.conversation_history[guild_id] = deque(maxlen=self.history_limit)
-        
-        self.conversation_history[guild_id].append({
-            'author': message.author.name,
-            'content': message.content,
-            'timestamp': message.created_at.isoformat(),
-        })
+        self.history.add(guild_id, message)
 
     def _get_history(self, guild_id: int) -> str:
         """Get formatted conversation history for the guild."""
-        if guild_id not in self.conversation_history:
-            return ""
-            
-        history = []
-        for msg in self.conversation_history[guild_id]:
-            history.append(f"{msg['author']}: {msg['content']}")
-        return "\n".join(history)
+        return self.history.render(guild_id)
+
+    async def _summarize_history(self, guild_id: int, summary: str, lines: list) -> str:
+        """Folds older conversation lines into the rolling summary using the cheaper model."""
+        if self.usage.budget_state(guild_id) != BUDGET_OK:
+            # Over budget the history isn't sent anyway; drop the lines instead of paying for a summary
+            return summary
+        request = f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n" + "\n".join(lines)
+        response = await self.gateway.complete(
+            model=SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": HISTORY_SUMMARY_PROMPT},
+                {"role": "user", "content": request},
+            ],
+            max_tokens=HISTORY_SUMMARY_TOKENS,
+        )
+        usage = PromptUsage(
+            SUMMARY_MODEL, system=estimate_tokens(HISTORY_SUMMARY_PROMPT), history=estimate_tokens(request)
+        )
+        usage.set_response(response.usage)
+        self.usage.record(guild_id, None, "history_summary", usage)
+        return (response.choices[0].message.content or "").strip()
+
+    async def handle_message(self, message: discord.Message) -> bool:
+        """
+        Everything on_message does with a message after commands are
+        processed: feeds the passive trackers, finishes a pending follow-up
+        question, or runs a request that mentions the bot and replies with
+        the result. Returns True when the message was answered.
+        """
+        self.discord_agent.activity.record_message(message)
+        self.member_context.observe(message)
+        self.channel_context.record(message)
+
+        # Ignore messages from bots (including this one) and ! commands
+        if message.author.bot or message.content.startswith("!"):
+            return False
+        # Replies to a pending follow-up question finish their command without the LLM
+        if await self.discord_agent.resume_session(message):
+            return True
+        if self.bot.user not in message.mentions:
+            return False
+
+        logger.info(f"Processing message from {message.author}: {message.content}")
+        response = await self.run(message)
+        if response:
+            await self.discord_agent.reply_to(message, response)
+        return True
 
     async def run(self, message: discord.Message):
+        trace = self.metrics.trace(message.guild)
+        try:
+            with trace.span("total"):
+                return await self._run(message, trace)
+        finally:
+            trace.finish()
+            # Attachment bytes read by a prefetch whose command never ran
+            self._attachments.pop(message.id, None)
+
+    async def _run(self, message: discord.Message, trace):
         # Add message to history if in a guild
-        if message.guild:
-            self._add_to_history(message.guild.id, message)
-            conversation_history = self._get_history(message.guild.id)
-        else:
-            conversation_history = ""
+        with trace.span("history"):
+            if message.guild:
+                self._add_to_history(message.guild.id, message)
+                conversation_history = self._get_history(message.guild.id)
+            else:
+                conversation_history = ""
+            channel_context = self.channel_context.recent(message.channel.id, exclude_id=message.id)
+
+        # Requests fully determined by their text and mentions skip the LLM
+        with trace.span("fast_path"):
+            fast_call = self.fast_path.match(message, self.bot.user.id)
+        if fast_call is not None:
+            trace.command = fast_call.name
+            return await self._dispatch_traced(message, fast_call, trace)
+
+        # Identical requests (up to who is mentioned) in the same channel
+        # reuse an earlier command call. Requests that lean on the
+        # conversation ("mute him", "do that again") are never cached, since
+        # the same words mean something else once the history differs.
+        cache_key = cached = None
+        with trace.span("cache_lookup"):
+            normalized, bindings = normalize_request(message, self.bot.user.id)
+            if not depends_on_context(normalized):
+                cache_key = ResponseCache.make_key(
+                    normalized,
+                    f"{MISTRAL_MODEL}|{self.mode}|{PROMPT_VERSION}|{bool(message.attachments)}"
+                    f"|{message.guild.id if message.guild else 'dm'}|{message.channel.id}",
+                )
+                cached = self.response_cache.get(cache_key, bindings)
+        if cached is not None:
+            call = ParsedCall(*cached)
+            trace.command = call.name
+            return await self._dispatch_traced(message, call, trace)
+
+        # Past the guild's daily budgets, refuse or send a smaller prompt
+        budget = self.usage.budget_state(message.guild.id if message.guild else None)
+        if budget == BUDGET_EXCEEDED:
+            self.usage.rejected += 1
+            trace.command = "over_budget"
+            return OVER_BUDGET_REPLY
+        reduced = budget == BUDGET_REDUCED
+        if reduced:
+            self.usage.reduced += 1
+            conversation_history = channel_context = ""
 
         # The simplest form of an agent
         # Send the message's content to Mistral's API and return Mistral's response
 
-        channel_members = []
-        if not message.channel.type == discord.ChannelType.private:
-            channel_members = await self.discord_agent.get_users_in_message(message)
-        channel_mentions = await self.discord_agent.get_channel_mentions_in_message(
-            message
-        )
+        # Only the sender, mentioned users and recent speakers, within a token budget
+        with trace.span("member_context"):
+            channel_members = self.member_context.build(
+                message, token_budget=REDUCED_MEMBER_TOKEN_BUDGET if reduced else None
+            )
+        with trace.span("channel_mentions"):
+            channel_mentions = await self.discord_agent.get_channel_mentions_in_message(
+                message
+            )
 
-        # send initial message to Mistral
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": f"""Recent conversation:
+        with trace.span("prompt_build"):
+            user_content = f"""Recent conversation:
 {conversation_history}
 
+Recent messages in this channel:
+{channel_context}
+
 Current message:
 {message.content}
 
 Channel Mentioned: {str(channel_mentions)}
-Channel Members: {str(channel_members)}
-Sender: {message.author.id}"""}
-        ]
-
-        # extract the response from Mistral
-        response = await self.client.chat.complete_async(
-            model=MISTRAL_MODEL,
-            messages=messages,
-        )
-        content = response.choices[0].message.content
-
-        # check if the response contains a command
-        if "create_group_chat" in content:
-            # Check if there are any mentioned users in the mistral response
-            print("content: ", content)
-            if match := re.search(r"user_mentions=\[(.*)\]", content):
-                user_mentions = match.group(1)
-                user_mentions = user_mentions.split(",")
-                user_mentions = [mention.strip() for mention in user_mentions]
-
-                return await self.discord_agent.create_group_chat(
-                    message, user_mentions
-                )
+Channel Members: {channel_members}
+Sender: {message.author.id}"""
+            usage = PromptUsage(
+                MISTRAL_MODEL,
+                history=estimate_tokens(conversation_history),
+                channel_context=estimate_tokens(channel_context),
+                members=estimate_tokens(channel_members),
+                mentions=estimate_tokens(str(channel_mentions)),
+                message=estimate_tokens(message.content),
+            )
 
-        if "create_poll" in content:
-            print("content: ", content)
-            # extract question
-            question_match = re.search(r"question=\"(.+?)\"", content)
-            if not question_match:
-                return "No question found. Please specify the question for the poll."
-            question = question_match.group(1)
-
-            # extract answers
-            answers_match = re.search(r"answers=\[(.*)\]", content)
-            if not answers_match:
-                return "No answers found. Please specify the answers for the poll."
-            answers = answers_match.group(1)
-            answers = answers.split(",")
-            answers = [answer.strip().strip("\"'") for answer in answers]
-
-            # extract duration
-            duration_match = re.search(r"duration=(\d+)", content)
-            if duration_match:
-                duration = int(duration_match.group(1))
-                return await self.discord_agent.create_poll(
-                    message, question, answers, duration
-                )
-            else:
-                return await self.discord_agent.create_poll(message, question, answers)
-
-        if "invite_user_to_channel" in content:
-            # Check if there are any mentioned users and channels in the mistral response
-            channel_mentions = []
-            if match := re.search(r"channel_mentions=\[(.*)\]", content):
-                channel_mentions = match.group(1)
-                channel_mentions = channel_mentions.split(",")
-                channel_mentions = [mention.strip() for mention in channel_mentions]
-            if len(channel_mentions) == 0:
-                return "No channel mentioned. Please specify the channel you want to add new users to."
-            user_mentions = []
-            if match := re.search(r"user_mentions=\[(.*)\]", content):
-                user_mentions = match.group(1)
-                user_mentions = user_mentions.split(",")
-                user_mentions = [mention.strip() for mention in user_mentions]
-            if len(user_mentions) == 0:
-                return "No user mentioned. Please specify the user(s) you want to add to the channel."
-
-            return await self.discord_agent.invite_member_to_channel(message, user_mentions, channel_mentions)
-
-        if "unmute_member_from_channel" in content:
-            # Check if there are any mentioned users and channels in the mistral response
-            channel_mentions = []
-            if match := re.search(r"channel_mentions=\[(.*)\]", content):
-                channel_mentions = match.group(1)
-                channel_mentions = channel_mentions.split(",")
-                channel_mentions = [mention.strip() for mention in channel_mentions]
-            user_mentions = []
-            if match := re.search(r"user_mentions=\[(.*)\]", content):
-                user_mentions = match.group(1)
-                user_mentions = user_mentions.split(",")
-                user_mentions = [mention.strip() for mention in user_mentions]
-            if len(channel_mentions) == 0:
-                return "No channel mentioned. Please specify the channel you want to add new users to."
-            if len(user_mentions) == 0:
-                return "No user mentioned. Please specify the user(s) you want to add to the channel."
-
-            return await self.discord_agent.unmute_member_from_channel(message, user_mentions, channel_mentions)
-
-        if "mute_member_from_channel" in content:
-            # Check if there are any mentioned users and channels in the mistral response
-            channel_mentions = []
-            if match := re.search(r"channel_mentions=\[(.*)\]", content):
-                channel_mentions = match.group(1)
-                channel_mentions = channel_mentions.split(",")
-                channel_mentions = [mention.strip() for mention in channel_mentions]
-            user_mentions = []
-            if match := re.search(r"user_mentions=\[(.*)\]", content):
-                user_mentions = match.group(1)
-                user_mentions = user_mentions.split(",")
-                user_mentions = [mention.strip() for mention in user_mentions]
-            if len(channel_mentions) == 0:
-                return "No channel mentioned. Please specify the channel you want to add new users to."
-            if len(user_mentions) == 0:
-                return "No user mentioned. Please specify the user(s) you want to add to the channel."
-
-            return await self.discord_agent.mute_member_from_channel(message, user_mentions, channel_mentions)
-
-        if "create_channel" in content:
-            # Extract channel name
-            name_match = re.search(r"channel_name=\"(.+?)\"", content)
-            if not name_match:
-                return "No channel name found. Please specify the name for the new channel."
-            channel_name = name_match.group(1)
-
-            # Extract optional channel type
-            channel_type = "text"  # default
-            type_match = re.search(r"channel_type=\"(.+?)\"", content)
-            if type_match:
-                channel_type = type_match.group(1)
-
-            # Extract optional category
-            category = None
-            category_match = re.search(r"category=\"(.+?)\"", content)
-            if category_match:
-                category = category_match.group(1)
-
-            # Extract optional private setting
-            private = False
-            private_match = re.search(r"private=(true|false)", content)
-            if private_match:
-                private = private_match.group(1).lower() == "true"
-
-            return await self.discord_agent.create_channel(
-                message,
-                channel_name,
-                channel_type=channel_type,
-                category=category,
-                private=private,
+        try:
+            call, content, reply = await self._ask(message, user_content, usage)
+        except CommandParseError as e:
+            self._record_usage(message, "parse_error", usage)
+            return f"Sorry, I couldn't understand that command ({e}). Please try rephrasing."
+        except GatewayBusy:
+            trace.command = "busy"
+            return BUSY_REPLY
+        if call is None:
+            # A streamed answer has already been posted
+            trace.command = "chat"
+            self._record_usage(message, "chat", usage)
+            return None if reply is not None else content
+
+        trace.command = call.name
+        self._record_usage(message, call.name, usage)
+        if cache_key is not None:
+            self.response_cache.put(cache_key, call.name, call.args, bindings)
+        result = await self._dispatch_traced(message, call, trace)
+        if reply is not None and result:
+            # Chat text was streamed before the command turned up; replace it with the result
+            await self.discord_agent.edit_message(reply, content=result)
+            return None
+        return result
+
+    async def _dispatch_traced(self, message: discord.Message, call, trace):
+        with trace.span("dispatch"):
+            return await self.dispatch_call(message, call)
+
+    def _record_usage(self, message: discord.Message, command: str, usage: PromptUsage):
+        if usage.responded:
+            self.usage.record(message.guild.id if message.guild else None, message.author.id, command, usage)
+
+    async def _ask(self, message: discord.Message, user_content: str, usage: PromptUsage):
+        """
+        Sends the request to Mistral in the configured mode. Returns
+        (ParsedCall or None, content, streamed reply or None). The call is
+        None when the model gave a chat answer; in streaming mode that
+        answer has already been posted as the returned reply.
+        """
+        if self._pick_mode() == "tools":
+            try:
+                return await self._ask_mode("tools", message, user_content, usage)
+            except SDKError as e:
+                # Bad request usually means the model or account doesn't
+                # support tool calling; anything else is a real failure.
+                if getattr(e, "status_code", None) not in (400, 422):
+                    raise
+                logger.warning(f"Tool mode failed, falling back to text mode: {e}")
+        return await self._ask_mode("text", message, user_content, usage)
+
+    def _pick_mode(self) -> str:
+        if self.mode == "ab":
+            return random.choice(("text", "tools"))
+        return self.mode
+
+    def _request(self, mode: str, user_content: str) -> dict:
+        """Builds the chat request for a mode: few-shot text prompt, or short prompt plus tool definitions."""
+        if mode == "tools":
+            return {
+                "messages": [
+                    {"role": "system", "content": TOOL_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                "tools": TOOLS,
+                "tool_choice": "auto",
+            }
+        return {
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_content},
+            ],
+        }
+
+    async def _ask_mode(self, mode: str, message: discord.Message, user_content: str, usage: PromptUsage):
+        usage.sections["system"] = SYSTEM_TOKENS[mode]
+        if self.streaming:
+            return await self._stream(mode, message, user_content, usage)
+
+        trace = current_trace.get()
+        start = time.perf_counter()
+        response = await self.gateway.complete(model=MISTRAL_MODEL, **self._request(mode, user_content))
+        elapsed = time.perf_counter() - start
+        stats = self.mode_stats[mode]
+        stats["latency"].add(elapsed)
+        if trace is not None:
+            trace.add("llm", elapsed)
+        if response.usage:
+            stats["prompt_tokens"].add(response.usage.prompt_tokens)
+        usage.set_response(response.usage)
+
+        start = time.perf_counter()
+        try:
+            reply = response.choices[0].message
+            content = reply.content or ""
+            if reply.tool_calls:
+                call = parse_tool_call(reply.tool_calls[0])
+                if call is not None:
+                    return call, content, None
+            # No tool call: still accept a command written as text, otherwise it's a chat answer
+            return parse_command(content), content, None
+        finally:
+            if trace is not None:
+                trace.add("parse", time.perf_counter() - start)
+
+    async def _stream(self, mode: str, message: discord.Message, user_content: str, usage: PromptUsage):
+        """
+        Streams the completion. Chat answers are posted as soon as the text
+        can't be a command and then edited at most every
+        STREAM_EDIT_INTERVAL seconds. As soon as a command name shows up,
+        the Discord objects it needs are prefetched while the model is
+        still writing its arguments.
+        """
+        stats = self.mode_stats[mode]
+        start = time.perf_counter()
+        content = ""
+        tool_name = None
+        tool_arguments = []
+        reply = None
+        last_edit = 0.0
+        prefetch = None
+        first_token = True
+
+        async for event in self.gateway.stream(model=MISTRAL_MODEL, **self._request(mode, user_content)):
+            chunk = event.data
+            if first_token:
+                stats["first_token"].add(time.perf_counter() - start)
+                first_token = False
+            if chunk.usage:
+                stats["prompt_tokens"].add(chunk.usage.prompt_tokens)
+                usage.set_response(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            for tool_call in delta.tool_calls or ():
+                tool_name = tool_call.function.name or tool_name
+                arguments = tool_call.function.arguments
+                if arguments:
+                    tool_arguments.append(arguments if isinstance(arguments, str) else json.dumps(arguments))
+            if isinstance(delta.content, str):
+                content += delta.content
+
+            command = tool_name
+            if command is None and reply is None:
+                found = find_call(content)
+                command = found[0] if found else None
+            if command in REGISTRY and prefetch is None:
+                prefetch = asyncio.create_task(self._prefetch(message, command))
+            elif command is None and reply is None and _looks_like_chat(content):
+                reply = await self.discord_agent.reply_to(message, content[:DISCORD_MESSAGE_LIMIT])
+                last_edit = time.monotonic()
+            elif reply is not None and time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+                await self.discord_agent.edit_message(reply, content=content[:DISCORD_MESSAGE_LIMIT])
+                last_edit = time.monotonic()
+
+        elapsed = time.perf_counter() - start
+        stats["latency"].add(elapsed)
+        usage.responded = True
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add("llm", elapsed)
+        if reply is not None:
+            await self.discord_agent.edit_message(reply, content=content[:DISCORD_MESSAGE_LIMIT])
+        if prefetch is not None:
+            await prefetch
+
+        start = time.perf_counter()
+        try:
+            if tool_name:
+                call = make_tool_call(tool_name, "".join(tool_arguments))
+                if call is not None:
+                    return call, content, reply
+            return parse_command(content), content, reply
+        finally:
+            if trace is not None:
+                trace.add("parse", time.perf_counter() - start)
+
+    async def _prefetch(self, message: discord.Message, name: str):
+        """Warms what a command's handler will need: uncached mentioned members and attachments."""
+        guild = message.guild
+        if guild is None:
+            return
+        kinds = {arg.kind for arg in REGISTRY[name].args}
+        try:
+            if kinds & {"mention", "array"}:
+                missing = [user_id for user_id in message.raw_mentions if guild.get_member(user_id) is None]
+                if missing:
+                    await guild.query_members(user_ids=missing[:100], cache=True)
+            if name == "change_bot_avatar" and message.attachments:
+                self._attachments[message.id] = await message.attachments[0].read()
+        except (discord.HTTPException, asyncio.TimeoutError) as e:
+            logger.warning(f"Prefetch for {name} failed: {e}")
+
+    def llm_report(self) -> str:
+        """Compares the LLM modes and reports cache, fast-path and gateway metrics."""
+        lines = [f"**LLM modes** (current: {self.mode})"]
+        for mode, stats in self.mode_stats.items():
+            latency = stats["latency"].summary()
+            first_token = stats["first_token"].summary()
+            tokens = stats["prompt_tokens"].summary()
+            lines.append(
+                f"• {mode}: {latency['count']} calls, "
+                f"prompt tokens p50 {tokens['p50']:.0f} / p95 {tokens['p95']:.0f}, "
+                f"latency p50 {latency['p50']:.2f}s / p95 {latency['p95']:.2f}s, "
+                f"first token p50 {first_token['p50']:.2f}s"
+            )
+        cache = self.response_cache.stats()
+        lines.append(
+            f"• response cache: {cache['size']} entries, {cache['hits']} hits "
+            f"({cache['disk_hits']} from disk), {cache['misses']} misses, "
+            f"hit rate {cache['hit_rate']:.0%}, {cache['evictions']} evicted"
+        )
+        fast = self.fast_path.stats()
+        lines.append(
+            f"• fast path: {fast['hits']}/{fast['attempts']} requests skipped the LLM "
+            f"({fast['hit_rate']:.0%}), {fast['ambiguous']} ambiguous"
+        )
+        channels = self.channel_context.stats()
+        lines.append(f"• channel context: {channels['channels']} channels, {channels['bytes'] / 1024:.0f} KiB")
+        history = self.history.stats()
+        lines.append(
+            f"• history: {history['guilds']} guilds, {history['bytes'] / 1024:.0f} KiB "
+            f"of {history['max_bytes'] / 1024:.0f} KiB, {history['evictions']} evicted, "
+            f"{history['summaries']} summaries ({history['summary_failures']} failed)"
+        )
+        gateway = self.gateway.stats()
+        lines.append(
+            f"• gateway: limit {gateway['limit']:.1f}, {gateway['in_flight']} in flight, "
+            f"{gateway['queue_depth']} queued, wait p50 {gateway['wait_p50']:.2f}s / "
+            f"p95 {gateway['wait_p95']:.2f}s, {gateway['shed']} shed, {gateway['throttled']} rate limited"
+        )
+        return "\n".join(lines)
+
+    async def dispatch_call(self, message: discord.Message, call):
+        """Validates a parsed call against its spec and runs its handler."""
+        try:
+            args = validate(call)
+        except CommandArgumentError as e:
+            return str(e)
+        return await self.handlers[call.name](message, args)
+
+    # Command handlers, one per registry entry. Each receives the validated
+    # arguments from command_registry.validate.
+
+    async def _cmd_create_group_chat(self, message: discord.Message, args: dict):
+        groups = args["groups"] or []
+        if args["user_mentions"]:
+            groups = [args["user_mentions"]] + groups
+        if not groups:
+            return "No user mentioned. Please specify the users for the group chat."
+        if len(groups) == 1:
+            return await self.discord_agent.create_group_chat(message, groups[0])
+        return await self.discord_agent.create_group_chats(message, groups)
+
+    async def _cmd_create_poll(self, message: discord.Message, args: dict):
+        answers = [answer.strip("\"'") for answer in args["answers"]]
+        if args["duration"] is not None:
+            return await self.discord_agent.create_poll(
+                message, args["question"], answers, args["duration"]
             )
+        return await self.discord_agent.create_poll(message, args["question"], answers)
 
-        if "change_bot_avatar" in content:
-            bot_mention_match = re.search(r"bot_mention=<@!?(\d+)>", content)
-            bot_id = int(bot_mention_match.group(1)) if bot_mention_match else None
-            bot_member = message.guild.get_member(bot_id) if bot_id else None
+    async def _cmd_invite_user_to_channel(self, message: discord.Message, args: dict):
+        return await self.discord_agent.invite_member_to_channel(
+            message, args["user_mentions"], args["channel_mentions"], bool(args["shared"])
+        )
 
-            # Get the uploaded image
-            image_data = None
-            if message.attachments:
-                image_data = await message.attachments[0].read()
+    async def _cmd_mute_member_from_channel(self, message: discord.Message, args: dict):
+        return await self.discord_agent.mute_member_from_channel(
+            message, args["user_mentions"], args["channel_mentions"]
+        )
 
-            # If we have a bot mention and an image, change the avatar
-            if bot_member and image_data:
-                return await self.discord_agent.change_bot_avatar(
-                    message, bot_member, image_data
-                )
-            elif not bot_member:
-                await message.channel.send("Please mention the bot whose avatar you want to change.")
-            elif not image_data:
-                await message.channel.send("Please attach an image to change the bot's avatar.")
-            return
+    async def _cmd_unmute_member_from_channel(self, message: discord.Message, args: dict):
+        return await self.discord_agent.unmute_member_from_channel(
+            message, args["user_mentions"], args["channel_mentions"]
+        )
 
-        if "change_bot_name" in content:
-            # Try to extract bot mention and new name
-            bot_mention_match = re.search(r'bot_mention=([^,\)]+)', content)
-            new_name_match = re.search(r'new_name="?([a-zA-Z0-9_-]+)"?', content)  # Only allow valid name characters
-
-            # Get bot member from mention
-            target = None
-            if bot_mention_match:
-                bot_str = bot_mention_match.group(1).strip()
-                # Try mention format first
-                mention_match = re.search(r'<@!?(\d+)>', bot_str)
-                if mention_match:
-                    bot_id = int(mention_match.group(1))
-                    target = message.guild.get_member(bot_id)
-                else:
-                    # Try finding bot by name
-                    bot_name = bot_str.strip('@')
-                    target = discord.utils.get(message.guild.members, name=bot_name, bot=True)
-
-            new_name = new_name_match.group(1) if new_name_match else None
-            
-            # Additional validation
-            if target and not target.bot:
-                await message.channel.send("The specified user is not a bot.")
-                return
-            elif new_name and not 2 <= len(new_name) <= 32:
-                await message.channel.send("Bot name must be between 2 and 32 characters.")
-                return
-
-            if target and target.bot and new_name:
-                return await self.discord_agent.change_bot_name(message, target, new_name)
-            elif not target:
-                await message.channel.send("Please mention or specify the bot you want to rename.")
-                await self.discord_agent.prompt_change_name(message)
-            elif not new_name:
-                await message.channel.send(f"Please specify a valid new name for {target.display_name}.")
-                await self.discord_agent.prompt_change_name(message)
-            return
+    async def _cmd_create_channel(self, message: discord.Message, args: dict):
+        return await self.discord_agent.create_channel(
+            message,
+            args["channel_name"],
+            channel_type=args["channel_type"] or "text",
+            category=args["category"],
+            private=bool(args["private"]),
+        )
 
-        if "assign_role" in content:
-            member_match = re.search(r"member=<@!?(\d+)>", content)
-            role_match = re.search(r"role_name=\"([^\"]+)\"", content)
+    async def _cmd_change_bot_avatar(self, message: discord.Message, args: dict):
+        bot_id = user_mention_id(args["bot_mention"])
+        bot_member = message.guild.get_member(bot_id) if bot_id else None
 
-            member_id = int(member_match.group(1)) if member_match else None
-            role_name = role_match.group(1) if role_match else None
-            member = message.guild.get_member(member_id) if member_id else None
+        # Get the uploaded image, possibly already read while the response streamed
+        image_data = self._attachments.pop(message.id, None)
+        if image_data is None and message.attachments:
+            image_data = await message.attachments[0].read()
 
-            if member and role_name:
-                return await self.discord_agent.assign_role(message, member, role_name)
+        # If we have a bot mention and an image, change the avatar
+        if bot_member and image_data:
+            return await self.discord_agent.change_bot_avatar(
+                message, bot_member, image_data
+            )
+        elif not bot_member:
+            await self.discord_agent.send_message(
+                message.channel, "Please mention the bot whose avatar you want to change."
+            )
+        elif not image_data:
+            await self.discord_agent.send_message(message.channel, "Please attach an image to change the bot's avatar.")
+        return
+
+    async def _cmd_change_bot_name(self, message: discord.Message, args: dict):
+        # Get bot member from mention
+        target = None
+        if args["bot_mention"]:
+            bot_id = user_mention_id(args["bot_mention"])
+            if bot_id:
+                target = message.guild.get_member(bot_id)
             else:
-                await self.discord_agent.handle_assign_role(message, member, role_name)
-                return
-
-        if "create_role" in content:
-            role_match = re.search(r"role_name=\"([^\"]+)\"", content)
-            role_name = role_match.group(1) if role_match else None
-
-            await self.discord_agent.handle_create_role(message, role_name)
+                # Try finding bot by name
+                bot_name = args["bot_mention"].strip("@")
+                target = self.discord_agent.members.find(message.guild, bot_name, bot=True, exact=True)
+
+        # Only allow valid name characters
+        new_name = None
+        if args["new_name"]:
+            name_match = VALID_BOT_NAME_RE.match(args["new_name"])
+            new_name = name_match.group(0) if name_match else None
+
+        # Additional validation
+        if target and not target.bot:
+            await self.discord_agent.send_message(message.channel, "The specified user is not a bot.")
+            return
+        elif new_name and not 2 <= len(new_name) <= 32:
+            await self.discord_agent.send_message(message.channel, "Bot name must be between 2 and 32 characters.")
             return
 
-        if "revoke_role" in content:
-            member_match = re.search(r"member=<@!?(\d+)>", content)
-            role_match = re.search(r"role_name=\"([^\"]+)\"", content)
-
-            member_id = int(member_match.group(1)) if member_match else None
-            role_name = role_match.group(1) if role_match else None
-            member = message.guild.get_member(member_id) if member_id else None
-
-            if member and role_name:
-                return await self.discord_agent.revoke_role(message, member, role_name)
-            else:
-                await self.discord_agent.handle_revoke_role(message, member, role_name)
-                return
-            
-            
-        if "create_scheduled_event" in content:
-            event_name_match = re.search(r'event_name="(.+?)"', content)
-            start_datetime_match = re.search(r'start_datetime="(.+?)"', content)
-            event_topic_match = re.search(r'event_topic="(.+?)"', content)
-
-            # Try to extract voice_channel from a command parameter format
-            voice_channel_match = re.search(r'voice_channel=<#\!?(\d+)>', content)
-            # Fallback: if not found, search for any channel mention in the content
-            if not voice_channel_match:
-                voice_channel_match = re.search(r"<#\!?(\d+)>", content)
-
-            missing_params = []
-            if not event_name_match:
-                missing_params.append("event_name")
-            if not start_datetime_match:
-                missing_params.append("start_datetime")
-            if not voice_channel_match:
-                missing_params.append("voice_channel")
-            if not event_topic_match:
-                missing_params.append("event_topic")
-
-            if missing_params:
-                return f"Missing required parameter(s): {', '.join(missing_params)}"
-            
-            event_name = event_name_match.group(1) 
-            start_datetime_str = start_datetime_match.group(1) 
-            event_topic = event_topic_match.group(1) 
-            voice_channel_str = voice_channel_match.group(1) 
-
-            return await self.discord_agent.create_scheduled_event(
-                message, event_name, start_datetime_str, voice_channel_str, event_topic
+        if target and target.bot and new_name:
+            return await self.discord_agent.change_bot_name(message, target, new_name)
+        elif not target:
+            await self.discord_agent.send_message(
+                message.channel, "Please mention or specify the bot you want to rename."
             )
-            
-        if "summarize_server_activity" in content:
-            return await self.discord_agent.get_server_activity_summary(message)
-
-        if "send_automated_message" in content:
-            target_type_match = re.search(r'target_type="(.+?)"', content)
-            target_match = re.search(r'target=([^,\)]+)', content)
-            message_match = re.search(r'message="(.+?)"', content)
-            schedule_match = re.search(r'schedule_time="(.+?)"', content)
-
-            if not all([target_type_match, target_match, message_match]):
-                return "Missing required parameters for automated message!"
-
-            target_type = target_type_match.group(1)
-            msg_content = message_match.group(1)
-            schedule_time = schedule_match.group(1) if schedule_match else None
-            target_str = target_match.group(1).strip()
-
-            # Get target based on type
-            target = None
-            if target_type == "dm":
-                # Pass the raw target string to the agent for flexible matching
-                target = target_str.strip()
-            else:  # channel
-                channel_match = re.search(r'<#!?(\d+)>', target_str)
-                if not channel_match:
-                    return "Invalid channel mention format!"
-                try:
-                    channel_id = int(channel_match.group(1))
-                    target = message.guild.get_channel(channel_id)
-                except (ValueError, AttributeError):
-                    return "Could not parse channel ID!"
-
-            if not target:
-                return f"Could not find the specified {'user' if target_type == 'dm' else 'channel'}!"
-
-            return await self.discord_agent.send_automated_message(
-                message, target_type, target, msg_content, schedule_time
+            await self.discord_agent.prompt_change_name(message)
+        elif not new_name:
+            await self.discord_agent.send_message(
+                message.channel, f"Please specify a valid new name for {target.display_name}."
             )
+            await self.discord_agent.prompt_change_name(message)
+        return
+
+    async def _cmd_assign_role(self, message: discord.Message, args: dict):
+        member_id = user_mention_id(args["member"])
+        member = message.guild.get_member(member_id) if member_id else None
+        role_name = args["role_name"]
+
+        if member and role_name:
+            return await self.discord_agent.assign_role(message, member, role_name)
+        await self.discord_agent.handle_assign_role(message, member, role_name)
+        return
+
+    async def _cmd_create_role(self, message: discord.Message, args: dict):
+        await self.discord_agent.handle_create_role(message, args["role_name"])
+        return
+
+    async def _cmd_revoke_role(self, message: discord.Message, args: dict):
+        member_id = user_mention_id(args["member"])
+        member = message.guild.get_member(member_id) if member_id else None
+        role_name = args["role_name"]
+
+        if member and role_name:
+            return await self.discord_agent.revoke_role(message, member, role_name)
+        await self.discord_agent.handle_revoke_role(message, member, role_name)
+        return
+
+    async def _cmd_create_scheduled_event(self, message: discord.Message, args: dict):
+        return await self.discord_agent.create_scheduled_event(
+            message,
+            args["event_name"],
+            args["start_datetime"],
+            args["voice_channel"],
+            args["event_topic"],
+        )
 
-        if "send_welcome_message" in content:
-            target_match = re.search(r'target=<@!?(\d+)>', content)
-            message_match = re.search(r'custom_message="(.+?)"', content)
+    async def _cmd_summarize_server_activity(self, message: discord.Message, args: dict):
+        return await self.discord_agent.get_server_activity_summary(message)
 
-            if not target_match:
-                return "Please specify a target user!"
+    async def _cmd_send_automated_message(self, message: discord.Message, args: dict):
+        target_type = args["target_type"]
 
-            target_id = int(target_match.group(1))
-            target_member = message.guild.get_member(target_id)
-            custom_message = message_match.group(1) if message_match else None
+        # Get target based on type
+        target = None
+        if target_type == "dm":
+            # Pass the raw target string to the agent for flexible matching
+            target = args["target"]
+        else:  # channel
+            channel_id = channel_mention_id(args["target"])
+            if not channel_id:
+                return "Invalid channel mention format!"
+            target = message.guild.get_channel(channel_id)
 
-            return await self.discord_agent.send_welcome_message(
-                message, target_member, custom_message
-            )
+        if not target:
+            return f"Could not find the specified {'user' if target_type == 'dm' else 'channel'}!"
 
-        if "change_channel_name" in content:
-            channel_match = re.search(r'channel=<#!?(\d+)>', content)
-            name_match = re.search(r'new_name="(.+?)"', content)
+        return await self.discord_agent.send_automated_message(
+            message, target_type, target, args["message"], args["schedule_time"]
+        )
 
-            if not all([channel_match, name_match]):
-                return "Please provide both channel and new name!"
-            
-            try:
-                channel_id = int(channel_match.group(1))
-                channel = message.guild.get_channel(channel_id)
-                new_name = name_match.group(1)
-
-                if not channel:
-                    return "Could not find the specified channel!"
-                
-                return await self.discord_agent.change_channel_name(
-                    message, channel, new_name
-                )
-            except (ValueError, AttributeError):
-                return "Invalid channel mention or name format!"
+    async def _cmd_send_welcome_message(self, message: discord.Message, args: dict):
+        target_id = user_mention_id(args["target"])
+        target_member = message.guild.get_member(target_id) if target_id else None
+        if not target_member:
+            return "Please specify a target user!"
+
+        return await self.discord_agent.send_welcome_message(
+            message, target_member, args["custom_message"]
+        )
 
-        return content
+    async def _cmd_change_channel_name(self, message: discord.Message, args: dict):
+        channel_id = channel_mention_id(args["channel"])
+        if not channel_id:
+            return "Invalid channel mention or name format!"
+
+        channel = message.guild.get_channel(channel_id)
+        if not channel:
+            return "Could not find the specified channel!"
+
+        return await self.discord_agent.change_channel_name(
+            message, channel, args["new_name"]
+        )
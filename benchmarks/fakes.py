@@ -0,0 +1,481 @@
+"""
+In-memory stand-ins for the discord.py objects the agent touches.
+
+Channels and members subclass the real discord.py classes so the agent's
+isinstance checks behave as they do against a live server; everything
+else is a plain object with just the attributes and coroutines the code
+under test uses. REST calls sleep for the guild's rest_latency and are
+counted in guild.rest_calls.
+"""
+import asyncio
+import datetime
+import itertools
+import random
+import re
+
+import discord
+
+_MENTION_RE = re.compile(r"<@!?(\d+)>")
+_CHANNEL_RE = re.compile(r"<#(\d+)>")
+_EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+_counter = itertools.count(1)
+
+
+def snowflake(when: datetime.datetime = None) -> int:
+    """A unique ID whose timestamp part is `when` (default now), like Discord's."""
+    when = when or datetime.datetime.now(datetime.timezone.utc)
+    return discord.utils.time_snowflake(when) + next(_counter) % (1 << 22)
+
+
+class FakeUser(discord.user._UserTag):
+    """A user; the _UserTag base makes it compare equal to members with the same ID, as real users do."""
+
+    def __init__(self, name: str, bot: bool = False, user_id: int = None):
+        self.id = user_id or snowflake(_EPOCH)
+        self.name = name
+        self.global_name = None
+        self.display_name = name
+        self.bot = bot
+        self.system = False
+        self.discriminator = "0"
+        self.dm_channel = None
+        self.mutual_guilds = []
+        self.rest_latency = 0.0
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return self.id >> 22
+
+    async def create_dm(self):
+        await asyncio.sleep(self.rest_latency)
+        self.dm_channel = FakeDMChannel(self)
+        return self.dm_channel
+
+    async def send(self, content=None, **kwargs):
+        channel = self.dm_channel or await self.create_dm()
+        return await channel.send(content, **kwargs)
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.rest_latency)
+
+
+class FakeMember(discord.Member):
+    """A guild member backed by a FakeUser; id, name and bot forward to it as in discord.py."""
+
+    def __init__(self, user: FakeUser, guild, nick: str = None, joined_at: datetime.datetime = None,
+                 status: discord.Status = discord.Status.online):
+        self._user = user
+        self.guild = guild
+        self.nick = nick
+        self.joined_at = joined_at or _EPOCH
+        self._fake_status = status
+        self._fake_roles = []
+        self._fake_permissions = discord.Permissions.none()
+
+    @property
+    def status(self):
+        return self._fake_status
+
+    @property
+    def roles(self):
+        return [self.guild.default_role] + self._fake_roles
+
+    @property
+    def guild_permissions(self):
+        return self._fake_permissions
+
+    @property
+    def display_name(self):
+        return self.nick or self._user.display_name
+
+    def __repr__(self):
+        return f"<FakeMember id={self.id} name={self.name!r}>"
+
+    async def send(self, content=None, **kwargs):
+        return await self._user.send(content, **kwargs)
+
+    async def edit(self, **kwargs):
+        await self.guild.rest()
+        if "nick" in kwargs:
+            self.nick = kwargs["nick"]
+
+    async def add_roles(self, *roles, **kwargs):
+        await self.guild.rest()
+        self._fake_roles.extend(role for role in roles if role not in self._fake_roles)
+
+    async def remove_roles(self, *roles, **kwargs):
+        await self.guild.rest()
+        self._fake_roles = [role for role in self._fake_roles if role not in roles]
+
+
+class FakeRole:
+    def __init__(self, guild, name: str, position: int = 0):
+        self.id = snowflake(_EPOCH)
+        self.guild = guild
+        self.name = name
+        self.position = position
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return self.id >> 22
+
+
+class FakeInvite:
+    def __init__(self, channel, max_uses: int):
+        self.code = f"{next(_counter):x}"
+        self.url = f"https://discord.gg/{self.code}"
+        self.channel = channel
+        self.max_uses = max_uses
+
+
+class _FakeGuildChannel:
+    """Behaviour shared by the fake text, voice and category channels."""
+
+    def _setup(self, guild, name: str, category=None):
+        self.id = snowflake(_EPOCH)
+        self.name = name
+        self.guild = guild
+        self.nsfw = False
+        self.position = len(guild.channels)
+        self.category_id = category.id if category else None
+        self._fake_overwrites = {}
+
+    @property
+    def overwrites(self):
+        return dict(self._fake_overwrites)
+
+    @property
+    def category(self):
+        return self.guild.get_channel(self.category_id) if self.category_id else None
+
+    def overwrites_for(self, target):
+        return self._fake_overwrites.get(target, discord.PermissionOverwrite())
+
+    async def set_permissions(self, target, *, overwrite=None, reason=None):
+        await self.guild.rest()
+        self._fake_overwrites[target] = overwrite
+
+    async def edit(self, *, name=None, overwrites=None, reason=None, **kwargs):
+        await self.guild.rest()
+        if name is not None:
+            self.name = name
+        if overwrites is not None:
+            self._fake_overwrites = dict(overwrites)
+
+
+class FakeTextChannel(_FakeGuildChannel, discord.TextChannel):
+    """
+    A text channel whose history is `history_size` generated messages,
+    returned in pages of 100 with guild.rest_latency per page.
+    """
+
+    type = discord.ChannelType.text
+
+    def __init__(self, guild, name: str, category=None, history_size: int = 0):
+        self._setup(guild, name, category)
+        self.topic = None
+        self.last_message_id = None
+        self.history_size = history_size
+        self.sent = []
+
+    def __repr__(self):
+        return f"<FakeTextChannel id={self.id} name={self.name!r}>"
+
+    @property
+    def members(self):
+        return self.guild.members
+
+    async def send(self, content=None, **kwargs):
+        await self.guild.rest()
+        message = FakeMessage(self.guild.bot_member or self.guild.members[0], self, content or "", **kwargs)
+        self.sent.append(message)
+        return message
+
+    async def create_invite(self, *, max_uses: int = 0, unique: bool = True, **kwargs):
+        await self.guild.rest()
+        return FakeInvite(self, max_uses)
+
+    async def create_thread(self, *, name: str, **kwargs):
+        await self.guild.rest()
+        return FakeThread(self, name)
+
+    async def history(self, *, limit=None, after=None, before=None, oldest_first=None):
+        authors = self.guild.members[:200] or [self.guild.bot_member]
+        count = self.history_size if limit is None else min(limit, self.history_size)
+        end = before or datetime.datetime.now(datetime.timezone.utc)
+        for index in range(count):
+            if index % 100 == 0:
+                await self.guild.rest()
+            created = end - datetime.timedelta(seconds=index * 30 + 1)
+            message = FakeMessage(authors[index % len(authors)], self, f"message {index}", created_at=created)
+            if after is not None and message.id <= after.id:
+                return
+            yield message
+
+
+class FakeVoiceChannel(_FakeGuildChannel, discord.VoiceChannel):
+    type = discord.ChannelType.voice
+
+    def __init__(self, guild, name: str, category=None):
+        self._setup(guild, name, category)
+        self.last_message_id = None
+
+    def __repr__(self):
+        return f"<FakeVoiceChannel id={self.id} name={self.name!r}>"
+
+
+class FakeCategory(_FakeGuildChannel, discord.CategoryChannel):
+    type = discord.ChannelType.category
+
+    def __init__(self, guild, name: str):
+        self._setup(guild, name)
+
+    def __repr__(self):
+        return f"<FakeCategory id={self.id} name={self.name!r}>"
+
+
+class FakeDMChannel:
+    type = discord.ChannelType.private
+
+    def __init__(self, user: FakeUser):
+        self.id = snowflake()
+        self.recipient = user
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.recipient.rest_latency)
+        self.sent.append(content)
+
+
+class FakeThread:
+    type = discord.ChannelType.private_thread
+
+    def __init__(self, parent: FakeTextChannel, name: str):
+        self.id = snowflake()
+        self.parent = parent
+        self.guild = parent.guild
+        self.name = name
+        self.members = []
+        self.sent = []
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def add_user(self, user):
+        await self.guild.rest()
+        self.members.append(user)
+
+    async def send(self, content=None, **kwargs):
+        await self.guild.rest()
+        self.sent.append(content)
+
+
+class FakeScheduledEvent:
+    def __init__(self, **kwargs):
+        self.id = snowflake()
+        self.url = f"https://discord.com/events/{self.id}"
+        self.__dict__.update(kwargs)
+
+
+class FakeGuild:
+    def __init__(self, name: str = "bench", rest_latency: float = 0.0):
+        self.id = snowflake(_EPOCH)
+        self.name = name
+        self.rest_latency = rest_latency
+        self.rest_calls = 0
+        self.members = []
+        self._members = {}
+        self.channels = []
+        self._channels = {}
+        self.default_role = FakeRole(self, "@everyone")
+        self.roles = [self.default_role]
+        self.bot_member = None
+        self.me = None
+
+    @property
+    def member_count(self):
+        return len(self.members)
+
+    @property
+    def text_channels(self):
+        return [c for c in self.channels if isinstance(c, discord.TextChannel)]
+
+    @property
+    def categories(self):
+        return [c for c in self.channels if isinstance(c, discord.CategoryChannel)]
+
+    async def rest(self):
+        """One simulated REST round trip."""
+        self.rest_calls += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+
+    def add_member(self, member: FakeMember):
+        self.members.append(member)
+        self._members[member.id] = member
+        member._user.mutual_guilds.append(self)
+
+    def add_channel(self, channel):
+        self.channels.append(channel)
+        self._channels[channel.id] = channel
+        return channel
+
+    def get_member(self, member_id: int):
+        return self._members.get(member_id)
+
+    def get_channel(self, channel_id: int):
+        return self._channels.get(channel_id)
+
+    def get_role(self, role_id: int):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def query_members(self, *, user_ids=None, cache=True, **kwargs):
+        await self.rest()
+        return [self._members[user_id] for user_id in user_ids or () if user_id in self._members]
+
+    async def create_role(self, *, name: str, **kwargs):
+        await self.rest()
+        role = FakeRole(self, name, len(self.roles))
+        self.roles.append(role)
+        return role
+
+    async def create_text_channel(self, name: str, *, category=None, overwrites=None, **kwargs):
+        await self.rest()
+        channel = self.add_channel(FakeTextChannel(self, name, category))
+        channel._fake_overwrites = dict(overwrites or {})
+        return channel
+
+    async def create_voice_channel(self, name: str, *, category=None, overwrites=None, **kwargs):
+        await self.rest()
+        channel = self.add_channel(FakeVoiceChannel(self, name, category))
+        channel._fake_overwrites = dict(overwrites or {})
+        return channel
+
+    async def create_scheduled_event(self, **kwargs):
+        await self.rest()
+        return FakeScheduledEvent(**kwargs)
+
+
+class FakeAttachment:
+    def __init__(self, data: bytes = b"\x89PNG fake"):
+        self.data = data
+
+    async def read(self):
+        return self.data
+
+
+class FakeMessage:
+    """A message whose mentions are parsed out of `content` like Discord does."""
+
+    def __init__(self, author, channel, content: str, created_at: datetime.datetime = None,
+                 attachments: list = None, **kwargs):
+        self.created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+        self.id = snowflake(self.created_at)
+        self.author = author
+        self.channel = channel
+        self.guild = getattr(channel, "guild", None)
+        self.content = content
+        self.attachments = attachments or []
+        self.reactions = []
+        self.role_mentions = []
+        self.edits = []
+
+        self.raw_mentions = [int(user_id) for user_id in _MENTION_RE.findall(content)]
+        self.mentions = []
+        for user_id in self.raw_mentions:
+            member = self.guild.get_member(user_id) if self.guild else None
+            if member is not None and member not in self.mentions:
+                self.mentions.append(member)
+        self.channel_mentions = []
+        for channel_id in _CHANNEL_RE.findall(content):
+            mentioned = self.guild.get_channel(int(channel_id)) if self.guild else None
+            if mentioned is not None:
+                self.channel_mentions.append(mentioned)
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    async def edit(self, *, content=None, **kwargs):
+        if self.guild:
+            await self.guild.rest()
+        self.content = content
+        self.edits.append(content)
+
+
+class FakeBot:
+    """The parts of commands.Bot the agent uses: its user and cache lookups."""
+
+    def __init__(self, guilds: list, user: FakeUser):
+        self.user = user
+        self.guilds = guilds
+        self._users = {}
+        for guild in guilds:
+            for member in guild.members:
+                self._users[member.id] = member._user
+
+    def get_user(self, user_id: int):
+        return self._users.get(user_id)
+
+    def get_channel(self, channel_id: int):
+        for guild in self.guilds:
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                return channel
+        return None
+
+    def get_guild(self, guild_id: int):
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    async def fetch_user(self, user_id: int):
+        return self.get_user(user_id)
+
+    async def fetch_channel(self, channel_id: int):
+        return self.get_channel(channel_id)
+
+
+def build_world(members: int = 50, channels: int = 5, roles: int = 10, history_size: int = 0,
+                rest_latency: float = 0.0, seed: int = 153):
+    """
+    Builds a bot and one guild with `members` members (a tenth of them
+    offline, one of them a second bot), text channels with `history_size`
+    messages each, a voice channel, a category and some roles.
+    """
+    rng = random.Random(seed)
+    guild = FakeGuild(rest_latency=rest_latency)
+    bot_user = FakeUser("agent", bot=True)
+    guild.bot_member = FakeMember(bot_user, guild)
+    guild.bot_member._fake_permissions = discord.Permissions.all()
+    guild.me = guild.bot_member
+    guild.add_member(guild.bot_member)
+    helper = FakeMember(FakeUser("helperbot", bot=True), guild)
+    guild.add_member(helper)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for index in range(max(0, members - 2)):
+        user = FakeUser(f"user{index}_{rng.randrange(10**6):06d}")
+        user.display_name = f"User {index}"
+        joined = now - datetime.timedelta(hours=rng.randrange(1, 24 * 60))
+        status = discord.Status.offline if index % 10 == 0 else discord.Status.online
+        guild.add_member(FakeMember(user, guild, nick=f"nick{index}" if index % 3 == 0 else None,
+                                    joined_at=joined, status=status))
+
+    for index in range(roles):
+        guild.roles.append(FakeRole(guild, f"role-{index}", index + 1))
+    category = guild.add_channel(FakeCategory(guild, "General"))
+    for index in range(channels):
+        guild.add_channel(FakeTextChannel(guild, f"channel-{index}", category, history_size))
+    guild.add_channel(FakeVoiceChannel(guild, "voice", category))
+    return FakeBot([guild], bot_user), guild
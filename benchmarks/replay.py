@@ -0,0 +1,336 @@
+"""
+Replays a recorded message trace against the agent at 1x-50x speed.
+
+    python -m benchmarks.replay trace.jsonl.gz --speed 10 --output replay.json
+    python -m benchmarks.replay --synthetic 2000 --rate 20 --speed 5
+
+Traces come from trace_recorder.py (set TRACE_PATH on the bot). Discord
+is the in-memory fakes from benchmarks.fakes, with a simulated REST
+latency; Mistral is a local HTTP server that speaks the chat completions
+API (plain and streamed), so the real SDK, gateway and request path are
+exercised. Reports throughput, schedule lag, gateway queueing delay and
+end-to-end latency percentiles.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+_TMP = tempfile.mkdtemp(prefix="agent-replay-")
+os.environ.setdefault("ACTIVITY_DB_PATH", os.path.join(_TMP, "activity.db"))
+os.environ.setdefault("SCHEDULER_DB_PATH", os.path.join(_TMP, "scheduler.db"))
+os.environ.setdefault("USAGE_DB_PATH", os.path.join(_TMP, "usage.db"))
+
+from aiohttp import web  # noqa: E402
+from mistralai import Mistral  # noqa: E402
+
+from agent import BUSY_REPLY, MistralAgent  # noqa: E402
+from benchmarks.fakes import FakeBot, FakeGuild, FakeMember, FakeMessage, FakeTextChannel, FakeUser  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from metrics import RollingStats  # noqa: E402
+from trace_recorder import (  # noqa: E402
+    EVENT_FIELDS,
+    FLAG_COMMAND,
+    FLAG_DM,
+    FLAG_FROM_BOT,
+    FLAG_MENTIONS_BOT,
+    TRACE_VERSION,
+    read_trace,
+)
+
+MAX_SPEED = 50.0
+_FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+
+class MockMistralServer:
+    """
+    Minimal /v1/chat/completions endpoint. Every request waits `latency`
+    seconds (plus up to `jitter`) and answers with `reply`; streamed
+    requests get the same text as server-sent events. `max_concurrency`
+    makes it answer 429 beyond that many requests in flight, to exercise
+    the gateway's backoff.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.5, reply: str = "Sure, happy to help!",
+                 max_concurrency: int = 0, seed: int = 153):
+        self.latency = latency
+        self.jitter = jitter
+        self.reply = reply
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.requests = 0
+        self.rejected = 0
+        self._rng = random.Random(seed)
+        self._runner = None
+        self.url = None
+
+    async def start(self, port: int = 0):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._complete)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _complete(self, request: web.Request):
+        body = await request.json()
+        self.requests += 1
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            self.rejected += 1
+            return web.json_response({"message": "Requests rate limit exceeded"}, status=429)
+        self.in_flight += 1
+        try:
+            delay = self.latency + self._rng.random() * self.jitter
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", ())) // 4 + 1
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 12, "total_tokens": prompt_tokens + 12}
+            base = {"id": f"cmpl-{self.requests}", "model": body.get("model", "mock"), "created": int(time.time())}
+            if not body.get("stream"):
+                await asyncio.sleep(delay)
+                return web.json_response({
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": self.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            words = self.reply.split(" ")
+            await asyncio.sleep(delay / 2)
+            for index, word in enumerate(words):
+                chunk = {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": word if index == 0 else " " + word},
+                        "finish_reason": None,
+                    }],
+                }
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(delay / 2 / len(words))
+            final = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": ""}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+            await response.write_eof()
+            return response
+        finally:
+            self.in_flight -= 1
+
+
+class ReplayWorld:
+    """Fake guilds, channels and authors created on demand for the anonymous IDs in a trace."""
+
+    def __init__(self, rest_latency: float, members_per_guild: int = 50):
+        self.bot_user = FakeUser("agent", bot=True)
+        self.rest_latency = rest_latency
+        self.members_per_guild = members_per_guild
+        self.guilds = {}
+        self.channels = {}
+        self.authors = {}
+        self.bot = FakeBot([], self.bot_user)
+
+    def guild(self, number: int) -> FakeGuild:
+        guild = self.guilds.get(number)
+        if guild is None:
+            guild = self.guilds[number] = FakeGuild(f"guild-{number}", self.rest_latency)
+            guild.bot_member = guild.me = FakeMember(self.bot_user, guild)
+            guild.add_member(guild.bot_member)
+            for index in range(self.members_per_guild):
+                self._add_member(guild, FakeUser(f"g{number}-member{index}"))
+            self.bot.guilds.append(guild)
+        return guild
+
+    def _add_member(self, guild: FakeGuild, user: FakeUser):
+        member = FakeMember(user, guild)
+        guild.add_member(member)
+        self.bot._users[user.id] = user
+        return member
+
+    def channel(self, guild: FakeGuild, number: int) -> FakeTextChannel:
+        channel = self.channels.get(number)
+        if channel is None:
+            channel = self.channels[number] = guild.add_channel(FakeTextChannel(guild, f"channel-{number}"))
+        return channel
+
+    def author(self, guild: FakeGuild, number: int, is_bot: bool):
+        user = self.authors.get(number)
+        if user is None:
+            user = self.authors[number] = FakeUser(f"author-{number}", bot=is_bot)
+        member = guild.get_member(user.id)
+        return member or self._add_member(guild, user)
+
+    def message(self, event: dict, rng: random.Random) -> FakeMessage:
+        """Builds a message with the event's shape: same length, mention counts and flags."""
+        guild = self.guild(max(event["guild"], 0))
+        channel = self.channel(guild, event["channel"])
+        author = self.author(guild, event["author"], bool(event["flags"] & FLAG_FROM_BOT))
+        members = [m for m in guild.members if not m.bot]
+
+        parts = []
+        if event["flags"] & FLAG_COMMAND:
+            parts.append("!noop")
+        if event["flags"] & FLAG_MENTIONS_BOT:
+            parts.append(self.bot_user.mention)
+        parts += [rng.choice(members).mention for _ in range(event["user_mentions"])]
+        parts += [rng.choice(guild.text_channels).mention for _ in range(min(event["channel_mentions"], 5))]
+        content = " ".join(parts)
+        while len(content) < event["length"]:
+            content += " " + rng.choice(_FILLER)
+        return FakeMessage(author, channel, content[:max(event["length"], len(" ".join(parts)))])
+
+
+def synthetic_trace(count: int, rate: float, guilds: int, mention_share: float, seed: int = 153) -> list:
+    """Poisson arrivals at `rate` messages/s spread over a few guilds, a share of them mentioning the bot."""
+    rng = random.Random(seed)
+    events = []
+    offset = 0.0
+    for _ in range(count):
+        offset += rng.expovariate(rate)
+        guild = rng.randrange(guilds)
+        flags = FLAG_MENTIONS_BOT if rng.random() < mention_share else 0
+        length = int(rng.lognormvariate(3.5, 0.8))
+        row = [round(offset * 1000), guild, guild * 10 + rng.randrange(3), rng.randrange(guilds * 40), flags,
+               length, max(1, length // 5), rng.choice((0, 0, 0, 1, 2)), rng.choice((0, 0, 1)), 0, 0]
+        events.append(dict(zip(EVENT_FIELDS, row)))
+    return events
+
+
+def write_trace(path: str, events: list):
+    """Writes events in trace_recorder's format, e.g. to keep a synthetic trace around."""
+    with gzip.open(path, "wt") as f:
+        f.write(json.dumps({"version": TRACE_VERSION, "fields": EVENT_FIELDS, "started_at": time.time()}) + "\n")
+        for event in events:
+            f.write(json.dumps([event[field] for field in EVENT_FIELDS], separators=(",", ":")) + "\n")
+
+
+async def replay(events: list, speed: float, server: MockMistralServer, rest_latency: float,
+                 streaming: bool, seed: int = 153) -> dict:
+    world = ReplayWorld(rest_latency)
+    client = Mistral(api_key="replay", server_url=server.url)
+    agent = MistralAgent(world.bot)
+    agent.client = client
+    agent.gateway = LLMGateway(client)
+    agent.streaming = streaming
+    rng = random.Random(seed)
+
+    lag = RollingStats(100_000)
+    latency = RollingStats(100_000)
+    outcomes = {"handled": 0, "passive": 0, "busy": 0, "errors": 0}
+
+    async def handle(message, due):
+        start = time.monotonic()
+        lag.add(start - due)
+        try:
+            handled = await agent.handle_message(message)
+        except Exception as e:
+            outcomes["errors"] += 1
+            print(f"Replay error: {e!r}", file=sys.stderr)
+            return
+        if handled:
+            latency.add(time.monotonic() - start)
+            outcomes["handled"] += 1
+            sent = message.channel.sent
+            if sent and sent[-1].content == BUSY_REPLY:
+                outcomes["busy"] += 1
+        else:
+            outcomes["passive"] += 1
+
+    tasks = []
+    started = time.monotonic()
+    for event in events:
+        due = started + event["offset_ms"] / 1000 / speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if event["flags"] & FLAG_DM:
+            continue
+        tasks.append(asyncio.create_task(handle(world.message(event, rng), due)))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+
+    def percentiles(stats):
+        return {f"p{p}_ms": stats.percentile(p) * 1000 for p in (50, 95, 99)} | {"mean_ms": stats.mean() * 1000}
+
+    trace_seconds = events[-1]["offset_ms"] / 1000 if events else 0.0
+    return {
+        "events": len(tasks),
+        "speed": speed,
+        "trace_seconds": trace_seconds,
+        "wall_seconds": elapsed,
+        "throughput_per_second": len(tasks) / elapsed if elapsed else 0.0,
+        "agent_requests_per_second": outcomes["handled"] / elapsed if elapsed else 0.0,
+        "outcomes": outcomes,
+        "schedule_lag": percentiles(lag),
+        "latency": percentiles(latency),
+        "gateway": agent.gateway.stats(),
+        "gateway_wait": percentiles(agent.gateway.wait_times),
+        "mock_server": {"requests": server.requests, "rejected_429": server.rejected},
+        "rest_calls": sum(guild.rest_calls for guild in world.guilds.values()),
+    }
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", nargs="?", help="trace file written by trace_recorder.py")
+    parser.add_argument("--synthetic", type=int, default=0, help="replay N synthetic events instead of a trace")
+    parser.add_argument("--rate", type=float, default=10.0, help="synthetic messages per second at 1x")
+    parser.add_argument("--guilds", type=int, default=5, help="synthetic guild count")
+    parser.add_argument("--mention-share", type=float, default=0.2, help="share of synthetic messages that mention the bot")
+    parser.add_argument("--save-trace", help="write the synthetic trace here")
+    parser.add_argument("--speed", type=float, default=1.0, help=f"replay speed, 1 to {MAX_SPEED:g}")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.5)
+    parser.add_argument("--llm-max-concurrency", type=int, default=0, help="mock server answers 429 beyond this")
+    parser.add_argument("--rest-latency", type=float, default=0.05, help="seconds per simulated Discord REST call")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if not 1.0 <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed must be between 1 and {MAX_SPEED:g}")
+    if args.synthetic:
+        events = synthetic_trace(args.synthetic, args.rate, args.guilds, args.mention_share)
+        if args.save_trace:
+            write_trace(args.save_trace, events)
+    elif args.trace:
+        _, events = read_trace(args.trace)
+    else:
+        parser.error("pass a trace file or --synthetic N")
+
+    server = MockMistralServer(args.llm_latency, args.llm_jitter, max_concurrency=args.llm_max_concurrency)
+    await server.start()
+    try:
+        report = await replay(events, args.speed, server, args.rest_latency, args.streaming)
+    finally:
+        await server.stop()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,284 @@
+"""
+Offline benchmarks for MistralAgent and DiscordAgent.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --quick --baseline results.json
+
+Discord is replaced by the fakes in benchmarks.fakes and Mistral by
+benchmarks.stub_mistral, so no token or server is needed. Results are
+written as JSON; with --baseline the run is compared against an earlier
+results file and slowdowns beyond --threshold are flagged.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# The agent's stores open SQLite files at import time; keep them out of the tree
+_TMP = tempfile.mkdtemp(prefix="agent-bench-")
+os.environ.setdefault("ACTIVITY_DB_PATH", os.path.join(_TMP, "activity.db"))
+os.environ.setdefault("SCHEDULER_DB_PATH", os.path.join(_TMP, "scheduler.db"))
+os.environ.setdefault("USAGE_DB_PATH", os.path.join(_TMP, "usage.db"))
+os.environ.setdefault("MISTRAL_API_KEY", "bench")
+
+from activity_store import ActivityStore  # noqa: E402
+from activity_tracker import ActivityTracker  # noqa: E402
+from agent import MistralAgent  # noqa: E402
+from benchmarks.fakes import FakeMessage, build_world  # noqa: E402
+from benchmarks.stub_mistral import CannedReply, StubMistral  # noqa: E402
+from discord_agent import DiscordAgent  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from member_context import MemberContextBuilder  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+MEMBER_SCALES = (10, 100, 1_000, 10_000, 100_000)
+QUICK_MEMBER_SCALES = (10, 100, 1_000, 10_000)
+
+
+def _summary(samples: list) -> dict:
+    """Milliseconds summary of a list of durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def make_agent(bot, client: StubMistral, streaming: bool = False) -> MistralAgent:
+    """A MistralAgent wired to the fake bot and the stub client, with the response cache disabled."""
+    agent = MistralAgent(bot)
+    agent.client = client
+    agent.gateway = LLMGateway(client)
+    agent.response_cache = ResponseCache(max_size=0)
+    agent.streaming = streaming
+    return agent
+
+
+def _scenarios(guild) -> list:
+    """(command, canned arguments) for every command that reaches DiscordAgent."""
+    users = [m for m in guild.members if not m.bot]
+    text = guild.text_channels
+    voice = next(c for c in guild.channels if c.type.name == "voice")
+    mentions = [m.mention for m in users[:5]]
+    channels = [c.mention for c in text[:3]]
+    role = guild.roles[1].name
+    later = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+    return [
+        ("create_channel", {"channel_name": "bench-room", "channel_type": "text", "private": True}),
+        ("create_group_chat", {"user_mentions": mentions}),
+        ("create_group_chat", {"groups": [mentions[:2], mentions[2:]]}),
+        ("invite_user_to_channel", {"user_mentions": mentions, "channel_mentions": channels}),
+        ("mute_member_from_channel", {"user_mentions": mentions, "channel_mentions": channels}),
+        ("unmute_member_from_channel", {"user_mentions": mentions, "channel_mentions": channels}),
+        ("create_poll", {"question": "Lunch?", "answers": ["Pizza", "Sushi"], "duration": 2}),
+        ("change_bot_name", {"bot_mention": "helperbot", "new_name": "Helper"}),
+        ("assign_role", {"member": users[0].mention, "role_name": role}),
+        ("revoke_role", {"member": users[0].mention, "role_name": role}),
+        ("create_role", {"role_name": f"bench-{random.randrange(10**6)}"}),
+        ("create_scheduled_event", {"event_name": "Standup", "start_datetime": later,
+                                    "voice_channel": voice.mention, "event_topic": "Daily"}),
+        ("summarize_server_activity", {}),
+        ("send_automated_message", {"target_type": "channel", "target": text[0].mention, "message": "Hi"}),
+        ("send_welcome_message", {"target": users[1].mention}),
+        ("change_channel_name", {"channel": text[-1].mention, "new_name": "renamed"}),
+    ]
+
+
+async def bench_dispatch(iterations: int, members: int, rest_latency: float, llm_latency: float,
+                         streaming: bool) -> dict:
+    """End-to-end MistralAgent.run latency per command, with the LLM answering instantly by default."""
+    bot, guild = build_world(members=members, channels=5, rest_latency=rest_latency)
+    client = StubMistral(latency=llm_latency)
+    agent = make_agent(bot, client, streaming)
+    await agent.discord_agent.activity.sync(guild)
+    author = next(m for m in guild.members if not m.bot)
+    channel = guild.text_channels[0]
+
+    results = {}
+    for name, arguments in _scenarios(guild):
+        client.default = CannedReply(tool=name, arguments=arguments)
+        key = name if name not in results else f"{name}[groups]"
+        samples = []
+        calls_before = guild.rest_calls
+        for _ in range(iterations):
+            message = FakeMessage(author, channel, f"{bot.user.mention} could you please do the {name} thing")
+            start = time.perf_counter()
+            await agent.run(message)
+            samples.append(time.perf_counter() - start)
+        results[key] = _summary(samples)
+        results[key]["rest_calls_per_run"] = (guild.rest_calls - calls_before) / iterations
+    return results
+
+
+def bench_prompt_build(scales: tuple, iterations: int) -> dict:
+    """Cost of the member part of the prompt as the guild grows, cold and cached."""
+    results = {}
+    for members in scales:
+        bot, guild = build_world(members=members, channels=3)
+        channel = guild.text_channels[0]
+        speakers = [m for m in guild.members if not m.bot][:50]
+        builder = MemberContextBuilder()
+        for speaker in speakers:
+            builder.observe(FakeMessage(speaker, channel, "hi"))
+        mentioned = " ".join(m.mention for m in speakers[:3])
+        message = FakeMessage(speakers[0], channel, f"{bot.user.mention} add {mentioned}")
+
+        cold = []
+        for _ in range(iterations):
+            builder._member_cache.clear()
+            builder._channel_cache.clear()
+            start = time.perf_counter()
+            builder.build(message)
+            cold.append(time.perf_counter() - start)
+        warm = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            builder.build(message)
+            warm.append(time.perf_counter() - start)
+        results[str(members)] = {"cold": _summary(cold), "cached": _summary(warm)}
+    return results
+
+
+async def bench_summary_scan(channels: int, messages_per_channel: int, page_latency: float) -> dict:
+    """History sync throughput of ActivityTracker over a guild with generated history."""
+    bot, guild = build_world(members=200, channels=channels, history_size=messages_per_channel,
+                             rest_latency=page_latency)
+    tracker = ActivityTracker(store=ActivityStore(os.path.join(_TMP, f"scan-{time.time_ns()}.db")))
+    start = time.perf_counter()
+    await tracker.sync(guild)
+    elapsed = time.perf_counter() - start
+    counted = sum(c.messages for c in tracker.get(guild).channels.values())
+
+    render_start = time.perf_counter()
+    tracker.render_summary(guild)
+    render = time.perf_counter() - render_start
+    return {
+        "channels": channels,
+        "messages": counted,
+        "seconds": elapsed,
+        "messages_per_second": counted / elapsed if elapsed else 0.0,
+        "render_ms": render * 1000,
+    }
+
+
+def bench_find_user(scales: tuple, lookups: int) -> dict:
+    """DiscordAgent.find_user: index build on first use, then exact, prefix and fuzzy lookups."""
+    results = {}
+    rng = random.Random(153)
+    for members in scales:
+        bot, guild = build_world(members=members, channels=1)
+        agent = DiscordAgent(bot)
+        humans = [m for m in guild.members if not m.bot]
+
+        start = time.perf_counter()
+        agent.find_user(guild, humans[0].name)
+        first = time.perf_counter() - start
+
+        queries = {
+            "exact": [rng.choice(humans).name for _ in range(lookups)],
+            "prefix": [rng.choice(humans).name[:6] for _ in range(lookups)],
+            "fuzzy": [rng.choice(humans).display_name.replace(" ", "").lower()[::-1] for _ in range(lookups)],
+            "mention": [rng.choice(humans).mention for _ in range(lookups)],
+        }
+        entry = {"first_call_ms": first * 1000}
+        for kind, names in queries.items():
+            samples = []
+            for name in names:
+                start = time.perf_counter()
+                agent.find_user(guild, name)
+                samples.append(time.perf_counter() - start)
+            entry[kind] = _summary(samples)
+        results[str(members)] = entry
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, (int, float)):
+        out[prefix] = value
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Returns (metric, old, new, ratio) for *_ms and *seconds metrics that got slower by more than threshold."""
+    old, new = {}, {}
+    _flatten("", baseline["results"], old)
+    _flatten("", current["results"], new)
+    regressions = []
+    for key, value in new.items():
+        if not (key.endswith("_ms") or key.endswith("seconds")) or key not in old or old[key] <= 0:
+            continue
+        ratio = value / old[key]
+        if ratio > 1 + threshold:
+            regressions.append((key, old[key], value, ratio))
+    return sorted(regressions, key=lambda item: item[3], reverse=True)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--quick", action="store_true", help="smaller scales and fewer iterations")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="seconds per simulated Discord REST call")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stub Mistral call")
+    parser.add_argument("--streaming", action="store_true", help="benchmark the streaming request path")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    iterations = 5 if args.quick else 20
+    scales = QUICK_MEMBER_SCALES if args.quick else MEMBER_SCALES
+    results = {
+        "dispatch": await bench_dispatch(iterations, 200, args.rest_latency, args.llm_latency, args.streaming),
+        "prompt_build": bench_prompt_build(scales, iterations),
+        "summary_scan": await bench_summary_scan(
+            channels=10 if args.quick else 50,
+            messages_per_channel=500 if args.quick else 2000,
+            page_latency=args.rest_latency,
+        ),
+        "find_user": bench_find_user(scales, 20 if args.quick else 200),
+    }
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output} ({report['commit']})")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        print(f"Compared with {args.baseline} ({baseline.get('commit')}): {len(regressions)} regressions")
+        for key, old, new, ratio in regressions:
+            print(f"  {key}: {old:.3f} -> {new:.3f} ({ratio:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,116 @@
+"""
+A stand-in for mistralai.Mistral with configurable latency and canned
+outputs. Only the calls the agent makes are implemented:
+chat.complete_async and chat.stream_async.
+"""
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+
+
+def _usage(prompt_tokens: int, completion_tokens: int):
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+
+
+def _prompt_tokens(messages: list) -> int:
+    return sum(len(message["content"]) for message in messages) // 4 + 1
+
+
+class CannedReply:
+    """What the stub answers: a tool call (name and arguments) or plain text."""
+
+    def __init__(self, tool: str = None, arguments: dict = None, text: str = ""):
+        self.tool = tool
+        self.arguments = arguments or {}
+        self.text = text
+
+    def as_text_call(self) -> str:
+        args = ", ".join(f"{name}={json.dumps(value)}" for name, value in self.arguments.items())
+        return f"{self.tool}({args})"
+
+
+class _Chat:
+    def __init__(self, client):
+        self.client = client
+
+    async def complete_async(self, *, model: str, messages: list, tools: list = None, **kwargs):
+        reply = self.client.pick(messages)
+        await asyncio.sleep(self.client.delay())
+        self.client.calls += 1
+        tool_calls = None
+        content = reply.text
+        if reply.tool:
+            if tools:
+                tool_calls = [SimpleNamespace(
+                    id="call_0",
+                    function=SimpleNamespace(name=reply.tool, arguments=json.dumps(reply.arguments)),
+                )]
+            else:
+                content = reply.as_text_call()
+        message = SimpleNamespace(content=content, tool_calls=tool_calls)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")],
+            usage=_usage(_prompt_tokens(messages), len(content) // 4 + 10),
+        )
+
+    async def stream_async(self, *, model: str, messages: list, tools: list = None, **kwargs):
+        reply = self.client.pick(messages)
+        self.client.calls += 1
+        return self._events(reply, messages, tools)
+
+    async def _events(self, reply: CannedReply, messages: list, tools: list):
+        # Time to first token, then the rest of the latency spread over a few chunks
+        total = self.client.delay()
+        await asyncio.sleep(total / 2)
+        chunks = 4
+        if reply.tool and tools:
+            name_call = SimpleNamespace(function=SimpleNamespace(name=reply.tool, arguments=""))
+            yield _event(SimpleNamespace(content=None, tool_calls=[name_call]))
+            arguments = json.dumps(reply.arguments)
+            step = max(1, len(arguments) // chunks)
+            for start in range(0, len(arguments), step):
+                await asyncio.sleep(total / 2 / chunks)
+                piece = SimpleNamespace(function=SimpleNamespace(name=None, arguments=arguments[start:start + step]))
+                yield _event(SimpleNamespace(content=None, tool_calls=[piece]))
+        else:
+            text = reply.as_text_call() if reply.tool else reply.text
+            step = max(1, len(text) // chunks)
+            for start in range(0, len(text), step):
+                await asyncio.sleep(total / 2 / chunks)
+                yield _event(SimpleNamespace(content=text[start:start + step], tool_calls=None))
+        yield SimpleNamespace(data=SimpleNamespace(choices=[], usage=_usage(_prompt_tokens(messages), 20)))
+
+
+def _event(delta):
+    return SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None))
+
+
+class StubMistral:
+    """
+    Answers every request after `latency` seconds (plus up to `jitter`).
+    `responder(user_content)` picks the CannedReply; by default the stub
+    answers with `default`.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, responder=None,
+                 default: CannedReply = None, seed: int = 153):
+        self.latency = latency
+        self.jitter = jitter
+        self.responder = responder
+        self.default = default or CannedReply(text="Hello! How can I help?")
+        self.calls = 0
+        self.chat = _Chat(self)
+        self._rng = random.Random(seed)
+
+    def delay(self) -> float:
+        return self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+
+    def pick(self, messages: list) -> CannedReply:
+        if self.responder is None:
+            return self.default
+        return self.responder(messages[-1]["content"]) or self.default
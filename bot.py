@@ -5,6 +5,7 @@ import logging
 from discord.ext import commands
 from dotenv import load_dotenv
 from agent import MistralAgent
+from trace_recorder import TRACE_PATH, TraceRecorder
 
 # Setup logging
 logger = logging.getLogger("discord")
@@ -26,6 +27,9 @@ agent = None  # Will be initialized after bot is ready
 # Get the token from the environment variables
 token = os.getenv("DISCORD_TOKEN")
 
+# Anonymized message trace for load replay, enabled by setting TRACE_PATH
+recorder = TraceRecorder(TRACE_PATH) if TRACE_PATH else None
+
 
 @bot.event
 async def on_ready():
@@ -38,9 +42,189 @@ async def on_ready():
     global agent
     if agent is None:
         agent = MistralAgent(bot)
+    # Reload scheduled messages that were pending when the bot last stopped
+    await agent.discord_agent.scheduler.start()
+    # Local Prometheus endpoint for the stage histograms, if METRICS_PORT is set
+    await agent.metrics.start_server()
+    # Catch the activity counters up from their saved checkpoints; later updates come from events
+    for guild in bot.guilds:
+        agent.discord_agent.activity.start_sync(guild)
     logger.info(f"{bot.user} has connected to Discord!")
 
 
+@bot.event
+async def on_resumed():
+    """
+    Called when the client resumes a session after a disconnect.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_resumed
+    """
+    # Read whatever was missed since each channel's checkpoint
+    if agent:
+        for guild in bot.guilds:
+            agent.discord_agent.activity.start_sync(guild)
+
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    """
+    Called when the bot joins a new guild.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_join
+    """
+    if agent:
+        agent.discord_agent.activity.start_sync(guild)
+
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    """
+    Called when the bot leaves or is removed from a guild.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_remove
+    """
+    if agent:
+        agent.member_context.forget_guild(guild)
+
+
+@bot.event
+async def on_reaction_add(reaction: discord.Reaction, user: discord.User):
+    """
+    Called when a reaction is added to a cached message.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_reaction_add
+    """
+    if agent:
+        agent.discord_agent.activity.record_reaction(reaction)
+
+
+@bot.event
+async def on_reaction_remove(reaction: discord.Reaction, user: discord.User):
+    """
+    Called when a reaction is removed from a cached message.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_reaction_remove
+    """
+    if agent:
+        agent.discord_agent.activity.record_reaction(reaction, delta=-1)
+
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    """
+    Called when a member joins a guild.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_member_join
+    """
+    if agent:
+        agent.discord_agent.activity.record_member_join(member)
+        agent.discord_agent.members.member_joined(member)
+        agent.member_context.invalidate_member(member)
+
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    """
+    Called when a member leaves or is removed from a guild.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_member_remove
+    """
+    if agent:
+        agent.discord_agent.activity.record_member_remove(member)
+        agent.discord_agent.members.member_removed(member)
+        agent.member_context.invalidate_member(member)
+
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    """
+    Called when a member updates their profile, e.g. nickname or roles.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_member_update
+    """
+    if agent:
+        agent.member_context.invalidate_member(after)
+        agent.discord_agent.members.member_updated(after)
+
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User):
+    """
+    Called when a user changes their global profile, e.g. username.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_user_update
+    """
+    if agent:
+        agent.discord_agent.members.user_updated(after)
+
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    """
+    Called when a guild creates a role.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_role_create
+    """
+    if agent:
+        agent.discord_agent.lookup.invalidate(role.guild)
+
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    """
+    Called when a guild deletes a role.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_role_delete
+    """
+    if agent:
+        agent.discord_agent.lookup.invalidate(role.guild)
+
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    """
+    Called when a role is renamed or otherwise changed.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_role_update
+    """
+    if agent:
+        agent.discord_agent.lookup.invalidate(after.guild)
+
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    """
+    Called when a guild channel or category is created.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_channel_create
+    """
+    if agent:
+        agent.discord_agent.lookup.invalidate(channel.guild)
+
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    """
+    Called when a guild channel or category is deleted.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_channel_delete
+    """
+    if agent:
+        agent.discord_agent.lookup.invalidate(channel.guild)
+        agent.channel_context.forget_channel(channel.id)
+
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    """
+    Called when a guild channel or category is renamed or otherwise changed.
+
+    https://discordpy.readthedocs.io/en/latest/api.html#discord.on_guild_channel_update
+    """
+    if agent:
+        agent.discord_agent.lookup.invalidate(after.guild)
+
+
 @bot.event
 async def on_message(message: discord.Message):
     """
@@ -48,26 +232,15 @@ async def on_message(message: discord.Message):
 
     https://discordpy.readthedocs.io/en/latest/api.html#discord.on_message
     """
+    if recorder:
+        recorder.record(message, bot.user)
+
     # Don't delete this line! It's necessary for the bot to process commands.
     await bot.process_commands(message)
 
-    # Ignore messages from self or other bots to prevent infinite loops
-    if (
-        message.author.bot  # Ignore messages if it's from the bot
-        or message.content.startswith("!")  # Ignore messages if it's a generic command
-        or bot.user
-        not in message.mentions  # Ignore messages if it's not mentioning the bot
-    ):
-        return
-
-    # Process the message with the agent you wrote
-    # Open up the agent.py file to customize the agent
-    logger.info(f"Processing message from {message.author}: {message.content}")
-    response = await agent.run(message)
-
-    # Send the response back to the channel
-    if response:
-        await message.reply(response)
+    # Shared with the replay driver in benchmarks/replay.py
+    if agent:
+        await agent.handle_message(message)
 
 
 # Commands
@@ -84,5 +257,59 @@ async def ping(ctx, *, arg=None):
         await ctx.send(f"Pong! Your argument was {arg}")
 
 
+async def _owner_only(ctx) -> bool:
+    """Reports whether the author owns the bot, telling them off if not; for views spanning every guild."""
+    if await bot.is_owner(ctx.author):
+        return True
+    await ctx.send("Only the bot owner can use this command.")
+    return False
+
+
+@bot.command(name="llmstats", help="Shows LLM mode, cache, fast-path and gateway metrics (bot owner only).")
+async def llmstats(ctx):
+    if agent is None:
+        await ctx.send("The agent isn't ready yet.")
+        return
+    if await _owner_only(ctx):
+        await ctx.send(agent.llm_report())
+
+
+@bot.command(name="actionstats", help="Shows per-bucket queue depth and wait times of Discord actions (bot owner only).")
+async def actionstats(ctx):
+    if agent is None:
+        await ctx.send("The agent isn't ready yet.")
+        return
+    if await _owner_only(ctx):
+        await ctx.send(agent.discord_agent.executor.report())
+
+
+@bot.command(name="stats", help="Shows per-stage latency of requests, optionally for one command (bot owner only).")
+async def stats(ctx, command: str = None):
+    if agent is None:
+        await ctx.send("The agent isn't ready yet.")
+        return
+    if await _owner_only(ctx):
+        await ctx.send(agent.metrics.report(command))
+
+
+@bot.command(
+    name="usage",
+    help="Shows your LLM usage today; administrators see the server's, the bot owner `!usage all`.",
+)
+async def usage(ctx, scope: str = None):
+    if agent is None:
+        await ctx.send("The agent isn't ready yet.")
+        return
+    if scope == "all":
+        if await _owner_only(ctx):
+            await ctx.send(agent.usage.report())
+        return
+    if ctx.guild and ctx.author.guild_permissions.administrator:
+        report = agent.usage.report_guild(ctx.guild.id)
+    else:
+        report = agent.usage.report_user(ctx.author.id)
+    await ctx.send(report, allowed_mentions=discord.AllowedMentions.none())
+
+
 # Start the bot, connecting it to the gateway
 bot.run(token)
@@ -0,0 +1,81 @@
+import os
+import sys
+from collections import OrderedDict, deque
+
+import discord
+
+CHANNEL_CONTEXT_BYTES = int(os.getenv("CHANNEL_CONTEXT_BYTES", "4096"))  # Per channel
+CHANNEL_CONTEXT_TOTAL_BYTES = int(os.getenv("CHANNEL_CONTEXT_TOTAL_BYTES", str(16 * 1024 * 1024)))
+CHANNEL_CONTEXT_MESSAGES = 30  # Most messages kept per channel, whatever their size
+CHANNEL_CONTEXT_LINE_CHARS = 400  # Longer messages are truncated before they are stored
+
+
+class _Ring:
+    __slots__ = ("entries", "bytes")
+
+    def __init__(self):
+        self.entries = deque()  # (message_id, line), oldest first
+        self.bytes = 0
+
+
+class ChannelContextBuffer:
+    """
+    Passive record of the last few messages in every channel the bot can
+    see, fed from on_message, so the prompt can include what was said
+    around a request without fetching channel history.
+
+    Each channel is capped by bytes and message count; channels are
+    evicted least recently active first once the total cap is reached.
+    """
+
+    def __init__(self, channel_bytes: int = CHANNEL_CONTEXT_BYTES,
+                 total_bytes: int = CHANNEL_CONTEXT_TOTAL_BYTES):
+        self.channel_bytes = channel_bytes
+        self.max_total_bytes = total_bytes
+        self._channels = OrderedDict()  # channel_id -> _Ring, least recently active first
+        self.total_bytes = 0
+
+    def record(self, message: discord.Message):
+        if not message.guild or not message.content:
+            return
+        content = message.content
+        if len(content) > CHANNEL_CONTEXT_LINE_CHARS:
+            content = content[:CHANNEL_CONTEXT_LINE_CHARS] + "…"
+        line = f"{sys.intern(message.author.display_name)}: {content}"
+        size = len(line.encode())
+
+        ring = self._channels.get(message.channel.id)
+        if ring is None:
+            ring = self._channels[message.channel.id] = _Ring()
+        else:
+            self._channels.move_to_end(message.channel.id)
+        ring.entries.append((message.id, line))
+        ring.bytes += size
+        self.total_bytes += size
+        while ring.entries and (ring.bytes > self.channel_bytes or len(ring.entries) > CHANNEL_CONTEXT_MESSAGES):
+            self._drop_oldest(ring)
+
+        while self.total_bytes > self.max_total_bytes and len(self._channels) > 1:
+            _, oldest = self._channels.popitem(last=False)
+            self.total_bytes -= oldest.bytes
+
+    def _drop_oldest(self, ring: _Ring):
+        _, line = ring.entries.popleft()
+        size = len(line.encode())
+        ring.bytes -= size
+        self.total_bytes -= size
+
+    def forget_channel(self, channel_id: int):
+        ring = self._channels.pop(channel_id, None)
+        if ring is not None:
+            self.total_bytes -= ring.bytes
+
+    def recent(self, channel_id: int, exclude_id: int = None) -> str:
+        """Returns the channel's buffered messages as 'name: content' lines, oldest first."""
+        ring = self._channels.get(channel_id)
+        if ring is None:
+            return ""
+        return "\n".join(line for message_id, line in ring.entries if message_id != exclude_id)
+
+    def stats(self) -> dict:
+        return {"channels": len(self._channels), "bytes": self.total_bytes}
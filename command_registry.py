@@ -0,0 +1,451 @@
+import json
+import re
+
+
+class CommandParseError(ValueError):
+    """Raised when a command call in the model output is malformed."""
+
+
+class CommandArgumentError(ValueError):
+    """Raised when a parsed call doesn't satisfy its command spec. The message is shown to the user."""
+
+
+class Arg:
+    """
+    A single command argument.
+
+    kind controls how the raw value is coerced: "string", "int", "bool",
+    "array", "groups" (array of arrays), "mention" (user, `<@id>` or a bare
+    name) or "channel" (`<#id>`).
+    description is the human-readable type shown to the model.
+    """
+
+    __slots__ = ("name", "kind", "description", "required", "missing")
+
+    def __init__(self, name: str, kind: str, description: str, required: bool = True, missing: str = None):
+        self.name = name
+        self.kind = kind
+        self.description = description
+        self.required = required
+        self.missing = missing  # Message shown when a required argument is absent
+
+
+class CommandSpec:
+    """A command the model can call: its name, description and arguments."""
+
+    __slots__ = ("name", "description", "args", "arg_map")
+
+    def __init__(self, name: str, description: str, args: list = ()):
+        self.name = name
+        self.description = description
+        self.args = list(args)
+        self.arg_map = {arg.name: arg for arg in self.args}
+
+    def signature(self) -> str:
+        args = ", ".join(f"{arg.name}: {arg.description}" for arg in self.args)
+        return f"{self.name}({args})"
+
+
+class ParsedCall:
+    """A command call parsed out of model output."""
+
+    __slots__ = ("name", "args")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __repr__(self):
+        return f"ParsedCall({self.name!r}, {self.args!r})"
+
+
+COMMANDS = [
+    CommandSpec(
+        "create_channel",
+        "Creates a new channel in the server.",
+        [
+            Arg("channel_name", "string", "string",
+                missing="No channel name found. Please specify the name for the new channel."),
+            Arg("channel_type", "string", "optional string: 'text' or 'voice'", required=False),
+            Arg("category", "string", "optional string", required=False),
+            Arg("private", "bool", "optional boolean", required=False),
+        ],
+    ),
+    CommandSpec(
+        "create_group_chat",
+        "Creates a private thread with the mentioned users, or one thread per group.",
+        [
+            Arg("user_mentions", "array", "array", required=False),
+            Arg("groups", "groups", "optional array of arrays: one list of user mentions per thread",
+                required=False),
+        ],
+    ),
+    CommandSpec(
+        "invite_user_to_channel",
+        "Add user(s) to existing channel.",
+        [
+            Arg("user_mentions", "array", "array",
+                missing="No user mentioned. Please specify the user(s) you want to add to the channel."),
+            Arg("channel_mentions", "array", "array",
+                missing="No channel mentioned. Please specify the channel you want to add new users to."),
+            Arg("shared", "bool", "optional boolean: one multi-use invite per channel instead of one per user",
+                required=False),
+        ],
+    ),
+    CommandSpec(
+        "mute_member_from_channel",
+        "Mute user(s) in existing channel.",
+        [
+            Arg("user_mentions", "array", "array",
+                missing="No user mentioned. Please specify the user(s) you want to mute."),
+            Arg("channel_mentions", "array", "array",
+                missing="No channel mentioned. Please specify the channel to mute them in."),
+        ],
+    ),
+    CommandSpec(
+        "unmute_member_from_channel",
+        "Unmute user(s) in existing channel.",
+        [
+            Arg("user_mentions", "array", "array",
+                missing="No user mentioned. Please specify the user(s) you want to unmute."),
+            Arg("channel_mentions", "array", "array",
+                missing="No channel mentioned. Please specify the channel to unmute them in."),
+        ],
+    ),
+    CommandSpec(
+        "create_poll",
+        "Creates a poll in the channel.",
+        [
+            Arg("question", "string", "string",
+                missing="No question found. Please specify the question for the poll."),
+            Arg("answers", "array", "array of strings",
+                missing="No answers found. Please specify the answers for the poll."),
+            Arg("duration", "int", "optional int in hours", required=False),
+        ],
+    ),
+    CommandSpec(
+        "change_bot_avatar",
+        "Changes the bot's avatar.",
+        [
+            Arg("bot_mention", "mention", "mention", required=False),
+            Arg("url", "string", "string", required=False),
+        ],
+    ),
+    CommandSpec(
+        "change_bot_name",
+        "Changes the bot's name.",
+        [
+            Arg("bot_mention", "mention", "mention", required=False),
+            Arg("new_name", "string", "string", required=False),
+        ],
+    ),
+    CommandSpec(
+        "assign_role",
+        "Assigns a role to a user.",
+        [
+            Arg("member", "mention", "mention", required=False),
+            Arg("role_name", "string", "string", required=False),
+        ],
+    ),
+    CommandSpec(
+        "create_role",
+        "Creates a new role.",
+        [
+            Arg("role_name", "string", "string", required=False),
+        ],
+    ),
+    CommandSpec(
+        "revoke_role",
+        "Revokes a role from a user.",
+        [
+            Arg("member", "mention", "mention", required=False),
+            Arg("role_name", "string", "string", required=False),
+        ],
+    ),
+    CommandSpec(
+        "create_scheduled_event",
+        "Creates a new scheduled event.",
+        [
+            Arg("event_name", "string", "string"),
+            Arg("start_datetime", "string", "string (e.g., '2025-03-10 15:30' or '03/10/2025 3:30 PM')"),
+            Arg("voice_channel", "channel", "string (channel mention or ID)"),
+            Arg("event_topic", "string", "string"),
+        ],
+    ),
+    CommandSpec(
+        "summarize_server_activity",
+        "Generates a summary of recent server activity.",
+    ),
+    CommandSpec(
+        "send_automated_message",
+        "Sends or schedules automated messages.",
+        [
+            Arg("target_type", "string", "string: 'dm' or 'channel'"),
+            Arg("target", "mention", "mention: user or channel"),
+            Arg("message", "string", "string"),
+            Arg("schedule_time", "string", "optional string: time to send message", required=False),
+        ],
+    ),
+    CommandSpec(
+        "send_welcome_message",
+        "Sends a welcome message to a user.",
+        [
+            Arg("target", "mention", "mention", missing="Please specify a target user!"),
+            Arg("custom_message", "string", "optional string", required=False),
+        ],
+    ),
+    CommandSpec(
+        "change_channel_name",
+        "Changes a channel's name.",
+        [
+            Arg("channel", "channel", "channel mention", missing="Please provide both channel and new name!"),
+            Arg("new_name", "string", "string", missing="Please provide both channel and new name!"),
+        ],
+    ),
+]
+
+REGISTRY = {spec.name: spec for spec in COMMANDS}
+
+# One alternation over every command name. \b keeps mute_member_from_channel
+# from matching inside unmute_member_from_channel, and the leftmost call wins.
+_CALL_RE = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, REGISTRY), key=len, reverse=True)) + r")\s*\("
+)
+_USER_MENTION_RE = re.compile(r"<@!?(\d+)>")
+_CHANNEL_MENTION_RE = re.compile(r"<#!?(\d+)>")
+_KEY_RE = re.compile(r"\s*([A-Za-z_]\w*)\s*=")
+
+
+def prompt_section() -> str:
+    """Renders the command list for the system prompt."""
+    return "\n".join(f"- {spec.signature()}: {spec.description}" for spec in COMMANDS)
+
+
+_JSON_TYPES = {
+    "string": {"type": "string"},
+    "int": {"type": "integer"},
+    "bool": {"type": "boolean"},
+    "array": {"type": "array", "items": {"type": "string"}},
+    "groups": {"type": "array", "items": {"type": "array", "items": {"type": "string"}}},
+    "mention": {"type": "string"},
+    "channel": {"type": "string"},
+}
+
+
+def tool_definitions() -> list:
+    """Renders the registry as Mistral function-calling tool definitions."""
+    tools = []
+    for spec in COMMANDS:
+        properties = {
+            arg.name: {**_JSON_TYPES[arg.kind], "description": arg.description}
+            for arg in spec.args
+        }
+        tools.append({
+            "type": "function",
+            "function": {
+                "name": spec.name,
+                "description": spec.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": [arg.name for arg in spec.args if arg.required],
+                },
+            },
+        })
+    return tools
+
+
+def parse_tool_call(tool_call):
+    """
+    Converts a tool call returned by the model into a ParsedCall, or None
+    if it names an unknown command. Arguments may arrive as a JSON string
+    or an already-decoded dict.
+    """
+    return make_tool_call(tool_call.function.name, tool_call.function.arguments)
+
+
+def make_tool_call(name: str, arguments):
+    """Builds a ParsedCall from a tool name and its JSON (or decoded) arguments."""
+    if name not in REGISTRY:
+        return None
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments) if arguments.strip() else {}
+        except json.JSONDecodeError as e:
+            raise CommandParseError(f"invalid tool arguments: {e}")
+    if not isinstance(arguments, dict):
+        raise CommandParseError("tool arguments must be an object")
+    return ParsedCall(name, arguments)
+
+
+def user_mention_id(value: str):
+    """Returns the user ID in a `<@id>` mention, or None."""
+    match = _USER_MENTION_RE.search(value or "")
+    return int(match.group(1)) if match else None
+
+
+def channel_mention_id(value: str):
+    """Returns the channel ID in a `<#id>` mention, or None."""
+    match = _CHANNEL_MENTION_RE.search(value or "")
+    return int(match.group(1)) if match else None
+
+
+def find_call(content: str):
+    """Returns (name, index just past the opening paren) of the first command call, or None."""
+    match = _CALL_RE.search(content)
+    if not match:
+        return None
+    return match.group(1), match.end()
+
+
+def parse_command(content: str):
+    """
+    Parses the first `name(arg=value, ...)` call in the model output in a
+    single pass. Returns a ParsedCall, or None when the output contains no
+    known command. Raises CommandParseError on malformed calls.
+    """
+    found = find_call(content)
+    if not found:
+        return None
+    name, pos = found
+    args, _ = _parse_args(content, pos)
+    return ParsedCall(name, args)
+
+
+def _parse_args(text: str, pos: int):
+    args = {}
+    length = len(text)
+    while True:
+        pos = _skip_space(text, pos)
+        if pos >= length:
+            raise CommandParseError("unterminated argument list")
+        if text[pos] == ")":
+            return args, pos + 1
+        key_match = _KEY_RE.match(text, pos)
+        if not key_match:
+            raise CommandParseError(f"expected 'name=value' at position {pos}")
+        value, pos = _parse_value(text, key_match.end())
+        args[key_match.group(1)] = value
+        pos = _skip_space(text, pos)
+        if pos < length and text[pos] == ",":
+            pos += 1
+
+
+def _parse_value(text: str, pos: int):
+    pos = _skip_space(text, pos)
+    if pos >= len(text):
+        raise CommandParseError("missing value")
+    char = text[pos]
+    if char in "\"'":
+        return _parse_string(text, pos)
+    if char == "[":
+        return _parse_list(text, pos + 1)
+    return _parse_bare(text, pos)
+
+
+def _parse_string(text: str, pos: int):
+    quote = text[pos]
+    pos += 1
+    chars = []
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\" and pos + 1 < len(text):
+            chars.append(text[pos + 1])
+            pos += 2
+            continue
+        if char == quote:
+            return "".join(chars), pos + 1
+        chars.append(char)
+        pos += 1
+    raise CommandParseError("unterminated string")
+
+
+def _parse_list(text: str, pos: int):
+    items = []
+    while True:
+        pos = _skip_space(text, pos)
+        if pos >= len(text):
+            raise CommandParseError("unterminated list")
+        if text[pos] == "]":
+            return items, pos + 1
+        if text[pos] == ")":
+            raise CommandParseError("unterminated list")
+        value, pos = _parse_value(text, pos)
+        if value is not None:
+            items.append(value)
+        pos = _skip_space(text, pos)
+        if pos < len(text) and text[pos] == ",":
+            pos += 1
+
+
+def _parse_bare(text: str, pos: int):
+    """Reads an unquoted value such as a mention, number, boolean or `?`."""
+    start = pos
+    while pos < len(text) and text[pos] not in ",)]":
+        pos += 1
+    value = text[start:pos].strip()
+    if value in ("", "?", "None", "null"):
+        value = None
+    return value, pos
+
+
+def _skip_space(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def validate(call: ParsedCall) -> dict:
+    """
+    Checks a parsed call against its spec and coerces each value to the
+    argument's kind. Unknown arguments are dropped; optional arguments that
+    weren't given are returned as None. Raises CommandArgumentError.
+    """
+    spec = REGISTRY[call.name]
+    values = {}
+    missing = []
+    for arg in spec.args:
+        value = call.args.get(arg.name)
+        if value is None or value == [] or value == "":
+            if arg.required:
+                missing.append(arg)
+            values[arg.name] = None
+            continue
+        values[arg.name] = _coerce(arg, value)
+
+    if missing:
+        if missing[0].missing:
+            raise CommandArgumentError(missing[0].missing)
+        raise CommandArgumentError(f"Missing required parameter(s): {', '.join(arg.name for arg in missing)}")
+    return values
+
+
+def _coerce(arg: Arg, value):
+    if arg.kind == "groups":
+        if not isinstance(value, list):
+            raise CommandArgumentError(f"Invalid value for {arg.name}: expected a list of lists.")
+        groups = [_coerce(Arg(arg.name, "array", "array"), group) for group in value]
+        return [group for group in groups if group]
+    if arg.kind == "array":
+        if isinstance(value, list):
+            return [str(item).strip() for item in value]
+        return [item.strip() for item in str(value).split(",") if item.strip()]
+    if isinstance(value, list):
+        raise CommandArgumentError(f"Invalid value for {arg.name}: expected a single {arg.kind}.")
+    if arg.kind == "int":
+        # Accept 2, 2.0 and "2"; reject 2.5, objects and booleans instead of truncating or crashing
+        try:
+            number = float(value) if isinstance(value, str) else value
+            if isinstance(number, bool) or not isinstance(number, (int, float)) or number != int(number):
+                raise ValueError(value)
+            return int(number)
+        except (TypeError, ValueError, OverflowError):
+            raise CommandArgumentError(f"Invalid value for {arg.name}: expected a whole number.")
+    if arg.kind == "bool":
+        if isinstance(value, bool):
+            return value
+        lowered = str(value).lower()
+        if lowered not in ("true", "false"):
+            raise CommandArgumentError(f"Invalid value for {arg.name}: expected true or false.")
+        return lowered == "true"
+    return str(value).strip()
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+
+import discord
+
+from member_context import estimate_tokens
+
+logger = logging.getLogger("discord")
+
+# "count" keeps the last HISTORY_LIMIT messages verbatim. "tokens" keeps
+# recent messages verbatim within HISTORY_TOKEN_BUDGET and folds older ones
+# into a rolling summary written in the background.
+HISTORY_MODE = os.getenv("HISTORY_MODE", "count")
+HISTORY_LIMIT = 10  # Messages kept per guild in count mode
+HISTORY_MAX_TURNS = 50  # Hard cap on verbatim messages per guild in tokens mode
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "800"))  # Summary plus verbatim turns
+HISTORY_SUMMARY_TOKENS = 200  # Part of the budget reserved for the summary
+HISTORY_MAX_PENDING = 100  # Messages awaiting summarization; older ones are dropped
+HISTORY_MAX_BYTES = int(os.getenv("HISTORY_MAX_BYTES", str(32 * 1024 * 1024)))  # Across all guilds
+HISTORY_IDLE_TTL = float(os.getenv("HISTORY_IDLE_TTL", str(24 * 3600)))  # Seconds before a quiet guild is dropped
+ENTRY_OVERHEAD = 120  # Approximate bytes of a slotted entry plus its deque slot
+
+
+class HistoryEntry:
+    __slots__ = ("author", "content", "timestamp")
+
+    def __init__(self, author: str, content: str, timestamp: float):
+        self.author = author  # Interned, so repeated authors share one string
+        self.content = content
+        self.timestamp = timestamp
+
+    def line(self) -> str:
+        return f"{self.author}: {self.content}"
+
+    def size(self) -> int:
+        return ENTRY_OVERHEAD + sys.getsizeof(self.content)
+
+
+class GuildHistory:
+    """
+    One guild's recent messages and their rendered prompt text, plus the
+    rolling summary and the messages waiting to be folded into it.
+    """
+
+    __slots__ = ("entries", "bytes", "tokens", "last_used", "rendered", "summary", "pending", "summarizing")
+
+    def __init__(self):
+        self.entries = deque()
+        self.bytes = 0
+        self.tokens = 0  # Estimated tokens of the verbatim entries
+        self.last_used = time.monotonic()
+        self.rendered = ""  # "\n"-joined lines of entries, kept up to date on append and pop
+        self.summary = ""
+        self.pending = []  # Entries dropped from the verbatim window, not yet summarized
+        self.summarizing = False
+
+    def append(self, entry: HistoryEntry):
+        line = entry.line()
+        self.entries.append(entry)
+        self.rendered = f"{self.rendered}\n{line}" if self.rendered else line
+        self.bytes += entry.size()
+        self.tokens += estimate_tokens(line)
+
+    def pop_oldest(self) -> HistoryEntry:
+        entry = self.entries.popleft()
+        line = entry.line()
+        # Cut the dropped line and its separator off the front instead of re-rendering
+        self.rendered = self.rendered[len(line) + 1:]
+        self.bytes -= entry.size()
+        self.tokens -= estimate_tokens(line)
+        return entry
+
+    def render(self) -> str:
+        if self.summary:
+            return f"(Summary of earlier conversation: {self.summary})\n{self.rendered}"
+        return self.rendered
+
+
+class ConversationHistory:
+    """
+    Recent bot conversation per guild under a global memory cap. Guilds
+    are kept in least-recently-used order; the oldest are evicted once the
+    cap is exceeded or after they have been idle for HISTORY_IDLE_TTL.
+
+    With a token_budget and a summarizer, messages that no longer fit the
+    verbatim window are handed to summarizer(guild_id, previous summary, lines) in a
+    background task, so the rendered history stays about the same size
+    however long the conversation runs.
+    """
+
+    def __init__(self, limit: int = HISTORY_LIMIT, max_bytes: int = HISTORY_MAX_BYTES,
+                 idle_ttl: float = HISTORY_IDLE_TTL, token_budget: int = None, summarizer=None):
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self._guilds = OrderedDict()  # guild_id -> GuildHistory, least recently used first
+        self._tasks = set()  # Running summarization tasks
+        self.total_bytes = 0
+        self.evictions = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def __len__(self):
+        return len(self._guilds)
+
+    def add(self, guild_id: int, message: discord.Message):
+        history = self._guilds.get(guild_id)
+        if history is None:
+            history = self._guilds[guild_id] = GuildHistory()
+        self._touch(guild_id, history)
+        before = history.bytes
+        entry = HistoryEntry(sys.intern(message.author.name), message.content, message.created_at.timestamp())
+        history.append(entry)
+        self._trim(guild_id, history)
+        self.total_bytes += history.bytes - before
+        self._evict(keep=guild_id)
+
+    def _trim(self, guild_id: int, history: GuildHistory):
+        verbatim_budget = None
+        if self.token_budget is not None:
+            verbatim_budget = self.token_budget - HISTORY_SUMMARY_TOKENS
+        while len(history.entries) > 1 and (
+            len(history.entries) > self.limit
+            or (verbatim_budget is not None and history.tokens > verbatim_budget)
+        ):
+            entry = history.pop_oldest()
+            if self.summarizer is not None:
+                history.pending.append(entry)
+                history.bytes += entry.size()
+        if len(history.pending) > HISTORY_MAX_PENDING:
+            # Summaries are falling behind; forget the oldest unsummarized messages
+            dropped = history.pending[:-HISTORY_MAX_PENDING]
+            del history.pending[:-HISTORY_MAX_PENDING]
+            history.bytes -= sum(entry.size() for entry in dropped)
+        if history.pending and not history.summarizing:
+            history.summarizing = True
+            task = asyncio.create_task(self._summarize(guild_id, history))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, guild_id: int, history: GuildHistory):
+        """Folds pending messages into the guild's summary until none are left."""
+        try:
+            while history.pending:
+                batch = history.pending
+                history.pending = []
+                try:
+                    summary = await self.summarizer(guild_id, history.summary, [entry.line() for entry in batch])
+                except Exception as e:
+                    self.summary_failures += 1
+                    logger.warning(f"History summary for guild {guild_id} failed: {e}")
+                    history.pending = batch + history.pending
+                    return
+
+                before = history.bytes
+                history.bytes += sys.getsizeof(summary) - sys.getsizeof(history.summary)
+                history.bytes -= sum(entry.size() for entry in batch)
+                history.summary = summary
+                self.summaries += 1
+                if self._guilds.get(guild_id) is history:
+                    self.total_bytes += history.bytes - before
+        finally:
+            history.summarizing = False
+
+    def render(self, guild_id: int) -> str:
+        """Returns the guild's history as 'author: content' lines, oldest first, after any summary."""
+        history = self._guilds.get(guild_id)
+        if history is None:
+            return ""
+        self._touch(guild_id, history)
+        return history.render()
+
+    def _touch(self, guild_id: int, history: GuildHistory):
+        history.last_used = time.monotonic()
+        self._guilds.move_to_end(guild_id)
+
+    def _evict(self, keep: int):
+        now = time.monotonic()
+        while self._guilds:
+            guild_id, history = next(iter(self._guilds.items()))
+            if guild_id == keep:
+                break
+            if self.total_bytes <= self.max_bytes and now - history.last_used < self.idle_ttl:
+                break
+            del self._guilds[guild_id]
+            self.total_bytes -= history.bytes
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "guilds": len(self._guilds),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+        }
@@ -4,24 +4,71 @@ import discord
 import datetime
 import asyncio
 from typing import Union
+import logging
 import re  # Add this import
+import weakref
+from action_executor import ActionExecutor, channel_bucket, guild_bucket, user_bucket
+from activity_tracker import ActivityTracker
+from guild_index import GuildLookup
+from member_index import MemberDirectory
+from scheduler import MessageScheduler
+from sessions import SessionStore
+
+logger = logging.getLogger("discord")
+
+SUMMARY_EDIT_INTERVAL = 2  # Seconds between edits of a streaming summary
+OVERWRITE_CONCURRENCY = 5  # Channels whose permission overwrites are edited at once
+INVITE_CONCURRENCY = 5  # Invites created at once; discord.py waits out 429s per request
+INVITE_EDIT_INTERVAL = 2  # Seconds between progress edits while invites are created
+THREAD_CONCURRENCY = 3  # Group threads created at once for a multi-group request
+THREAD_MEMBER_CONCURRENCY = 5  # Users added to one thread at once
+CANCEL_WORDS = ("cancel", "never mind", "nevermind", "stop")  # Answers that close a follow-up question
+
+
+class _OverwriteState:
+    """Serializes overwrite edits of one channel and remembers the last map written to it."""
+
+    __slots__ = ("lock", "latest", "__weakref__")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.latest = None  # Overwrites last written, ahead of the channel cache until its update event arrives
 
 
 class DiscordAgent:
     def __init__(self, bot=None):
         self.bot = bot
-        self.waiting_for_bot = {}
-        self.waiting_for_role = {}  # Store user IDs waiting for role name
-        self.waiting_for_member = {}  # Store user IDs waiting for member with role name
-        self.role_for_member = {}  # Store role name waiting for member
-        self.waiting_for_role_name = {}  # Store user IDs waiting for new role name
-        self.waiting_for_revoke_role = {}  # Store user IDs waiting for role to revoke
-        self.waiting_for_revoke_member = (
-            {}
-        )  # Store user IDs waiting for member to revoke from
-        self.revoke_role_for_member = (
-            {}
-        )  # Store role name waiting for member to revoke from
+        self.executor = ActionExecutor()  # Every Discord mutation goes through here
+        self.activity = ActivityTracker()  # Live per-guild activity counters
+        self.scheduler = MessageScheduler(bot, executor=self.executor)  # Durable timer for scheduled messages
+        self.members = MemberDirectory()  # Per-guild member name index
+        self.lookup = GuildLookup()  # Per-guild role, channel and category name index
+        self.sessions = SessionStore()  # Follow-up questions waiting for the user's reply
+        self._overwrite_states = weakref.WeakValueDictionary()  # channel_id -> _OverwriteState while edits run
+        # Session kind -> method that finishes the command from the reply
+        self.session_handlers = {
+            "assign_role_name": self._resume_assign_role_name,
+            "assign_role_member": self._resume_assign_role_member,
+            "create_role_name": self._resume_create_role_name,
+            "revoke_role_name": self._resume_revoke_role_name,
+            "revoke_role_member": self._resume_revoke_role_member,
+        }
+
+    async def send_message(self, channel, content=None, **kwargs):
+        """Sends a message to a channel through the executor."""
+        return await self.executor.run(channel_bucket(channel, "send"), channel.send, content, **kwargs)
+
+    async def reply_to(self, message: discord.Message, content=None, **kwargs):
+        """Replies to a message through the executor."""
+        return await self.executor.run(
+            channel_bucket(message.channel, "send"), message.reply, content, **kwargs
+        )
+
+    async def edit_message(self, sent: discord.Message, **kwargs):
+        """Edits one of the bot's messages (progress updates, streamed replies) through the executor."""
+        return await self.executor.run(
+            channel_bucket(sent.channel, "message_edit"), sent.edit, idempotent=True, **kwargs
+        )
 
     def get_user_by_id(self, user_id: str):
         try:
@@ -41,20 +88,6 @@ class DiscordAgent:
         except ValueError:
             return None
 
-    async def get_users_in_message(self, message: discord.Message):
-        try:
-            members = message.channel.members
-            return [
-                {
-                    "id": member.id,
-                    "display_name": member.display_name,
-                    "name": member.name,
-                }
-                for member in members
-            ]
-        except discord.NotFound:
-            return None
-
     async def get_channel_mentions_in_message(self, message: discord.Message):
         try:
             channels = message.channel_mentions
@@ -89,16 +122,42 @@ class DiscordAgent:
     
         
 
+    async def _add_thread_members(self, thread: discord.Thread, users) -> list:
+        """
+        Adds users to a thread concurrently; the executor retries rate-limited
+        and server-side failures. Returns the users that couldn't be added.
+        """
+        semaphore = asyncio.Semaphore(THREAD_MEMBER_CONCURRENCY)
+
+        async def add(user):
+            async with semaphore:
+                try:
+                    await self.executor.run(channel_bucket(thread, "members"), thread.add_user, user, idempotent=True)
+                    return None
+                except discord.HTTPException:
+                    return user
+
+        results = await asyncio.gather(*(add(user) for user in users))
+        return [user for user in results if user is not None]
+
     async def create_group_chat(
         self,
         message: discord.Message,
         user_mentions: list[str],
     ):
+        _, _, text = await self._create_group_thread(message, user_mentions)
+        return text
+
+    async def _create_group_thread(self, message: discord.Message, user_mentions: list[str]):
+        """
+        Creates one private thread and adds the mentioned users. Returns
+        (created, users that couldn't be added, reply text).
+        """
         discord_users = self.get_user_mentions(user_mentions)
 
         # Check if we found any valid users
         if not discord_users:
-            return "No valid users found. Please check the user IDs."
+            return False, [], "No valid users found. Please check the user IDs."
 
         # Create a list of usernames for the thread name
         mentioned_users = [user.display_name for user in discord_users]
@@ -106,60 +165,125 @@ class DiscordAgent:
 
         try:
             # Create a private thread
-            thread = await message.channel.create_thread(
+            thread = await self.executor.run(
+                channel_bucket(message.channel, "threads"),
+                message.channel.create_thread,
                 name=thread_name,
                 type=discord.ChannelType.private_thread,
                 invitable=False,  # Only moderators can add users
             )
 
             # Add mentioned users to the thread
-            for user in discord_users:
-                await thread.add_user(user)
+            failed = await self._add_thread_members(thread, discord_users)
+            added = [user for user in discord_users if user not in failed]
 
             # Create mentions for the welcome message
-            user_mentions_str = ", ".join([user.mention for user in discord_users])
-            await thread.send(f"Private thread created! Welcome {user_mentions_str}!")
+            user_mentions_str = ", ".join([user.mention for user in added])
+            await self.executor.run(
+                channel_bucket(thread, "send"), thread.send, f"Private thread created! Welcome {user_mentions_str}!"
+            )
 
-            return "Private thread created!"
+            if failed:
+                names = ", ".join(user.display_name for user in failed)
+                return True, failed, f"Private thread created, but I couldn't add {names}."
+            return True, [], "Private thread created!"
 
         except discord.Forbidden:
-            return "I don't have permission to create private threads!"
+            return False, [], "I don't have permission to create private threads!"
         except discord.HTTPException:
-            return "Failed to create the thread. Please try again later."
+            return False, [], "Failed to create the thread. Please try again later."
+
+    async def create_group_chats(
+        self,
+        message: discord.Message,
+        groups: list[list[str]],
+    ):
+        """Creates one private thread per group of user mentions, several at a time."""
+        semaphore = asyncio.Semaphore(THREAD_CONCURRENCY)
+
+        async def create(user_mentions):
+            async with semaphore:
+                return await self._create_group_thread(message, user_mentions)
+
+        results = await asyncio.gather(*(create(group) for group in groups))
+        created = sum(ok for ok, _, _ in results)
+        problems = [
+            f"Group {index}: {text}"
+            for index, (ok, failed, text) in enumerate(results, start=1)
+            if not ok or failed
+        ]
+        return "\n".join([f"Created {created} of {len(groups)} private threads!"] + problems)
 
     async def invite_member_to_channel(
         self,
         message: discord.Message,
         user_mentions: list[str],
         channel_mentions: list[str],
+        shared: bool = False,
     ):
 
-        discord_users = self.get_user_mentions(user_mentions)
+        # Duplicate mentions would otherwise get duplicate invites
+        discord_users = list({user.id: user for user in self.get_user_mentions(user_mentions)}.values())
         # Check if we found any valid users
         if not discord_users:
             return "No valid users found. Please check the user IDs."
 
-        channels = self.get_channel_mentions(channel_mentions)
+        channels = list({channel.id: channel for channel in self.get_channel_mentions(channel_mentions)}.values())
         # Check if we found any valid channels
         if not channels:
             return "No valid channels found. Please check the channel IDs."
 
         mentioned_users = [user.display_name for user in discord_users]
         mentioned_channels = [channel.name for channel in channels]
-        res_message = await message.reply(
-            f"Creating invites for {', '.join(mentioned_users)} to Channel {', '.join(mentioned_channels)}"
-        )
+        header = f"Creating invites for {', '.join(mentioned_users)} to Channel {', '.join(mentioned_channels)}"
+        res_message = await self.reply_to(message, header)
+
+        # One invite per (channel, user), or one shared invite per channel sized to the user count
+        if shared:
+            jobs = [(channel, None) for channel in channels]
+        else:
+            jobs = [(channel, user) for channel in channels for user in discord_users]
+        invites = {}  # (channel id, user id or None) -> invite url or error
+        semaphore = asyncio.Semaphore(INVITE_CONCURRENCY)
+
+        async def create(channel, user):
+            max_uses = len(discord_users) if user is None else 1
+            key = (channel.id, user.id if user else None)
+            async with semaphore:
+                try:
+                    invite = await self.executor.run(
+                        channel_bucket(channel, "invites"), channel.create_invite, max_uses=max_uses, unique=True
+                    )
+                    invites[key] = invite.url
+                except discord.Forbidden:
+                    invites[key] = "missing permission"
+                except discord.HTTPException:
+                    invites[key] = "failed, please try again later"
+
+        batch = asyncio.ensure_future(asyncio.gather(*(create(channel, user) for channel, user in jobs)))
+        while not batch.done():
+            await asyncio.wait({batch}, timeout=INVITE_EDIT_INTERVAL)
+            if not batch.done():
+                try:
+                    await self.edit_message(res_message, content=f"{header} ({len(invites)}/{len(jobs)})")
+                except discord.HTTPException:
+                    pass
+        await batch
+
+        lines = []
+        for channel in channels:
+            lines.append(f"{channel.name}:")
+            if shared:
+                lines.append(f"{invites[(channel.id, None)]} ({len(discord_users)} uses)")
+            else:
+                for user in discord_users:
+                    lines.append(f"{user.name}: {invites[(channel.id, user.id)]}")
+        result_message = "\n".join(lines)
 
         try:
-            result_message = ''
-            for channel in channels:
-                result_message = result_message.join([channel.name, ":", "\n"])
-                # Add mentioned users to the channel
-                for user in discord_users:
-                    invite = await channel.create_invite(max_uses=1,unique=True)
-                    result_message = result_message.join([user.name, ":", invite.url, "\n"])
-            await res_message.edit(
-                content=f"Finished creating invites for {', '.join(mentioned_users)} to Channel {', '.join(mentioned_channels)}\nHere are the invite links:\n{result_message}."
+            await self.edit_message(
+                res_message,
+                content=f"Finished creating invites for {', '.join(mentioned_users)} to Channel {', '.join(mentioned_channels)}\nHere are the invite links:\n{result_message}"
             )
 
         except discord.Forbidden:
@@ -167,6 +291,51 @@ class DiscordAgent:
         except discord.HTTPException:
             return "Failed to add users to channels. Please try again later."
 
+    async def _set_send_permission(self, channels, users, allow: bool, reason: str):
+        """
+        Sets send_messages for every user in every channel with one
+        channel.edit(overwrites=...) per channel, skipping users whose
+        overwrite already matches. Channels are edited concurrently; edits
+        of the same channel take turns, each starting from the map the
+        previous one wrote, so concurrent commands can't drop each other's
+        overwrites. Returns a result line per channel instead of stopping
+        at the first error.
+        """
+        semaphore = asyncio.Semaphore(OVERWRITE_CONCURRENCY)
+
+        async def apply(channel):
+            state = self._overwrite_states.get(channel.id)
+            if state is None:
+                state = self._overwrite_states[channel.id] = _OverwriteState()
+            async with state.lock:
+                overwrites = dict(state.latest if state.latest is not None else channel.overwrites)
+                changed = 0
+                for user in users:
+                    # Member and User compare equal by ID, so this finds an existing overwrite
+                    current = overwrites.get(user) or discord.PermissionOverwrite()
+                    if current.send_messages is allow:
+                        continue
+                    perms = discord.PermissionOverwrite.from_pair(*current.pair())
+                    perms.send_messages = allow
+                    overwrites[user] = perms
+                    changed += 1
+                if not changed:
+                    return f"{channel.name}: already up to date"
+                try:
+                    async with semaphore:
+                        await self.executor.run(
+                            channel_bucket(channel, "edit"), channel.edit, overwrites=overwrites, reason=reason,
+                            idempotent=True,
+                        )
+                except discord.Forbidden:
+                    return f"{channel.name}: missing permission"
+                except discord.HTTPException as e:
+                    return f"{channel.name}: failed ({e.status})"
+                state.latest = overwrites
+                return f"{channel.name}: updated {changed} user(s)"
+
+        return await asyncio.gather(*(apply(channel) for channel in channels))
+
     async def mute_member_from_channel(
         self,
         message: discord.Message,
@@ -186,25 +355,17 @@ class DiscordAgent:
 
         mentioned_users = [user.display_name for user in discord_users]
         mentioned_channels = [channel.name for channel in channels]
-        res_message = await message.reply(
+        res_message = await self.reply_to(
+            message,
             f"Muting {', '.join(mentioned_users)} from Channel {', '.join(mentioned_channels)}"
         )
 
-        try:
-            for channel in channels:
-                # Remove mentioned users from the channel
-                for user in discord_users:
-                    perms = channel.overwrites_for(user)
-                    perms.send_messages = False
-                    await channel.set_permissions(user, overwrite=perms, reason="Muted!")
-            await res_message.edit(
-                content=f"Finished muting {', '.join(mentioned_users)} from Channel {', '.join(mentioned_channels)}"
-            )
-
-        except discord.Forbidden:
-            return "I don't have permission to mute users to channels!"
-        except discord.HTTPException:
-            return "Failed to mute users to channels. Please try again later."
+        results = await self._set_send_permission(channels, discord_users, False, "Muted!")
+        await self.edit_message(
+            res_message,
+            content=f"Finished muting {', '.join(mentioned_users)} from Channel {', '.join(mentioned_channels)}\n"
+            + "\n".join(results)
+        )
 
     async def unmute_member_from_channel(
         self,
@@ -225,25 +386,17 @@ class DiscordAgent:
 
         mentioned_users = [user.display_name for user in discord_users]
         mentioned_channels = [channel.name for channel in channels]
-        res_message = await message.reply(
+        res_message = await self.reply_to(
+            message,
             f"Unmuting {', '.join(mentioned_users)} in Channel {', '.join(mentioned_channels)}"
         )
 
-        try:
-            for channel in channels:
-                # Remove mentioned users from the channel
-                for user in discord_users:
-                    perms = channel.overwrites_for(user)
-                    perms.send_messages = True
-                    await channel.set_permissions(user, overwrite=perms, reason="Unmuted!")
-            await res_message.edit(
-                content=f"Finish unmuting {', '.join(mentioned_users)} in Channel {', '.join(mentioned_channels)}"
-            )
-
-        except discord.Forbidden:
-            return "I don't have permission to unmute users to channels!"
-        except discord.HTTPException:
-            return "Failed to unmute users to channels. Please try again later."
+        results = await self._set_send_permission(channels, discord_users, True, "Unmuted!")
+        await self.edit_message(
+            res_message,
+            content=f"Finish unmuting {', '.join(mentioned_users)} in Channel {', '.join(mentioned_channels)}\n"
+            + "\n".join(results)
+        )
 
     async def create_poll(
         self,
@@ -262,29 +415,32 @@ class DiscordAgent:
         for answer in answers:
             poll.add_answer(text=answer)
 
-        await message.reply(poll=poll)
+        await self.reply_to(message, poll=poll)
         return None
 
     async def change_bot_avatar(
         self, message: discord.Message, bot_mention: discord.Member, image_data: bytes
     ):
         if not bot_mention.bot:
-            await message.channel.send("The mentioned user is not a bot.")
+            await self.send_message(message.channel, "The mentioned user is not a bot.")
             return
 
         if not image_data:
-            await message.channel.send("Please attach an image to change the bot's avatar.")
+            await self.send_message(message.channel, "Please attach an image to change the bot's avatar.")
             return
 
         try:
-            await self.bot.user.edit(avatar=image_data)
-            await message.channel.send(f"Bot avatar changed successfully!")
+            await self.executor.run(
+                user_bucket(self.bot.user, "edit"), self.bot.user.edit, avatar=image_data, idempotent=True
+            )
+            await self.send_message(message.channel, f"Bot avatar changed successfully!")
         except discord.HTTPException as e:
-            print(f"Error changing avatar: {str(e)}")
-            await message.channel.send(f"Error changing avatar: {str(e)}")
+            logger.error(f"Error changing avatar: {e}")
+            await self.send_message(message.channel, f"Error changing avatar: {str(e)}")
 
     async def prompt_change_avatar(self, message: discord.Message):
-        await message.channel.send(
+        await self.send_message(
+            message.channel,
             "Please mention the bot and upload an image to change its avatar.\n"
             "Example: 'change bot avatar @botname' (attach an image file)"
         )
@@ -314,18 +470,20 @@ class DiscordAgent:
     ):
         """Changes a bot's name."""
         if not bot_mention or not bot_mention.bot:
-            await message.channel.send("Please specify a valid bot to rename.")
+            await self.send_message(message.channel, "Please specify a valid bot to rename.")
             await self.prompt_change_name(message)
             return
 
         if not new_name or not new_name.strip() or not 2 <= len(new_name) <= 32:
-            await message.channel.send("Please provide a valid new name (2-32 characters).")
+            await self.send_message(message.channel, "Please provide a valid new name (2-32 characters).")
             await self.prompt_change_name(message)
             return
 
         try:
             old_name = bot_mention.display_name
-            await bot_mention.edit(nick=new_name)
+            await self.executor.run(
+                guild_bucket(bot_mention.guild, "members"), bot_mention.edit, nick=new_name, idempotent=True
+            )
             return f"Successfully changed bot's name from **{old_name}** to **{new_name}**!"
         except discord.Forbidden:
             return "I don't have permission to change the bot's name."
@@ -334,7 +492,8 @@ class DiscordAgent:
 
     async def prompt_change_name(self, message: discord.Message):
         """Sends a help message for bot name changes."""
-        await message.channel.send(
+        await self.send_message(
+            message.channel,
             "To change a bot's name, please provide the bot mention or specify the bot name and the new name.\n"
             "Example: 'change bot name @botname New Bot Name'")
 
@@ -345,57 +504,143 @@ class DiscordAgent:
         new_name: str = None,
     ):
         if not bot_mention and not new_name:
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 "Please mention the bot and provide a new name."
             )
             await self.prompt_change_name(message)
             return
         elif not bot_mention:
-            await message.channel.send("Please mention the bot you want to rename.")
+            await self.send_message(message.channel, "Please mention the bot you want to rename.")
             await self.prompt_change_name(message)
             return
         elif not new_name:
-            await message.channel.send("Please provide a new name for the bot.")
+            await self.send_message(message.channel, "Please provide a new name for the bot.")
             await self.prompt_change_name(message)
             return
 
         await self.change_bot_name(message, bot_mention, new_name)
 
 
+    async def resume_session(self, message: discord.Message) -> bool:
+        """
+        Finishes a command whose follow-up question this message answers.
+        Only a reply to the question or a message mentioning the bot counts
+        as an answer; other chatter from the author leaves the session open.
+        Returns False when the message doesn't answer an open session.
+        """
+        session = self.sessions.get(message)
+        if session is None:
+            return False
+        reference = getattr(message, "reference", None)
+        replied = reference is not None and session.prompt_id is not None and reference.message_id == session.prompt_id
+        if not replied and self.bot.user not in message.mentions:
+            return False
+        self.sessions.pop(message)
+        if self._reply_text(message).lower() in CANCEL_WORDS:
+            await self.reply_to(message, "Okay, cancelled.")
+            return True
+        await self.session_handlers[session.kind](message, **session.data)
+        return True
+
+    async def _ask_follow_up(self, message: discord.Message, kind: str, question: str, **data):
+        """Posts a follow-up question and opens the session its answer resumes."""
+        prompt = await self.send_message(
+            message.channel, f"{question}\n(Reply to this message to answer, or reply \"cancel\".)"
+        )
+        self.sessions.put(message, kind, prompt.id, **data)
+
+    def _reply_text(self, message: discord.Message) -> str:
+        """The reply's text without any mention of the bot."""
+        return re.sub(rf"<@!?{self.bot.user.id}>", "", message.content).strip()
+
+    def _reply_mention(self, message: discord.Message):
+        """The first user mentioned in a reply, ignoring the bot."""
+        for member in message.mentions:
+            if member.id != self.bot.user.id:
+                return member
+        return None
+
+    async def _session_member(self, message: discord.Message, member_id: int):
+        member = message.guild.get_member(member_id) if message.guild else None
+        if member is None:
+            await self.send_message(message.channel, "That member is no longer in the server.")
+        return member
+
+    async def _resume_assign_role_name(self, message: discord.Message, member_id: int):
+        member = await self._session_member(message, member_id)
+        if member is not None:
+            await self.assign_role(message, member, self._reply_text(message))
+
+    async def _resume_assign_role_member(self, message: discord.Message, role_name: str):
+        member = self._reply_mention(message)
+        if member is None:
+            # Keep waiting for a mention
+            await self._ask_follow_up(
+                message, "assign_role_member", "Please mention the user using @username", role_name=role_name
+            )
+            return
+        await self.assign_role(message, member, role_name)
+
+    async def _resume_create_role_name(self, message: discord.Message):
+        await self.create_role(message, self._reply_text(message))
+
+    async def _resume_revoke_role_name(self, message: discord.Message, member_id: int):
+        member = await self._session_member(message, member_id)
+        if member is not None:
+            await self.revoke_role(message, member, self._reply_text(message))
+
+    async def _resume_revoke_role_member(self, message: discord.Message, role_name: str):
+        member = self._reply_mention(message)
+        if member is None:
+            await self._ask_follow_up(
+                message, "revoke_role_member", "Please mention the user using @username", role_name=role_name
+            )
+            return
+        await self.revoke_role(message, member, role_name)
+
     async def assign_role(
         self, message: discord.Message, member: discord.Member, role_name: str
     ):
         """Assigns a role to a member."""
         if not message.guild.me.guild_permissions.manage_roles:
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 "I need the `Manage Roles` permission to assign roles."
             )
             return
 
-        role = discord.utils.get(message.guild.roles, name=role_name)
+        role = self.lookup.role(message.guild, role_name)
         if not role:
-            await message.channel.send(
-                f"Role '{role_name}' not found! Available roles: {', '.join([r.name for r in message.guild.roles])}"
-            )
+            await self.send_message(message.channel, self._role_not_found(message.guild, role_name))
             return
 
         try:
-            await member.add_roles(role)
-            await message.channel.send(
+            await self.executor.run(guild_bucket(member.guild, "member_roles"), member.add_roles, role, idempotent=True)
+            await self.send_message(
+                message.channel,
                 f"Successfully assigned the **{role.name}** role to {member.display_name}!"
             )
         except discord.Forbidden:
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 "I don't have permission to assign this role."
             )
         except discord.HTTPException as e:
-            await message.channel.send(f"Failed to assign role: {str(e)}")
+            await self.send_message(message.channel, f"Failed to assign role: {str(e)}")
+
+    def _role_not_found(self, guild: discord.Guild, role_name: str) -> str:
+        similar = self.lookup.similar_roles(guild, role_name)
+        if similar:
+            return f"Role '{role_name}' not found! Did you mean: {', '.join(r.name for r in similar)}?"
+        return f"Role '{role_name}' not found! Available roles: {self.lookup.role_names(guild)}"
 
     async def prompt_assign_role(self, message: discord.Message):
-        await message.channel.send(
+        await self.send_message(
+            message.channel,
             "To assign a role, please provide the user mention or specify the user's name and the role name\n"
             "Example: 'assign role @username role_name'\n"
-            f"Available roles: {', '.join([r.name for r in message.guild.roles])}"
+            f"Available roles: {self.lookup.role_names(message.guild)}"
         )
 
     async def handle_assign_role(
@@ -404,40 +649,26 @@ class DiscordAgent:
         member: discord.Member = None,
         role_name: str = None,
     ):
-        user_id = message.author.id
-
-        # Handle response when waiting for role name
-        if user_id in self.waiting_for_role:
-            member = self.waiting_for_role.pop(user_id)
-            role_name = message.content.strip()
-            await self.assign_role(message, member, role_name)
-            return
-
-        # Handle response when waiting for member
-        if user_id in self.waiting_for_member:
-            if not message.mentions:
-                await message.channel.send("Please mention the user using @username")
-                return
-            role_name = self.waiting_for_member.pop(user_id)
-            await self.assign_role(message, message.mentions[0], role_name)
-            return
-
-        # Initial request handling
+        # Initial request handling; the follow-up reply is routed to a _resume_* method
         if not member and not role_name:
-            await message.channel.send("Please specify both the role and the user.")
+            await self.send_message(message.channel, "Please specify both the role and the user.")
             await self.prompt_assign_role(message)
             return
         elif not member:
-            self.waiting_for_member[user_id] = role_name
-            await message.channel.send(
-                "Which user should get this role? (Please mention them using @)"
+            await self._ask_follow_up(
+                message,
+                "assign_role_member",
+                "Which user should get this role? (Please mention them using @)",
+                role_name=role_name,
             )
             return
         elif not role_name:
-            self.waiting_for_role[user_id] = member
-            await message.channel.send(
+            await self._ask_follow_up(
+                message,
+                "assign_role_name",
                 f"Which role should be assigned to {member.display_name}?\n"
-                f"Available roles: {', '.join([r.name for r in message.guild.roles])}"
+                f"Available roles: {self.lookup.role_names(message.guild)}",
+                member_id=member.id,
             )
             return
 
@@ -447,42 +678,30 @@ class DiscordAgent:
     async def create_role(self, message: discord.Message, role_name: str):
         """Creates a new role."""
         if not message.guild.me.guild_permissions.manage_roles:
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 "I need the `Manage Roles` permission to create roles."
             )
             return
 
-        # Check if role already exists
-        existing_role = discord.utils.get(message.guild.roles, name=role_name)
+        # Check if role already exists; "dev-ops" and "devops" are different roles
+        existing_role = self.lookup.role(message.guild, role_name, exact=True)
         if existing_role:
-            await message.channel.send(f"❌ Role '{role_name}' already exists!")
+            await self.send_message(message.channel, f"❌ Role '{existing_role.name}' already exists!")
             return
 
         try:
-            await message.guild.create_role(name=role_name)
-            await message.channel.send(f"Successfully created role **{role_name}**!")
+            await self.executor.run(guild_bucket(message.guild, "roles"), message.guild.create_role, name=role_name)
+            await self.send_message(message.channel, f"Successfully created role **{role_name}**!")
         except discord.Forbidden:
-            await message.channel.send("I don't have permission to create roles.")
+            await self.send_message(message.channel, "I don't have permission to create roles.")
         except discord.HTTPException as e:
-            await message.channel.send(f"Failed to create role: {str(e)}")
-
-    async def prompt_create_role(self, message: discord.Message):
-        await message.channel.send("What should the new role be called?")
+            await self.send_message(message.channel, f"Failed to create role: {str(e)}")
 
     async def handle_create_role(self, message: discord.Message, role_name: str = None):
-        user_id = message.author.id
-
-        # Handle response when waiting for role name
-        if user_id in self.waiting_for_role_name:
-            role_name = message.content.strip()
-            self.waiting_for_role_name.pop(user_id)
-            await self.create_role(message, role_name)
-            return
-
         # Initial request
         if not role_name:
-            self.waiting_for_role_name[user_id] = True
-            await self.prompt_create_role(message)
+            await self._ask_follow_up(message, "create_role_name", "What should the new role be called?")
             return
 
         await self.create_role(message, role_name)
@@ -492,41 +711,44 @@ class DiscordAgent:
     ):
         """Revokes a role from a member."""
         if not message.guild.me.guild_permissions.manage_roles:
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 "I need the `Manage Roles` permission to revoke roles."
             )
             return
 
-        role = discord.utils.get(message.guild.roles, name=role_name)
+        role = self.lookup.role(message.guild, role_name)
         if not role:
-            await message.channel.send(
-                f"Role '{role_name}' not found! Available roles: {', '.join([r.name for r in message.guild.roles])}"
-            )
+            await self.send_message(message.channel, self._role_not_found(message.guild, role_name))
             return
 
         if role not in member.roles:
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 f"{member.display_name} doesn't have the role '{role_name}'"
             )
             return
 
         try:
-            await member.remove_roles(role)
-            await message.channel.send(
+            await self.executor.run(guild_bucket(member.guild, "member_roles"), member.remove_roles, role, idempotent=True)
+            await self.send_message(
+                message.channel,
                 f"Successfully removed the **{role.name}** role from {member.display_name}!"
             )
         except discord.Forbidden:
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 "I don't have permission to revoke this role."
             )
         except discord.HTTPException as e:
-            await message.channel.send(f"Failed to revoke role: {str(e)}")
+            await self.send_message(message.channel, f"Failed to revoke role: {str(e)}")
 
     async def prompt_revoke_role(self, message: discord.Message):
-        await message.channel.send(
+        await self.send_message(
+            message.channel,
             "To revoke a role, please provide the user mention or specify the user's name and the role name\n"
             "Example: 'revoke role @username role_name'\n"
-            f"Available roles: {', '.join([r.name for r in message.guild.roles])}"
+            f"Available roles: {self.lookup.role_names(message.guild)}"
         )
 
     async def handle_revoke_role(
@@ -535,40 +757,26 @@ class DiscordAgent:
         member: discord.Member = None,
         role_name: str = None,
     ):
-        user_id = message.author.id
-
-        # Handle response when waiting for role name
-        if user_id in self.waiting_for_revoke_role:
-            member = self.waiting_for_revoke_role.pop(user_id)
-            role_name = message.content.strip()
-            await self.revoke_role(message, member, role_name)
-            return
-
-        # Handle response when waiting for member
-        if user_id in self.waiting_for_revoke_member:
-            if not message.mentions:
-                await message.channel.send("Please mention the user using @username")
-                return
-            role_name = self.waiting_for_revoke_member.pop(user_id)
-            await self.revoke_role(message, message.mentions[0], role_name)
-            return
-
-        # Initial request handling
+        # Initial request handling; the follow-up reply is routed to a _resume_* method
         if not member and not role_name:
-            await message.channel.send("Please specify both the role and the user.")
+            await self.send_message(message.channel, "Please specify both the role and the user.")
             await self.prompt_revoke_role(message)
             return
         elif not member:
-            self.waiting_for_revoke_member[user_id] = role_name
-            await message.channel.send(
-                "From which user should this role be revoked? (Please mention them using @)"
+            await self._ask_follow_up(
+                message,
+                "revoke_role_member",
+                "From which user should this role be revoked? (Please mention them using @)",
+                role_name=role_name,
             )
             return
         elif not role_name:
-            self.waiting_for_revoke_role[user_id] = member
-            await message.channel.send(
+            await self._ask_follow_up(
+                message,
+                "revoke_role_name",
                 f"Which role should be revoked from {member.display_name}?\n"
-                f"Their current roles: {', '.join([r.name for r in member.roles[1:]])}"
+                f"Their current roles: {', '.join([r.name for r in member.roles[1:]])}",
+                member_id=member.id,
             )
             return
 
@@ -604,8 +812,11 @@ class DiscordAgent:
             # Find category if specified
             category_obj = None
             if category:
-                category_obj = discord.utils.get(guild.categories, name=category)
+                category_obj = self.lookup.category(guild, category)
                 if not category_obj:
+                    similar = self.lookup.similar_categories(guild, category)
+                    if similar:
+                        return f"Category '{category}' not found! Did you mean: {', '.join(c.name for c in similar)}?"
                     return f"Category '{category}' not found!"
 
             # Set up permissions
@@ -622,14 +833,18 @@ class DiscordAgent:
 
             # Create the channel based on type
             if channel_type.lower() == "voice":
-                new_channel = await guild.create_voice_channel(
+                new_channel = await self.executor.run(
+                    guild_bucket(guild, "channels"),
+                    guild.create_voice_channel,
                     name=clean_name,
                     category=category_obj,
                     overwrites=overwrites,
                     reason=f"Created by {message.author.display_name}",
                 )
             else:
-                new_channel = await guild.create_text_channel(
+                new_channel = await self.executor.run(
+                    guild_bucket(guild, "channels"),
+                    guild.create_text_channel,
                     name=clean_name,
                     category=category_obj,
                     overwrites=overwrites,
@@ -715,7 +930,9 @@ class DiscordAgent:
             event_type = discord.EntityType.stage_instance
 
         try:
-            scheduled_event = await guild.create_scheduled_event(
+            scheduled_event = await self.executor.run(
+                guild_bucket(guild, "scheduled_events"),
+                guild.create_scheduled_event,
                 name=event_name,
                 start_time=start_time,
                 channel=channel,
@@ -723,7 +940,8 @@ class DiscordAgent:
                 description=event_topic,
                 privacy_level=discord.PrivacyLevel.guild_only,
             )
-            await message.channel.send(
+            await self.send_message(
+                message.channel,
                 f"Scheduled event **{event_name}** created for {start_time.isoformat()} in {channel.mention}!"
             )
             return "Successfully scheduled event!"
@@ -738,99 +956,22 @@ class DiscordAgent:
         if not guild:
             return "This command can only be used in a server!"
 
-        try:
-            # Initialize statistics
-            summary = []
-            total_messages = 0
-            active_channels = {}  # Channel name -> message count
-            active_members = {}   # Member name -> message count
-            media_count = 0
-            emoji_reactions = 0
-            links_shared = 0
-            mentions = 0
-            
-            # Get list of text channels
-            channels = [c for c in guild.channels if isinstance(c, discord.TextChannel)]
-            
-            for channel in channels:
-                try:
-                    messages_in_channel = []
-                    async for msg in channel.history(limit=None):  # Remove limit to get all messages
-                        messages_in_channel.append(msg)
-                        total_messages += 1
-                        
-                        # Track member activity
-                        active_members[msg.author.display_name] = active_members.get(msg.author.display_name, 0) + 1
-                        
-                        # Count attachments
-                        if msg.attachments:
-                            media_count += len(msg.attachments)
-                            
-                        # Count reactions
-                        emoji_reactions += sum(reaction.count for reaction in msg.reactions)
-                        
-                        # Count links
-                        if "http://" in msg.content or "https://" in msg.content:
-                            links_shared += 1
-                            
-                        # Count mentions
-                        mentions += len(msg.mentions) + len(msg.role_mentions) + len(msg.channel_mentions)
-                    
-                    if messages_in_channel:  # Only add channels with messages
-                        active_channels[channel.name] = len(messages_in_channel)
-                except discord.Forbidden:
-                    continue
-
-            # Get member stats
-            total_members = len(guild.members)
-            online_members = len([m for m in guild.members if m.status != discord.Status.offline])
-            bots = len([m for m in guild.members if m.bot])
-            
-            # Get new members (joined in last 24 hours)
-            day_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
-            new_members = [member for member in guild.members if member.joined_at and member.joined_at > day_ago]
-
-            # Sort channels and members by activity
-            top_channels = sorted(active_channels.items(), key=lambda x: x[1], reverse=True)[:5]
-            top_members = sorted(active_members.items(), key=lambda x: x[1], reverse=True)[:5]
-
-            # Build detailed summary message
-            summary.append(f"**📊 Server Activity Summary for {guild.name}**\n")
-            
-            # Member Statistics
-            summary.append("**👥 Member Statistics:**")
-            summary.append(f"• Total Members: {total_members}")
-            summary.append(f"• Currently Online: {online_members}")
-            summary.append(f"• Bots: {bots}")
-            summary.append(f"• New Members (24h): {len(new_members)}")
-            if new_members:
-                summary.append(f"• Recent Joins: {', '.join([m.display_name for m in new_members])}")
-            
-            # Activity Statistics
-            summary.append("\n**📈 Activity Statistics:**")
-            summary.append(f"• Total Messages: {total_messages}")
-            summary.append(f"• Media Shared: {media_count}")
-            summary.append(f"• Reactions Added: {emoji_reactions}")
-            summary.append(f"• Links Shared: {links_shared}")
-            summary.append(f"• Mentions: {mentions}")
-            summary.append(f"• Active Channels: {len(active_channels)}")
-            
-            # Top Channels
-            summary.append("\n**📝 Most Active Channels:**")
-            for channel_name, count in top_channels:
-                summary.append(f"• #{channel_name}: {count} messages")
-            
-            # Top Members
-            summary.append("\n**🏆 Most Active Members:**")
-            for member_name, count in top_members:
-                summary.append(f"• {member_name}: {count} messages")
-
-            return "\n".join(summary)
-
-        except discord.Forbidden:
-            return "I don't have permission to read message history!"
-        except discord.HTTPException as e:
-            return f"Failed to generate summary: {str(e)}"
+        # Counters are maintained live from gateway events, so this never
+        # touches the REST API once the guild has been synced.
+        sync = self.activity.pending_sync(guild)
+        if sync is None:
+            return self.activity.render_summary(guild)
+
+        # A sync is still scanning channels: post the partial summary and
+        # keep editing it as channels finish.
+        status = await self.reply_to(message, self.activity.render_summary(guild))
+        while not sync.done():
+            await asyncio.wait({sync}, timeout=SUMMARY_EDIT_INTERVAL)
+            try:
+                await self.edit_message(status, content=self.activity.render_summary(guild))
+            except discord.HTTPException:
+                pass
+        return None
 
     def find_user(self, guild: discord.Guild, user_identifier: str) -> discord.Member:
         """Find user by mention, name, display name, or nickname."""
@@ -842,21 +983,19 @@ class DiscordAgent:
             if member:
                 return member
 
-        # If not a mention, try name matching
-        username = user_identifier.lower().strip('@')
-        for member in guild.members:
-            # Check exact matches first
-            if (member.name.lower() == username or 
-                member.display_name.lower() == username or 
-                (member.nick and member.nick.lower() == username)):
-                return member
-            
-            # Then try partial matches
-            if (username in member.name.lower() or
-                username in member.display_name.lower() or
-                (member.nick and username in member.nick.lower())):
-                return member
-        return None
+        # If not a mention, look the name up in the member index: exact
+        # matches first, then prefix and unique substring matches
+        username = user_identifier.strip().strip('@')
+        return self.members.find(guild, username)
+
+    def suggest_users(self, guild: discord.Guild, user_identifier: str) -> str:
+        """Lists the closest members to a name that didn't resolve, for the user to confirm with a mention."""
+        username = user_identifier.strip().strip('@')
+        candidates = self.members.search(guild, username) if username else []
+        if not candidates:
+            return ""
+        names = ", ".join(f"{member.display_name} ({member.name})" for member in candidates)
+        return f" Did you mean: {names}? Mention the user to confirm."
 
     async def send_automated_message(
         self,
@@ -879,22 +1018,25 @@ class DiscordAgent:
                     return f"Invalid time format: {str(e)}"
 
             if target_type.lower() == "dm":
+                suggestions = ""
                 if isinstance(target, str):
-                    target = self.find_user(message.guild, target)
+                    name, target = target, self.find_user(message.guild, target)
+                    if target is None:
+                        suggestions = self.suggest_users(message.guild, name)
                 if not target or not isinstance(target, discord.Member):
-                    return f"Could not find user! Use @mention or username. Example: @username or username"
+                    return f"Could not find user! Use @mention or username. Example: @username or username.{suggestions}"
+
+                if scheduled_time:
+                    await self.scheduler.schedule(scheduled_time.timestamp(), "dm", target.id, msg_content)
+                    return f"Message scheduled for {scheduled_time.strftime('%Y-%m-%d %H:%M:%S UTC')} to {target.display_name}'s DMs!"
 
                 try:
-                    if scheduled_time:
-                        delay = (scheduled_time - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
-                        await asyncio.sleep(delay)
-                    
                     dm_channel = target.dm_channel
                     if not dm_channel:
                         dm_channel = await target.create_dm()
                     
-                    await dm_channel.send(msg_content)
-                    return f"Message {'scheduled to be ' if schedule_time else ''}sent to {target.display_name}'s DMs!"
+                    await self.executor.run(channel_bucket(dm_channel, "send"), dm_channel.send, msg_content)
+                    return f"Message sent to {target.display_name}'s DMs!"
                 except discord.Forbidden:
                     return "Cannot send DM to this user! They may have DMs disabled."
                 except Exception as e:
@@ -905,11 +1047,11 @@ class DiscordAgent:
                     return "Invalid target channel!"
                 
                 if scheduled_time:
-                    delay = (scheduled_time - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
-                    await asyncio.sleep(delay)
-                
-                await target.send(msg_content)
-                return f"Message {'scheduled to be ' if schedule_time else ''}sent to #{target.name}!"
+                    await self.scheduler.schedule(scheduled_time.timestamp(), "channel", target.id, msg_content)
+                    return f"Message scheduled for {scheduled_time.strftime('%Y-%m-%d %H:%M:%S UTC')} to #{target.name}!"
+
+                await self.executor.run(channel_bucket(target, "send"), target.send, msg_content)
+                return f"Message sent to #{target.name}!"
 
             return "Invalid target type! Use 'dm' or 'channel'."
 
@@ -931,7 +1073,9 @@ class DiscordAgent:
         )
         
         try:
-            await target_member.send(custom_message or default_welcome)
+            await self.executor.run(
+                user_bucket(target_member, "dm"), target_member.send, custom_message or default_welcome
+            )
             return f"Welcome message sent to {target_member.display_name}!"
         except discord.Forbidden:
             return "Cannot send DM to this user!"
@@ -950,7 +1094,9 @@ class DiscordAgent:
 
         try:
             old_name = channel.name
-            await channel.edit(name=new_name.lower().replace(" ", "-"))
+            await self.executor.run(
+                channel_bucket(channel, "edit"), channel.edit, name=new_name.lower().replace(" ", "-"), idempotent=True
+            )
             return f"Successfully renamed #{old_name} to #{new_name}!"
         except discord.Forbidden:
             return "I don't have permission to rename this channel!"
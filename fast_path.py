@@ -0,0 +1,137 @@
+import re
+from collections import Counter
+
+import discord
+
+from command_registry import ParsedCall
+
+# Building blocks for the patterns below. Patterns are matched against the
+# whole message (minus the bot mention), so anything extra in the request
+# falls through to the LLM.
+_SEP = r"(?:\s*,\s*(?:and\s+)?|\s+and\s+|\s+)"
+_USERS = rf"((?:<@!?\d+>|me)(?:{_SEP}(?:<@!?\d+>|me))*)"
+_USER = r"(<@!?\d+>)"
+_CHANNELS = rf"(<#\d+>(?:{_SEP}<#\d+>)*)"
+_CHANNEL = r"(<#\d+>)"
+_NAME = r"[\"']?([\w\- ]{1,100}?)[\"']?"
+
+_USER_ID_RE = re.compile(r"<@!?(\d+)>|\bme\b", re.IGNORECASE)
+_CHANNEL_ID_RE = re.compile(r"<#(\d+)>")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _users(text: str, message: discord.Message) -> list:
+    return [
+        f"<@{match.group(1)}>" if match.group(1) else message.author.mention
+        for match in _USER_ID_RE.finditer(text)
+    ]
+
+
+def _channels(text: str) -> list:
+    return [f"<#{channel_id}>" for channel_id in _CHANNEL_ID_RE.findall(text)]
+
+
+# (command name, pattern, builds the call's args from the match)
+_ROUTES = [
+    (
+        "unmute_member_from_channel",
+        rf"(?:unmute|un-mute|stop muting)\s+{_USERS}\s+in\s+{_CHANNELS}",
+        lambda m, msg: {"user_mentions": _users(m.group(1), msg), "channel_mentions": _channels(m.group(2))},
+    ),
+    (
+        "mute_member_from_channel",
+        rf"mute\s+{_USERS}\s+in\s+{_CHANNELS}",
+        lambda m, msg: {"user_mentions": _users(m.group(1), msg), "channel_mentions": _channels(m.group(2))},
+    ),
+    (
+        "invite_user_to_channel",
+        rf"(?:add|invite)\s+{_USERS}\s+to\s+{_CHANNELS}",
+        lambda m, msg: {"user_mentions": _users(m.group(1), msg), "channel_mentions": _channels(m.group(2))},
+    ),
+    (
+        "create_group_chat",
+        rf"(?:create|make|start)\s+(?:a\s+)?(?:private\s+)?group\s*chat\s+with\s+{_USERS}",
+        lambda m, msg: {"user_mentions": _users(m.group(1), msg)},
+    ),
+    (
+        "change_channel_name",
+        rf"(?:rename\s+{_CHANNEL}|change\s+(?:the\s+)?name\s+of\s+{_CHANNEL})\s+to\s+{_NAME}",
+        lambda m, msg: {"channel": m.group(1) or m.group(2), "new_name": m.group(3)},
+    ),
+    (
+        "summarize_server_activity",
+        r"(?:please\s+)?summari[sz]e\s+(?:the\s+)?(?:recent\s+)?server\s+activity",
+        lambda m, msg: {},
+    ),
+    (
+        "create_role",
+        rf"(?:create|make)\s+(?:a\s+)?(?:new\s+)?role\s+(?:called|named)\s+{_NAME}",
+        lambda m, msg: {"role_name": m.group(1)},
+    ),
+    (
+        "assign_role",
+        rf"(?:assign|give)\s+{_USER}\s+(?:the\s+)?{_NAME}\s+role",
+        lambda m, msg: {"member": m.group(1), "role_name": m.group(2)},
+    ),
+    (
+        "assign_role",
+        rf"(?:assign|give)\s+(?:the\s+)?{_NAME}\s+role\s+to\s+{_USER}",
+        lambda m, msg: {"member": m.group(2), "role_name": m.group(1)},
+    ),
+    (
+        "revoke_role",
+        rf"(?:revoke|remove)\s+(?:the\s+)?{_NAME}\s+role\s+from\s+{_USER}",
+        lambda m, msg: {"member": m.group(2), "role_name": m.group(1)},
+    ),
+    (
+        "send_welcome_message",
+        rf"send\s+(?:a\s+)?welcome\s+message\s+to\s+{_USER}",
+        lambda m, msg: {"target": m.group(1)},
+    ),
+]
+
+
+class FastPathRouter:
+    """
+    Matches unambiguous requests locally so they skip the LLM round trip.
+    A request is handled only when exactly one route matches the entire
+    message; anything else falls through to Mistral.
+    """
+
+    def __init__(self):
+        self.routes = [
+            (name, re.compile(pattern, re.IGNORECASE), build)
+            for name, pattern, build in _ROUTES
+        ]
+        self.attempts = 0
+        self.hits = Counter()  # command name -> fast-path dispatches
+        self.ambiguous = 0
+
+    def match(self, message: discord.Message, bot_id: int):
+        """Returns a ParsedCall for a high-confidence match, or None."""
+        self.attempts += 1
+        text = re.sub(rf"<@!?{bot_id}>", " ", message.content)
+        text = _WHITESPACE_RE.sub(" ", text).strip().rstrip(".!")
+
+        matches = []
+        for name, pattern, build in self.routes:
+            found = pattern.fullmatch(text)
+            if found:
+                matches.append(ParsedCall(name, build(found, message)))
+        if len(matches) != 1:
+            if matches:
+                self.ambiguous += 1
+            return None
+
+        self.hits[matches[0].name] += 1
+        return matches[0]
+
+    def stats(self) -> dict:
+        total_hits = sum(self.hits.values())
+        return {
+            "attempts": self.attempts,
+            "hits": total_hits,
+            "hit_rate": total_hits / self.attempts if self.attempts else 0.0,
+            "ambiguous": self.ambiguous,
+            "by_command": dict(self.hits),
+        }
@@ -0,0 +1,93 @@
+import difflib
+import re
+
+import discord
+
+_SLUG_RE = re.compile(r"[\W_]+")
+
+
+def _normalize(name: str) -> str:
+    return name.strip().casefold()
+
+
+def _slug(name: str) -> str:
+    """Key that ignores case, spaces and punctuation, so 'Team Lead' matches 'team-lead'."""
+    return _SLUG_RE.sub("", name.casefold())
+
+
+class _NameTable:
+    """Case-insensitive and slug lookup for one kind of guild object."""
+
+    def __init__(self, objects):
+        self.by_key = {}
+        self.by_slug = {}
+        for obj in objects:
+            # First object wins on duplicate names, matching discord.utils.get
+            self.by_key.setdefault(_normalize(obj.name), obj)
+            slug = _slug(obj.name)
+            # Emoji- or punctuation-only names have no slug and would all collide
+            if slug:
+                self.by_slug.setdefault(slug, obj)
+        self.keys = list(self.by_key)
+
+    def get(self, name: str, exact: bool = False):
+        """Finds by case-insensitive name, then (unless exact) by slug."""
+        found = self.by_key.get(_normalize(name))
+        if found is not None or exact:
+            return found
+        slug = _slug(name)
+        return self.by_slug.get(slug) if slug else None
+
+    def suggest(self, name: str, limit: int = 3) -> list:
+        keys = difflib.get_close_matches(_normalize(name), self.keys, n=limit, cutoff=0.6)
+        return [self.by_key[key] for key in keys]
+
+
+class _GuildObjects:
+    def __init__(self, guild: discord.Guild):
+        self.roles = _NameTable(guild.roles)
+        self.categories = _NameTable(guild.categories)
+        self.channels = _NameTable(
+            c for c in guild.channels if not isinstance(c, discord.CategoryChannel)
+        )
+        self.role_names = ", ".join([r.name for r in guild.roles])
+
+
+class GuildLookup:
+    """
+    Cached per-guild name index for roles, channels and categories, with
+    precomputed display lists. An entry is rebuilt lazily after a guild
+    role or channel create/update/delete event invalidates it.
+    """
+
+    def __init__(self):
+        self._guilds = {}  # guild_id -> _GuildObjects
+
+    def _objects(self, guild: discord.Guild) -> _GuildObjects:
+        objects = self._guilds.get(guild.id)
+        if objects is None:
+            objects = self._guilds[guild.id] = _GuildObjects(guild)
+        return objects
+
+    def invalidate(self, guild: discord.Guild):
+        self._guilds.pop(guild.id, None)
+
+    def role(self, guild: discord.Guild, name: str, exact: bool = False):
+        """Finds a role by name, ignoring case and (unless exact) punctuation."""
+        return self._objects(guild).roles.get(name, exact)
+
+    def channel(self, guild: discord.Guild, name: str):
+        return self._objects(guild).channels.get(name)
+
+    def category(self, guild: discord.Guild, name: str):
+        return self._objects(guild).categories.get(name)
+
+    def similar_roles(self, guild: discord.Guild, name: str) -> list:
+        return self._objects(guild).roles.suggest(name)
+
+    def similar_categories(self, guild: discord.Guild, name: str) -> list:
+        return self._objects(guild).categories.suggest(name)
+
+    def role_names(self, guild: discord.Guild) -> str:
+        """Comma-separated names of every role, for prompts and error messages."""
+        return self._objects(guild).role_names
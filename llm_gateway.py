@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from mistralai.models import SDKError
+
+from metrics import RollingStats
+
+LLM_INITIAL_CONCURRENCY = float(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+LLM_MAX_CONCURRENCY = float(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "50"))
+LLM_MAX_WAIT = float(os.getenv("LLM_MAX_WAIT", "10"))  # Seconds a request may queue before it is shed
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "8"))  # Seconds; slower calls count as congestion
+DECREASE_COOLDOWN = 2.0  # Seconds between multiplicative decreases, so one burst of 429s halves once
+
+
+class GatewayBusy(Exception):
+    """Raised when a request is shed because the gateway is saturated or rate limited."""
+
+
+class LLMGateway:
+    """
+    Admission control in front of the Mistral client.
+
+    The number of calls in flight follows AIMD: every call that finishes
+    (or, for streams, starts answering) under the latency target raises
+    the limit by 1/limit, and a 429 or a slow call halves it. Requests beyond the limit wait in a bounded FIFO
+    queue and are shed with GatewayBusy once it is full or their deadline
+    passes, so callers can answer "busy" right away instead of hanging.
+    """
+
+    def __init__(self, client, initial_limit: float = LLM_INITIAL_CONCURRENCY,
+                 max_limit: float = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 max_wait: float = LLM_MAX_WAIT, latency_target: float = LLM_LATENCY_TARGET):
+        self.client = client
+        self.limit = initial_limit
+        self.min_limit = 1.0
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.latency_target = latency_target
+
+        self.in_flight = 0
+        self._waiters = deque()  # Futures of queued requests, oldest first
+        self._last_decrease = 0.0
+
+        self.wait_times = RollingStats()
+        self.latencies = RollingStats()
+        self.shed = 0
+        self.throttled = 0  # 429 responses seen
+
+    async def complete(self, **kwargs):
+        """Runs client.chat.complete_async once a slot is free."""
+        await self._acquire()
+        return await self._call(self.client.chat.complete_async, kwargs)
+
+    async def stream(self, **kwargs):
+        """
+        Runs client.chat.stream_async once a slot is free and yields its
+        events. The slot is held until the stream is exhausted or closed.
+
+        AIMD sees the time to the first event: how long the rest of the
+        answer takes to stream depends on its length, not on congestion.
+        """
+        await self._acquire()
+        start = time.monotonic()
+        recorded = False
+        try:
+            response = await self.client.chat.stream_async(**kwargs)
+            async for event in response:
+                if not recorded:
+                    recorded = True
+                    self._record_latency(time.monotonic() - start)
+                yield event
+        except SDKError as e:
+            if getattr(e, "status_code", None) == 429:
+                self.throttled += 1
+                self._decrease()
+                raise GatewayBusy("Mistral is rate limiting requests") from e
+            raise
+        finally:
+            self.in_flight -= 1
+            self._release()
+        if not recorded:
+            self._record_latency(time.monotonic() - start)
+
+    async def _acquire(self):
+        enqueued_at = time.monotonic()
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.wait_times.add(0.0)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise GatewayBusy("LLM queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise GatewayBusy("Timed out waiting for an LLM slot")
+        except asyncio.CancelledError:
+            # Give back a slot that was handed to us just before cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        # The slot was reserved for us by _release
+        self.wait_times.add(time.monotonic() - enqueued_at)
+
+    async def _call(self, method, kwargs: dict):
+        start = time.monotonic()
+        try:
+            response = await method(**kwargs)
+        except SDKError as e:
+            if getattr(e, "status_code", None) == 429:
+                self.throttled += 1
+                self._decrease()
+                raise GatewayBusy("Mistral is rate limiting requests") from e
+            raise
+        finally:
+            self.in_flight -= 1
+            self._release()
+
+        self._record_latency(time.monotonic() - start)
+        return response
+
+    def _record_latency(self, latency: float):
+        self.latencies.add(latency)
+        if latency > self.latency_target:
+            self._decrease()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._release()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit / 2)
+
+    def _release(self):
+        """Hands free slots to queued requests in arrival order."""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "wait_p50": self.wait_times.percentile(50),
+            "wait_p95": self.wait_times.percentile(95),
+            "shed": self.shed,
+            "throttled": self.throttled,
+        }
@@ -0,0 +1,118 @@
+import os
+from collections import OrderedDict
+
+import discord
+
+MEMBER_CONTEXT_TOKEN_BUDGET = int(os.getenv("MEMBER_CONTEXT_TOKEN_BUDGET", "600"))
+RECENT_SPEAKERS_PER_CHANNEL = 20
+MAX_TRACKED_CHANNELS = 5000
+MAX_CACHED_MEMBERS_PER_GUILD = 1000  # Serialized members kept per guild, least recently used dropped first
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token) used for prompt budgeting."""
+    return len(text) // 4 + 1
+
+
+class MemberContextBuilder:
+    """
+    Builds the "Channel Members" part of the prompt from only the members
+    that matter for a request: the sender, anyone mentioned, and the most
+    recent speakers in the channel, trimmed to a token budget.
+
+    Serialized members are cached per guild, up to
+    MAX_CACHED_MEMBERS_PER_GUILD each, and assembled fragments per channel;
+    both are dropped when a member update event arrives or the bot leaves
+    the guild.
+    """
+
+    def __init__(self, token_budget: int = MEMBER_CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self._speakers = OrderedDict()  # channel_id -> OrderedDict(member_id -> None), newest last
+        self._member_cache = {}  # guild_id -> OrderedDict(member_id -> serialized member), newest last
+        self._channel_cache = {}  # channel_id -> (candidate ids, fragment)
+        self._guild_channels = {}  # guild_id -> set of channel ids with a cached fragment
+
+    def observe(self, message: discord.Message):
+        """Records the author as a recent speaker in the message's channel."""
+        if not message.guild:
+            return
+        speakers = self._speakers.get(message.channel.id)
+        if speakers is None:
+            speakers = self._speakers[message.channel.id] = OrderedDict()
+            if len(self._speakers) > MAX_TRACKED_CHANNELS:
+                self._speakers.popitem(last=False)
+        else:
+            self._speakers.move_to_end(message.channel.id)
+        speakers[message.author.id] = None
+        speakers.move_to_end(message.author.id)
+        if len(speakers) > RECENT_SPEAKERS_PER_CHANNEL:
+            speakers.popitem(last=False)
+
+    def invalidate_member(self, member: discord.Member):
+        """Drops cached context for a member after a join, update or removal."""
+        guild_id = member.guild.id
+        self._member_cache.get(guild_id, {}).pop(member.id, None)
+        for channel_id in self._guild_channels.pop(guild_id, ()):
+            self._channel_cache.pop(channel_id, None)
+
+    def forget_guild(self, guild: discord.Guild):
+        """Drops everything cached for a guild the bot has left."""
+        self._member_cache.pop(guild.id, None)
+        for channel_id in self._guild_channels.pop(guild.id, ()):
+            self._channel_cache.pop(channel_id, None)
+
+    def build(self, message: discord.Message, token_budget: int = None) -> str:
+        """Returns the serialized member list for the prompt, within token_budget if one is given."""
+        guild = message.guild
+        if not guild or message.channel.type == discord.ChannelType.private:
+            return "[]"
+
+        candidates = self._candidates(message)
+        # The per-channel cache only holds fragments built with the default budget
+        budget = self.token_budget if token_budget is None else token_budget
+        default_budget = budget == self.token_budget
+        cached = self._channel_cache.get(message.channel.id)
+        if default_budget and cached and cached[0] == candidates:
+            return cached[1]
+
+        member_cache = self._member_cache.get(guild.id)
+        if member_cache is None:
+            member_cache = self._member_cache[guild.id] = OrderedDict()
+        parts = []
+        used = 2  # Brackets
+        for member_id in candidates:
+            serialized = member_cache.get(member_id)
+            if serialized is None:
+                member = guild.get_member(member_id)
+                if member is None:
+                    continue
+                serialized = member_cache[member_id] = str({
+                    "id": member.id,
+                    "display_name": member.display_name,
+                    "name": member.name,
+                })
+                if len(member_cache) > MAX_CACHED_MEMBERS_PER_GUILD:
+                    member_cache.popitem(last=False)
+            else:
+                member_cache.move_to_end(member_id)
+            cost = estimate_tokens(serialized)
+            if parts and used + cost > budget:
+                break
+            parts.append(serialized)
+            used += cost
+
+        fragment = f"[{', '.join(parts)}]"
+        if default_budget:
+            self._channel_cache[message.channel.id] = (candidates, fragment)
+            self._guild_channels.setdefault(guild.id, set()).add(message.channel.id)
+        return fragment
+
+    def _candidates(self, message: discord.Message) -> tuple:
+        """Member IDs in priority order: sender, mentioned users, then recent speakers."""
+        seen = {message.author.id: None}
+        for user in message.mentions:
+            seen.setdefault(user.id, None)
+        for member_id in reversed(self._speakers.get(message.channel.id, ())):
+            seen.setdefault(member_id, None)
+        return tuple(seen)
@@ -0,0 +1,212 @@
+from bisect import bisect_left, insort
+from collections import Counter
+
+import discord
+
+FUZZY_MIN_SIMILARITY = 0.3  # Trigram Jaccard similarity below this isn't a match
+FUZZY_MAX_POSTINGS = 5000  # Trigrams shared by more members than this are too common to rank by
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _member_keys(member: discord.Member) -> tuple:
+    """Lowercased name, display name and nick, without duplicates."""
+    keys = []
+    for value in (member.name, member.display_name, member.nick):
+        if value:
+            key = value.lower()
+            if key not in keys:
+                keys.append(key)
+    return tuple(keys)
+
+
+class GuildMemberIndex:
+    """
+    Name index for one guild's members: exact keys, a sorted key list for
+    prefix lookups and a trigram index for substring and fuzzy matches.
+    """
+
+    def __init__(self):
+        self._keys = {}  # member_id -> keys it is indexed under
+        self._exact = {}  # key -> set of member ids
+        self._sorted = []  # sorted (key, member_id) pairs
+        self._grams = {}  # trigram -> set of member ids
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, member_id: int):
+        return member_id in self._keys
+
+    def add(self, member: discord.Member):
+        self.remove(member.id)
+        for key in self._index_keys(member):
+            insort(self._sorted, (key, member.id))
+
+    def add_all(self, members):
+        """Bulk load: indexes every member and sorts the prefix list once."""
+        for member in members:
+            self.remove(member.id)
+            for key in self._index_keys(member):
+                self._sorted.append((key, member.id))
+        self._sorted.sort()
+
+    def _index_keys(self, member: discord.Member) -> tuple:
+        keys = _member_keys(member)
+        self._keys[member.id] = keys
+        for key in keys:
+            self._exact.setdefault(key, set()).add(member.id)
+            for gram in _trigrams(key):
+                self._grams.setdefault(gram, set()).add(member.id)
+        return keys
+
+    def remove(self, member_id: int):
+        keys = self._keys.pop(member_id, None)
+        if not keys:
+            return
+        for key in keys:
+            ids = self._exact.get(key)
+            if ids is not None:
+                ids.discard(member_id)
+                if not ids:
+                    del self._exact[key]
+            index = bisect_left(self._sorted, (key, member_id))
+            if index < len(self._sorted) and self._sorted[index] == (key, member_id):
+                del self._sorted[index]
+            for gram in _trigrams(key):
+                ids = self._grams.get(gram)
+                if ids is not None:
+                    ids.discard(member_id)
+                    if not ids:
+                        del self._grams[gram]
+
+    def search(self, query: str, limit: int = 5) -> list:
+        """
+        Returns up to `limit` (score, member_id) pairs, best first. Exact
+        matches score 3, prefix matches 2, substring matches 1 (each plus
+        how much of the key the query covers) and fuzzy matches their
+        trigram similarity.
+        """
+        query = query.lower()
+        if not query:
+            return []
+        scores = {}
+
+        def offer(member_id, score):
+            if score > scores.get(member_id, 0):
+                scores[member_id] = score
+
+        for member_id in self._exact.get(query, ()):
+            offer(member_id, 3.0)
+
+        index = bisect_left(self._sorted, (query,))
+        while index < len(self._sorted) and self._sorted[index][0].startswith(query):
+            key, member_id = self._sorted[index]
+            offer(member_id, 2.0 + len(query) / len(key))
+            index += 1
+            if len(scores) >= limit * 4:
+                break
+
+        query_grams = _trigrams(query)
+        if query_grams and len(scores) < limit:
+            postings = sorted((self._grams.get(gram, set()) for gram in query_grams), key=len)
+            # Substring: the member must have every trigram of the query
+            for member_id in postings[0].intersection(*postings[1:]):
+                for key in self._keys[member_id]:
+                    if query in key:
+                        offer(member_id, 1.0 + len(query) / len(key))
+                        break
+
+            # Fuzzy: rank by shared trigrams, skipping grams too common to be informative
+            if not scores:
+                shared = Counter()
+                for ids in postings:
+                    if len(ids) <= FUZZY_MAX_POSTINGS:
+                        shared.update(ids)
+                for member_id in shared:
+                    if member_id in scores:
+                        continue
+                    # The shared count spans all of a member's keys; score each key on its own
+                    best = 0.0
+                    for key in self._keys[member_id]:
+                        key_grams = _trigrams(key)
+                        common = len(query_grams & key_grams)
+                        if common:
+                            best = max(best, common / len(query_grams | key_grams))
+                    if best >= FUZZY_MIN_SIMILARITY:
+                        offer(member_id, best)
+
+        ranked = sorted(((score, member_id) for member_id, score in scores.items()), reverse=True)
+        return ranked[:limit]
+
+
+class MemberDirectory:
+    """
+    Per-guild member name indexes, built on first use and then kept up to
+    date incrementally from member join, update and remove events.
+    """
+
+    def __init__(self):
+        self._guilds = {}  # guild_id -> GuildMemberIndex
+
+    def index(self, guild: discord.Guild) -> GuildMemberIndex:
+        index = self._guilds.get(guild.id)
+        if index is None:
+            index = self._guilds[guild.id] = GuildMemberIndex()
+            index.add_all(guild.members)
+        return index
+
+    def member_joined(self, member: discord.Member):
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            index.add(member)
+
+    def member_updated(self, member: discord.Member):
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            index.add(member)
+
+    def member_removed(self, member: discord.Member):
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            index.remove(member.id)
+
+    def user_updated(self, user: discord.User):
+        """Reindexes a user whose global name changed in every guild we share."""
+        for guild in user.mutual_guilds:
+            member = guild.get_member(user.id)
+            if member is not None:
+                self.member_updated(member)
+
+    def search(self, guild: discord.Guild, query: str, limit: int = 5) -> list:
+        """Returns ranked candidate members for a name, display name or nick."""
+        members = []
+        for _, member_id in self.index(guild).search(query, limit):
+            member = guild.get_member(member_id)
+            if member is not None:
+                members.append(member)
+        return members
+
+    def find(self, guild: discord.Guild, query: str, bot: bool = None, exact: bool = False):
+        """
+        Returns the member a name unambiguously refers to, or None. Exact
+        and prefix matches resolve to the best one, a substring match only
+        if it is the only one, and fuzzy matches never do, since acting on
+        a typo's nearest neighbour would pick the wrong member; offer
+        search() results for confirmation instead. bot restricts the match
+        to bots (True) or humans (False); exact disables everything but
+        exact matches.
+        """
+        substring = []
+        for score, member_id in self.index(guild).search(query, limit=10):
+            if score < 1.0 or (exact and score < 3.0):
+                break
+            member = guild.get_member(member_id)
+            if member is None or (bot is not None and member.bot != bot):
+                continue
+            if score >= 2.0:
+                return member
+            substring.append(member)
+        return substring[0] if len(substring) == 1 else None
@@ -0,0 +1,249 @@
+import bisect
+import contextvars
+import os
+import time
+from collections import deque
+
+from aiohttp import web
+
+
+class RollingStats:
+    """Keeps the most recent samples of a measurement and reports percentiles over them."""
+
+    def __init__(self, size: int = 1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0  # Total samples ever recorded, not just the retained window
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def mean(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(self.samples) / len(self.samples)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Local only; put a proxy in front to expose it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 disables the HTTP endpoint
+METRICS_MAX_SERIES = 5000  # Label sets beyond this are folded into guild="other"
+
+# Upper bounds in seconds, from an in-memory lookup to a slow LLM call
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The request being handled, so code deep in DiscordAgent can add spans to it
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th sample (the last finite bound for +Inf)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return HISTOGRAM_BUCKETS[min(i, len(HISTOGRAM_BUCKETS) - 1)]
+        return HISTOGRAM_BUCKETS[-1]
+
+
+class _Span:
+    __slots__ = ("trace", "stage", "start")
+
+    def __init__(self, trace, stage: str):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.stage, time.perf_counter() - self.start)
+
+
+class RequestTrace:
+    """
+    Stage timings of one request. The command is usually only known after
+    the LLM answers, so spans are collected here and recorded under the
+    final command label by finish().
+    """
+
+    __slots__ = ("metrics", "guild", "command", "spans", "_token")
+
+    def __init__(self, metrics, guild):
+        self.metrics = metrics
+        self.guild = str(guild.id) if guild else "dm"
+        self.command = "none"
+        self.spans = []
+        self._token = current_trace.set(self)
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def add(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def finish(self):
+        current_trace.reset(self._token)
+        for stage, seconds in self.spans:
+            self.metrics.observe(stage, self.command, self.guild, seconds)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NullTrace:
+    """Stands in for RequestTrace while metrics are disabled."""
+
+    __slots__ = ()
+    _span = _NullSpan()
+
+    @property
+    def command(self) -> str:
+        return "none"
+
+    @command.setter
+    def command(self, value: str):
+        pass
+
+    def span(self, stage: str):
+        return self._span
+
+    def add(self, stage: str, seconds: float):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NULL_TRACE = _NullTrace()
+
+
+class StageMetrics:
+    """
+    Latency histograms labeled by stage, command and guild, rendered as
+    Prometheus text for the local endpoint and as a summary for !stats.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, max_series: int = METRICS_MAX_SERIES):
+        self.enabled = enabled
+        self.max_series = max_series
+        self._series = {}  # (stage, command, guild) -> Histogram
+        self._server = None
+
+    def trace(self, guild):
+        """Starts timing a request in guild (None for DMs)."""
+        if not self.enabled:
+            return _NULL_TRACE
+        return RequestTrace(self, guild)
+
+    def observe(self, stage: str, command: str, guild: str, seconds: float):
+        key = (stage, command, guild)
+        histogram = self._series.get(key)
+        if histogram is None:
+            if len(self._series) >= self.max_series:
+                key = (stage, command, "other")
+                histogram = self._series.get(key)
+            if histogram is None:
+                histogram = self._series[key] = Histogram()
+        histogram.observe(seconds)
+
+    def by_stage(self, command: str = None) -> dict:
+        """Histograms merged across guilds (and commands, unless one is given), keyed by stage."""
+        merged = {}
+        for (stage, series_command, _), histogram in self._series.items():
+            if command is not None and series_command != command:
+                continue
+            merged.setdefault(stage, Histogram()).merge(histogram)
+        return merged
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP agent_stage_seconds Time spent in each stage of handling a request.",
+            "# TYPE agent_stage_seconds histogram",
+        ]
+        for (stage, command, guild), histogram in sorted(self._series.items()):
+            labels = f'stage="{stage}",command="{command}",guild="{guild}"'
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'agent_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"agent_stage_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"agent_stage_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, command: str = None) -> str:
+        """Renders per-stage counts and latencies for the !stats command."""
+        if not self.enabled:
+            return "Stage metrics are disabled (METRICS_ENABLED=0)."
+        stages = self.by_stage(command)
+        if not stages:
+            return f"No timings recorded{f' for {command}' if command else ''} yet."
+        title = f"**Stage latency** ({command or 'all commands'}, bucket upper bounds)"
+        lines = [title]
+        for stage, histogram in sorted(stages.items(), key=lambda item: item[1].sum, reverse=True):
+            lines.append(
+                f"• {stage}: {histogram.count} spans, mean {histogram.sum / histogram.count:.3f}s, "
+                f"p50 ≤{histogram.quantile(0.5)}s, p95 ≤{histogram.quantile(0.95)}s"
+            )
+        return "\n".join(lines)
+
+    async def start_server(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        """Serves GET /metrics in Prometheus text format. Does nothing if port is 0 or it's already running."""
+        if not self.enabled or not port or self._server is not None:
+            return
+
+        async def handle(request):
+            return web.Response(text=self.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._server = web.AppRunner(app, access_log=None)
+        await self._server.setup()
+        await web.TCPSite(self._server, host, port).start()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import discord
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))  # Seconds
+RESPONSE_CACHE_DB_PATH = os.getenv("RESPONSE_CACHE_DB_PATH", "")  # Empty disables the disk tier
+
+_MENTION_RE = re.compile(r"<(@!?|@&|#)(\d+)>")
+_SNOWFLAKE_RE = re.compile(r"\d{15,21}")
+_PLACEHOLDER_RE = re.compile(r"\x00(\w+)\x00")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Words that point back into the conversation rather than at something named in the request
+_CONTEXT_WORDS_RE = re.compile(
+    r"\b(he|him|his|she|her|hers|they|them|their|it|its|that|those|again|same|above|previous|earlier|"
+    r"instead|yes|yeah|yep|ok|okay|sure)\b"
+)
+
+
+class Uncacheable(Exception):
+    """Raised when a response refers to IDs that aren't part of the request."""
+
+
+def normalize_request(message: discord.Message, bot_id: int):
+    """
+    Canonicalizes a request so that the same ask from different people
+    produces the same key. Mentions become ordered placeholders (the
+    sender and the bot get fixed ones), case and whitespace are folded.
+
+    Returns (normalized text, bindings) where bindings maps each
+    placeholder to the real ID it stands for.
+    """
+    bindings = {"S": str(message.author.id)}
+    by_id = {str(message.author.id): "S", str(bot_id): "B"}
+    counters = {"@": 0, "@&": 0, "#": 0}
+    prefixes = {"@": "U", "@&": "R", "#": "C"}
+
+    def replace(match):
+        kind = "@" if match.group(1).startswith("@") and match.group(1) != "@&" else match.group(1)
+        entity_id = match.group(2)
+        placeholder = by_id.get(entity_id)
+        if placeholder is None:
+            placeholder = f"{prefixes[kind]}{counters[kind]}"
+            counters[kind] += 1
+            by_id[entity_id] = placeholder
+        bindings[placeholder] = entity_id
+        return f"<{kind}{placeholder}>"
+
+    text = _MENTION_RE.sub(replace, message.content)
+    text = _WHITESPACE_RE.sub(" ", text).strip().lower()
+    return text, bindings
+
+
+def depends_on_context(normalized: str) -> bool:
+    """True when a normalized request refers to earlier messages ("mute him", "do that again")."""
+    return _CONTEXT_WORDS_RE.search(normalized) is not None
+
+
+def _abstract(value, by_id: dict):
+    """Replaces real IDs in a command argument with placeholders."""
+    if isinstance(value, list):
+        return [_abstract(item, by_id) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def replace(match):
+        placeholder = by_id.get(match.group(0))
+        if placeholder is None:
+            raise Uncacheable(match.group(0))
+        return f"\x00{placeholder}\x00"
+
+    return _SNOWFLAKE_RE.sub(replace, value)
+
+
+def _bind(value, bindings: dict):
+    """Replaces placeholders in a cached argument with the current request's IDs."""
+    if isinstance(value, list):
+        return [_bind(item, bindings) for item in value]
+    if not isinstance(value, str):
+        return value
+    return _PLACEHOLDER_RE.sub(lambda match: bindings[match.group(1)], value)
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of command calls keyed by normalized request. Only
+    command outputs are cached; they are stored with IDs abstracted to
+    placeholders and re-bound to the current request's mentions on a hit.
+
+    An optional SQLite tier keeps entries across restarts.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 db_path: str = RESPONSE_CACHE_DB_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, name, args)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+        self._conn = None
+        self._lock = threading.Lock()
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, name TEXT NOT NULL, args TEXT NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(normalized: str, context: str) -> str:
+        return hashlib.sha256(f"{context}\x00{normalized}".encode()).hexdigest()
+
+    def get(self, key: str, bindings: dict):
+        """Returns (name, args) re-bound to the request's mentions, or None on a miss."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < now:
+            del self._entries[key]
+            entry = None
+        if entry is None and self._conn is not None:
+            entry = self._disk_get(key, now)
+            if entry is not None:
+                self.disk_hits += 1
+                self._remember(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        try:
+            args = {name: _bind(value, bindings) for name, value in entry[2].items()}
+        except KeyError:
+            # Cached call refers to a mention this request doesn't have
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1], args
+
+    def put(self, key: str, name: str, args: dict, bindings: dict):
+        by_id = {entity_id: placeholder for placeholder, entity_id in bindings.items()}
+        try:
+            abstract_args = {arg: _abstract(value, by_id) for arg, value in args.items()}
+        except Uncacheable:
+            self.uncacheable += 1
+            return
+        entry = (time.time() + self.ttl, name, abstract_args)
+        self._remember(key, entry)
+        if self._conn is not None:
+            self._disk_put(key, entry)
+
+    def _remember(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key: str, now: float):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, name, args FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[0] < now:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def _disk_put(self, key: str, entry: tuple):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, expires_at, name, args) VALUES (?, ?, ?, ?)",
+                (key, entry[0], entry[1], json.dumps(entry[2])),
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "uncacheable": self.uncacheable,
+        }
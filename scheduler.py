@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import discord
+
+from action_executor import ActionExecutor, channel_bucket, user_bucket
+
+logger = logging.getLogger("discord")
+
+SCHEDULER_DB_PATH = os.getenv("SCHEDULER_DB_PATH", "scheduler.db")
+SCHEDULER_TICK = 1.0  # Jobs due within the same tick are sent together
+SCHEDULER_SEND_CONCURRENCY = 10  # Max sends in flight for one batch
+SCHEDULER_MAX_ATTEMPTS = 5  # Sends tried before a job is marked failed
+SCHEDULER_RETRY_BASE = 30.0  # Seconds before the first retry; doubled on every further one
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    due REAL NOT NULL,
+    target_type TEXT NOT NULL,
+    target_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS scheduled_messages_due ON scheduled_messages (due);
+"""
+
+# Columns added after the first release, for stores created before them
+_ADDED_COLUMNS = {
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "failed": "INTEGER NOT NULL DEFAULT 0",
+    "last_error": "TEXT",
+}
+
+
+class ScheduleStore:
+    """
+    SQLite store for pending scheduled messages. Methods are blocking;
+    callers on the event loop should run them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = SCHEDULER_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(scheduled_messages)")}
+        for column, definition in _ADDED_COLUMNS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE scheduled_messages ADD COLUMN {column} {definition}")
+        self._conn.commit()
+
+    def add(self, due: float, target_type: str, target_id: int, content: str) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO scheduled_messages (due, target_type, target_id, content) VALUES (?, ?, ?, ?)",
+                (due, target_type, target_id, content),
+            )
+            return cursor.lastrowid
+
+    def pending(self):
+        """Returns (due, id) for every pending job; failed jobs are kept but not returned."""
+        with self._lock:
+            return self._conn.execute("SELECT due, id FROM scheduled_messages WHERE failed = 0").fetchall()
+
+    def fetch(self, job_ids: list):
+        """Returns (id, target_type, target_id, content, attempts) rows for the given jobs."""
+        with self._lock:
+            rows = []
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(job_ids), 500):
+                chunk = job_ids[i:i + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT id, target_type, target_id, content, attempts FROM scheduled_messages "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall())
+            return rows
+
+    def remove(self, job_ids: list):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM scheduled_messages WHERE id = ?", [(job_id,) for job_id in job_ids]
+            )
+
+    def retry(self, job_id: int, due: float, error: str):
+        """Counts a failed attempt and moves the job to its next due time."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE scheduled_messages SET due = ?, attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (due, error, job_id),
+            )
+
+    def mark_failed(self, job_id: int, error: str):
+        """Keeps a job that won't be retried, for inspection, without loading it again."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE scheduled_messages SET failed = 1, attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (error, job_id),
+            )
+
+
+class MessageScheduler:
+    """
+    Sends scheduled messages from a single timer task.
+
+    Pending jobs live on disk; memory only holds a min-heap of (due, job_id)
+    pairs, so hundreds of thousands of pending messages cost a few dozen
+    bytes each and survive restarts. Message content is read back from the
+    store when its batch comes due.
+    """
+
+    def __init__(self, bot, store: ScheduleStore = None, executor: ActionExecutor = None):
+        self.bot = bot
+        self.executor = executor if executor is not None else ActionExecutor()
+        self.store = store if store is not None else ScheduleStore()
+        self._heap = []  # (due, job_id), due is a unix timestamp
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def start(self):
+        """Reloads pending jobs from the store and starts the timer task."""
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        if not self._loaded:
+            self._loaded = True
+            pending = await asyncio.to_thread(self.store.pending)
+            self._heap.extend(pending)
+            heapq.heapify(self._heap)
+            self._wakeup.set()
+            logger.info(f"Scheduler reloaded {len(pending)} pending messages")
+
+    async def schedule(self, due: float, target_type: str, target_id: int, content: str) -> int:
+        """Persists a job and wakes the timer if it is now the earliest one."""
+        await self.start()
+        job_id = await asyncio.to_thread(self.store.add, due, target_type, target_id, content)
+        heapq.heappush(self._heap, (due, job_id))
+        if self._heap[0][1] == job_id:
+            self._wakeup.set()
+        return job_id
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue  # An earlier job arrived, re-check the heap
+                except asyncio.TimeoutError:
+                    pass
+
+            # Pop everything that comes due within this tick
+            horizon = time.time() + SCHEDULER_TICK
+            batch = []
+            while self._heap and self._heap[0][0] <= horizon:
+                batch.append(heapq.heappop(self._heap)[1])
+            try:
+                await self._send_batch(batch)
+            except Exception as e:
+                logger.error(f"Scheduler batch of {len(batch)} failed: {e}")
+
+    async def _send_batch(self, job_ids: list):
+        try:
+            rows = await asyncio.to_thread(self.store.fetch, job_ids)
+        except sqlite3.Error as e:
+            # The jobs are still on disk; put them back so they aren't lost until a restart
+            due = time.time() + SCHEDULER_RETRY_BASE
+            logger.error(
+                f"Scheduler could not load {len(job_ids)} due messages, retrying in {SCHEDULER_RETRY_BASE:.0f}s: {e}"
+            )
+            for job_id in job_ids:
+                heapq.heappush(self._heap, (due, job_id))
+            return
+
+        semaphore = asyncio.Semaphore(SCHEDULER_SEND_CONCURRENCY)
+        sent = []
+
+        async def send(row):
+            job_id, target_type, target_id, content, attempts = row
+            async with semaphore:
+                try:
+                    await self._send(target_type, target_id, content)
+                except Exception as e:
+                    await self._failed(job_id, attempts, e)
+                    return
+            sent.append(job_id)
+
+        # Failures are handled per job, so only the jobs that were actually sent are removed
+        results = await asyncio.gather(*(send(row) for row in rows), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Scheduler could not record a failed send: {result}")
+        if sent:
+            await asyncio.to_thread(self.store.remove, sent)
+
+    async def _failed(self, job_id: int, attempts: int, error: Exception):
+        """Retries a job with backoff, or marks it failed on a client error or after too many attempts."""
+        permanent = isinstance(error, discord.HTTPException) and 400 <= error.status < 500 and error.status != 429
+        if permanent or attempts + 1 >= SCHEDULER_MAX_ATTEMPTS:
+            logger.warning(f"Scheduled message {job_id} failed for good after {attempts + 1} attempts: {error}")
+            await asyncio.to_thread(self.store.mark_failed, job_id, str(error))
+            return
+        due = time.time() + SCHEDULER_RETRY_BASE * 2 ** attempts
+        logger.warning(f"Scheduled message {job_id} failed, retrying in {due - time.time():.0f}s: {error}")
+        await asyncio.to_thread(self.store.retry, job_id, due, str(error))
+        heapq.heappush(self._heap, (due, job_id))
+
+    async def _send(self, target_type: str, target_id: int, content: str):
+        if target_type == "dm":
+            user = self.bot.get_user(target_id) or await self.bot.fetch_user(target_id)
+            await self.executor.run(user_bucket(user, "dm"), user.send, content)
+        else:
+            channel = self.bot.get_channel(target_id) or await self.bot.fetch_channel(target_id)
+            await self.executor.run(channel_bucket(channel, "send"), channel.send, content)
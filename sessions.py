@@ -0,0 +1,96 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import discord
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", "300"))  # Seconds a follow-up question stays open
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))  # Oldest sessions are dropped beyond this
+SESSION_SWEEP_INTERVAL = 60  # Seconds between sweeps for expired sessions
+
+
+class Session:
+    """A pending follow-up question: what we asked, the bot message asking it, and the IDs needed to finish the command."""
+
+    __slots__ = ("kind", "data", "prompt_id", "expires_at")
+
+    def __init__(self, kind: str, data: dict, prompt_id: int, expires_at: float):
+        self.kind = kind
+        self.data = data
+        self.prompt_id = prompt_id
+        self.expires_at = expires_at
+
+
+class SessionStore:
+    """
+    Multi-turn command state keyed by (guild, channel, user). Sessions
+    hold IDs rather than discord objects, expire after SESSION_TTL and are
+    capped at SESSION_MAX. Every session has the same TTL, so insertion
+    order is expiry order and one sweeper task only ever looks at the
+    front of the queue.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # key -> Session, soonest to expire first
+        self._task = None
+        self.expired = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @staticmethod
+    def key(message: discord.Message) -> tuple:
+        guild_id = message.guild.id if message.guild else None
+        return guild_id, message.channel.id, message.author.id
+
+    def put(self, message: discord.Message, kind: str, prompt_id: int = None, **data):
+        """Opens (or replaces) the author's session in the message's channel; prompt_id is the bot's question."""
+        key = self.key(message)
+        self._sessions.pop(key, None)
+        self._sessions[key] = Session(kind, data, prompt_id, time.monotonic() + self.ttl)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.dropped += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    def get(self, message: discord.Message):
+        """Returns the author's open session in the channel without closing it, or None."""
+        key = self.key(message)
+        session = self._sessions.get(key)
+        if session is not None and session.expires_at <= time.monotonic():
+            del self._sessions[key]
+            self.expired += 1
+            return None
+        return session
+
+    def pop(self, message: discord.Message):
+        """Removes and returns the author's open session in the channel, or None."""
+        session = self._sessions.pop(self.key(message), None)
+        if session is None:
+            return None
+        if session.expires_at <= time.monotonic():
+            self.expired += 1
+            return None
+        return session
+
+    def sweep(self):
+        now = time.monotonic()
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.expires_at > now:
+                break
+            del self._sessions[key]
+            self.expired += 1
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+            self.sweep()
+
+    def stats(self) -> dict:
+        return {"open": len(self._sessions), "expired": self.expired, "dropped": self.dropped}
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# The agent's stores open SQLite files by default; keep them out of the tree
+_TMP = tempfile.mkdtemp(prefix="agent-tests-")
+for _name in ("ACTIVITY_DB_PATH", "SCHEDULER_DB_PATH", "USAGE_DB_PATH"):
+    os.environ.setdefault(_name, os.path.join(_TMP, _name.lower().replace("_path", "")))
+os.environ.setdefault("MISTRAL_API_KEY", "test")
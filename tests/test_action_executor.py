@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+import action_executor
+from action_executor import ActionExecutor, channel_bucket, user_bucket
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(action_executor, "ACTION_RETRY_BASE", 0.001)
+
+
+def _http_error(status: int, retry_after: float = 0) -> discord.HTTPException:
+    response = SimpleNamespace(status=status, reason="test", headers={"Retry-After": str(retry_after)})
+    return discord.HTTPException(response, "test")
+
+
+class _Flaky:
+    """Fails with the given statuses in turn, then succeeds."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.statuses:
+            raise _http_error(self.statuses.pop(0))
+        return "ok"
+
+
+def test_rate_limits_are_retried_and_counted():
+    executor = ActionExecutor()
+    call = _Flaky(429, 429)
+    assert asyncio.run(executor.run("channel:1:send", call)) == "ok"
+    assert call.calls == 3
+    stats = executor.stats()["channel:1:send"]
+    assert stats["retries"] == 2
+    assert stats["throttled"] == 2
+    assert stats["failures"] == 0
+
+
+def test_server_errors_are_retried_only_for_idempotent_calls():
+    executor = ActionExecutor()
+    create = _Flaky(503)
+    with pytest.raises(discord.HTTPException):
+        asyncio.run(executor.run("guild:1:roles", create))
+    assert create.calls == 1
+    assert executor.stats()["guild:1:roles"]["failures"] == 1
+
+    edit = _Flaky(503)
+    assert asyncio.run(executor.run("channel:1:edit", edit, idempotent=True)) == "ok"
+    assert edit.calls == 2
+
+
+def test_client_errors_and_exhausted_retries_raise():
+    executor = ActionExecutor(max_retries=2)
+    forbidden = _Flaky(403)
+    with pytest.raises(discord.HTTPException):
+        asyncio.run(executor.run("channel:1:send", forbidden))
+    assert forbidden.calls == 1
+
+    throttled = _Flaky(429, 429, 429)
+    with pytest.raises(discord.HTTPException):
+        asyncio.run(executor.run("channel:1:send", throttled))
+    assert throttled.calls == 3
+
+
+def test_bucket_concurrency_is_capped():
+    executor = ActionExecutor(bucket_concurrency=2)
+    active = peak = 0
+
+    async def call():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    async def scenario():
+        await asyncio.gather(*(executor.run("channel:1:send", call) for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+
+
+def test_bucket_keys():
+    assert channel_bucket(SimpleNamespace(id=5), "send") == "channel:5:send"
+    assert user_bucket(SimpleNamespace(id=7), "dm") == "user:7:dm"
@@ -0,0 +1,23 @@
+import asyncio
+
+from activity_store import ActivityStore
+from activity_tracker import ActivityTracker
+from benchmarks.fakes import build_world
+
+
+def test_sync_does_not_double_count_members_seen_live(tmp_path):
+    async def scenario():
+        _, guild = build_world(members=20, channels=2)
+        tracker = ActivityTracker(ActivityStore(str(tmp_path / "activity.db")))
+        # on_member_join fired for a member before the startup sync ran
+        newest = max(guild.members, key=lambda m: m.joined_at)
+        tracker.record_member_join(guild.bot_member)
+        tracker.record_member_join(newest)
+        await tracker.sync(guild)
+        activity = tracker.get(guild)
+        joins = [member_id for _, member_id in activity.recent_joins]
+        return activity.bots, joins, newest.id
+
+    bots, joins, newest_id = asyncio.run(scenario())
+    assert bots == 2
+    assert joins.count(newest_id) == 1
@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from benchmarks.fakes import FakeMessage, build_world
+from benchmarks.stub_mistral import CannedReply, StubMistral
+from llm_gateway import LLMGateway
+from response_cache import ResponseCache
+
+
+def _agent(bot, client):
+    from agent import MistralAgent
+
+    agent = MistralAgent(bot)
+    agent.client = client
+    agent.gateway = LLMGateway(client)
+    agent.response_cache = ResponseCache(db_path="")
+    agent.streaming = False
+    return agent
+
+
+def _run_all(contents: list, reply: CannedReply):
+    async def scenario():
+        bot, guild = build_world(members=10, channels=2)
+        client = StubMistral(default=reply)
+        agent = _agent(bot, client)
+        author = next(m for m in guild.members if not m.bot)
+        channel = guild.text_channels[0]
+        for content in contents:
+            await agent.run(FakeMessage(author, channel, f"{bot.user.mention} {content}"))
+        return client.calls, agent.response_cache.stats()
+
+    return asyncio.run(scenario())
+
+
+def test_repeated_request_is_served_from_the_cache():
+    reply = CannedReply(tool="create_poll", arguments={"question": "Lunch?", "answers": ["Pizza", "Sushi"]})
+    calls, stats = _run_all(["start a lunch poll with pizza or sushi"] * 4, reply)
+    assert calls == 1
+    assert stats["hits"] == 3
+
+
+def test_requests_that_refer_back_to_the_conversation_are_not_cached():
+    reply = CannedReply(tool="create_poll", arguments={"question": "Lunch?", "answers": ["Pizza", "Sushi"]})
+    calls, stats = _run_all(["do that again"] * 3, reply)
+    assert calls == 3
+    assert stats["hits"] == 0
+
+
+def test_follow_up_questions_are_answered_only_by_replies_or_mentions():
+    async def scenario():
+        bot, guild = build_world(members=10, channels=1)
+        client = StubMistral(default=CannedReply(tool="create_role", arguments={}))
+        agent = _agent(bot, client)
+        author = next(m for m in guild.members if not m.bot)
+        channel = guild.text_channels[0]
+
+        await agent.handle_message(FakeMessage(author, channel, f"{bot.user.mention} create a role"))
+        prompt = channel.sent[-1]
+        # Chatter from the same author isn't taken as the role name
+        chatter = await agent.handle_message(FakeMessage(author, channel, "brb, lunch"))
+        answer = FakeMessage(author, channel, "moderators")
+        answer.reference = SimpleNamespace(message_id=prompt.id)
+        answered = await agent.handle_message(answer)
+        return chatter, answered, [role.name for role in guild.roles], client.calls
+
+    chatter, answered, roles, calls = asyncio.run(scenario())
+    assert chatter is False
+    assert answered is True
+    assert "moderators" in roles
+    assert "brb, lunch" not in roles
+    assert calls == 1
+
+
+def test_follow_up_questions_can_be_cancelled():
+    async def scenario():
+        bot, guild = build_world(members=10, channels=1)
+        client = StubMistral(default=CannedReply(tool="create_role", arguments={}))
+        agent = _agent(bot, client)
+        author = next(m for m in guild.members if not m.bot)
+        channel = guild.text_channels[0]
+
+        await agent.handle_message(FakeMessage(author, channel, f"{bot.user.mention} create a role"))
+        await agent.handle_message(FakeMessage(author, channel, f"{bot.user.mention} cancel"))
+        return len(agent.discord_agent.sessions), channel.sent[-1].content, len(guild.roles)
+
+    open_sessions, last_reply, role_count = asyncio.run(scenario())
+    assert open_sessions == 0
+    assert last_reply == "Okay, cancelled."
+    assert role_count == 11
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from channel_context import CHANNEL_CONTEXT_MESSAGES, ChannelContextBuffer
+
+
+def _message(message_id: int, channel_id: int, content: str, name: str = "alice"):
+    return SimpleNamespace(id=message_id, guild=SimpleNamespace(id=9), channel=SimpleNamespace(id=channel_id),
+                           author=SimpleNamespace(display_name=name), content=content)
+
+
+def test_recent_skips_the_request_itself():
+    buffer = ChannelContextBuffer()
+    buffer.record(_message(1, 10, "hi"))
+    buffer.record(_message(2, 10, "mute bob", name="carol"))
+    assert buffer.recent(10) == "alice: hi\ncarol: mute bob"
+    assert buffer.recent(10, exclude_id=2) == "alice: hi"
+    assert buffer.recent(11) == ""
+
+
+def test_channels_are_capped_by_bytes_and_message_count():
+    buffer = ChannelContextBuffer(channel_bytes=40)
+    for i in range(5):
+        buffer.record(_message(i, 10, f"line {i}"))
+    # "alice: line N" is 13 bytes, so three fit
+    assert buffer.recent(10) == "alice: line 2\nalice: line 3\nalice: line 4"
+
+    buffer = ChannelContextBuffer()
+    for i in range(CHANNEL_CONTEXT_MESSAGES + 5):
+        buffer.record(_message(i, 10, "x"))
+    assert len(buffer.recent(10).splitlines()) == CHANNEL_CONTEXT_MESSAGES
+
+
+def test_least_recently_active_channels_are_evicted_over_the_total_cap():
+    buffer = ChannelContextBuffer(total_bytes=30)
+    buffer.record(_message(1, 10, "first"))
+    buffer.record(_message(2, 11, "second"))
+    buffer.record(_message(3, 12, "third"))
+    assert buffer.recent(10) == ""
+    assert buffer.recent(12) == "alice: third"
+    assert buffer.total_bytes <= 30
+
+    buffer.forget_channel(12)
+    assert buffer.stats() == {"channels": 1, "bytes": len("alice: second")}
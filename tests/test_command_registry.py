@@ -0,0 +1,83 @@
+import pytest
+
+from command_registry import (
+    CommandArgumentError,
+    CommandParseError,
+    ParsedCall,
+    make_tool_call,
+    parse_command,
+    validate,
+)
+
+
+def test_parse_command_reads_strings_lists_and_bare_values():
+    call = parse_command(
+        'Sure! create_poll(question="Lunch, today?", answers=["Pizza", "Sushi"], duration=2)'
+    )
+    assert call.name == "create_poll"
+    assert call.args["question"] == "Lunch, today?"
+    assert call.args["answers"] == ["Pizza", "Sushi"]
+    assert str(call.args["duration"]) == "2"
+
+
+def test_parse_command_ignores_chat_and_unknown_names():
+    assert parse_command("Hello! How can I help?") is None
+    assert parse_command("launch_rocket(target=moon)") is None
+
+
+@pytest.mark.parametrize("content", [
+    'create_role(role_name="admin"',
+    "create_role(admin)",
+    'create_role(role_name="admin)',
+])
+def test_parse_command_rejects_malformed_calls(content):
+    with pytest.raises(CommandParseError):
+        parse_command(content)
+
+
+def test_make_tool_call_decodes_json_arguments():
+    call = make_tool_call("create_role", '{"role_name": "admin"}')
+    assert call.name == "create_role"
+    assert call.args == {"role_name": "admin"}
+    assert make_tool_call("launch_rocket", "{}") is None
+    with pytest.raises(CommandParseError):
+        make_tool_call("create_role", "{not json")
+    with pytest.raises(CommandParseError):
+        make_tool_call("create_role", "[1, 2]")
+
+
+def test_validate_coerces_kinds_and_fills_optional_arguments():
+    args = validate(ParsedCall("create_poll", {"question": " Lunch? ", "answers": "Pizza, Sushi", "duration": "2"}))
+    assert args == {"question": "Lunch?", "answers": ["Pizza", "Sushi"], "duration": 2}
+
+    args = validate(ParsedCall("create_channel", {"channel_name": "room", "private": "True"}))
+    assert args["private"] is True
+    assert args["category"] is None
+
+
+def test_validate_reports_missing_required_arguments():
+    with pytest.raises(CommandArgumentError, match="No question found"):
+        validate(ParsedCall("create_poll", {"answers": ["a", "b"]}))
+    with pytest.raises(CommandArgumentError, match="No answers found"):
+        validate(ParsedCall("create_poll", {"question": "Lunch?", "answers": []}))
+    # Optional arguments are asked for in a follow-up instead
+    assert validate(ParsedCall("create_role", {})) == {"role_name": None}
+
+
+@pytest.mark.parametrize("duration, expected", [(2, 2), (2.0, 2), ("3", 3), ("3.0", 3)])
+def test_validate_accepts_whole_numbers(duration, expected):
+    args = validate(ParsedCall("create_poll", {"question": "Q", "answers": ["a", "b"], "duration": duration}))
+    assert args["duration"] == expected
+
+
+@pytest.mark.parametrize("duration", [2.5, "2.5", "two", {"hours": 2}, True, float("inf")])
+def test_validate_rejects_non_integral_and_non_numeric_ints(duration):
+    with pytest.raises(CommandArgumentError):
+        validate(ParsedCall("create_poll", {"question": "Q", "answers": ["a", "b"], "duration": duration}))
+
+
+def test_validate_rejects_lists_for_scalar_arguments_and_bad_bools():
+    with pytest.raises(CommandArgumentError):
+        validate(ParsedCall("create_role", {"role_name": ["a", "b"]}))
+    with pytest.raises(CommandArgumentError):
+        validate(ParsedCall("create_channel", {"channel_name": "room", "private": "maybe"}))
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from conversation_history import ConversationHistory
+
+_NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _message(author: str, content: str):
+    return SimpleNamespace(author=SimpleNamespace(name=author), content=content, created_at=_NOW)
+
+
+def test_count_mode_keeps_the_last_messages():
+    history = ConversationHistory(limit=3)
+    for i in range(5):
+        history.add(1, _message("alice", f"message {i}"))
+    assert history.render(1) == "alice: message 2\nalice: message 3\nalice: message 4"
+    assert history.render(2) == ""
+
+
+def test_least_recently_used_guilds_are_evicted_over_the_byte_cap():
+    history = ConversationHistory(limit=10)
+    history.add(1, _message("bob", "hello"))
+    history.max_bytes = history.total_bytes * 2
+    history.add(2, _message("bob", "hello"))
+    # Reading a guild's history counts as using it, so guild 2 is now the oldest
+    history.render(1)
+    history.add(3, _message("bob", "hello"))
+    assert history.evictions == 1
+    assert history.render(1) == history.render(3) == "bob: hello"
+    assert history.render(2) == ""
+    assert history.total_bytes <= history.max_bytes
+
+
+def test_byte_total_matches_the_guilds_kept():
+    history = ConversationHistory(limit=2)
+    for i in range(10):
+        history.add(i % 3, _message("carol", "x" * (i * 10)))
+    assert history.total_bytes == sum(guild.bytes for guild in history._guilds.values())
+
+
+def test_token_mode_folds_old_messages_into_a_summary():
+    calls = []
+
+    async def summarizer(guild_id, previous, lines):
+        calls.append(lines)
+        return f"{previous} +{len(lines)}".strip()
+
+    async def scenario():
+        # Each line is 5 tokens, so 6 of them fill the 30 tokens left after the summary's share
+        history = ConversationHistory(limit=50, token_budget=230, summarizer=summarizer)
+        for i in range(20):
+            history.add(1, _message("dave", f"message {i:02}"))
+        while history._tasks:
+            await asyncio.gather(*history._tasks)
+        return history
+
+    history = asyncio.run(scenario())
+    rendered = history.render(1)
+    assert rendered.startswith("(Summary of earlier conversation:")
+    assert rendered.endswith("\n".join(f"dave: message {i}" for i in range(14, 20)))
+    assert "message 13" not in rendered
+    assert sum(len(lines) for lines in calls) + len(history._guilds[1].entries) == 20
+    assert history.stats()["summaries"] == len(calls)
+
+
+def test_failed_summaries_keep_the_pending_messages():
+    async def summarizer(guild_id, previous, lines):
+        raise RuntimeError("unavailable")
+
+    async def scenario():
+        history = ConversationHistory(limit=2, token_budget=10_000, summarizer=summarizer)
+        for i in range(4):
+            history.add(1, _message("erin", f"message {i}"))
+        while history._tasks:
+            await asyncio.gather(*history._tasks)
+        return history
+
+    history = asyncio.run(scenario())
+    assert history.summary_failures == 1
+    assert [entry.content for entry in history._guilds[1].pending] == ["message 0", "message 1"]
+    assert "Summary" not in history.render(1)
@@ -0,0 +1,78 @@
+import asyncio
+
+from benchmarks.fakes import FakeMessage, build_world
+from discord_agent import DiscordAgent
+
+
+def test_concurrent_mutes_of_one_channel_keep_each_others_overwrites():
+    async def scenario():
+        bot, guild = build_world(members=10, channels=1, rest_latency=0.01)
+        agent = DiscordAgent(bot)
+        channel = guild.text_channels[0]
+        first, second = [m for m in guild.members if not m.bot][:2]
+        await asyncio.gather(
+            agent._set_send_permission([channel], [first], False, "test"),
+            agent._set_send_permission([channel], [second], False, "test"),
+        )
+        return channel.overwrites_for(first), channel.overwrites_for(second)
+
+    first, second = asyncio.run(scenario())
+    assert first.send_messages is False
+    assert second.send_messages is False
+
+
+def test_overwrites_build_on_the_last_edit_before_the_cache_catches_up():
+    async def scenario():
+        bot, guild = build_world(members=10, channels=1, rest_latency=0.01)
+        agent = DiscordAgent(bot)
+        channel = guild.text_channels[0]
+        written = []
+
+        async def edit(*, overwrites=None, **kwargs):
+            # Like discord.py, the cached channel only changes when the update event arrives
+            await guild.rest()
+            written.append(dict(overwrites))
+
+        channel.edit = edit
+        first, second = [m for m in guild.members if not m.bot][:2]
+        await asyncio.gather(
+            agent._set_send_permission([channel], [first], False, "test"),
+            agent._set_send_permission([channel], [second], False, "test"),
+        )
+        return written[-1], first, second
+
+    last, first, second = asyncio.run(scenario())
+    assert last[first].send_messages is False
+    assert last[second].send_messages is False
+
+
+def test_group_chats_are_counted_from_structured_results():
+    async def scenario():
+        bot, guild = build_world(members=10, channels=1)
+        agent = DiscordAgent(bot)
+        users = [m for m in guild.members if not m.bot]
+        message = FakeMessage(users[0], guild.text_channels[0], "make group chats")
+        return await agent.create_group_chats(
+            message, [[users[1].mention, users[2].mention], ["<@1>"], [users[3].mention]]
+        )
+
+    result = asyncio.run(scenario())
+    assert result.splitlines() == [
+        "Created 2 of 3 private threads!",
+        "Group 2: No valid users found. Please check the user IDs.",
+    ]
+
+
+def test_replies_and_progress_edits_go_through_the_executor():
+    async def scenario():
+        bot, guild = build_world(members=10, channels=2)
+        agent = DiscordAgent(bot)
+        users = [m for m in guild.members if not m.bot]
+        channel = guild.text_channels[0]
+        message = FakeMessage(users[0], channel, "mute")
+        await agent.mute_member_from_channel(message, [users[1].mention], [guild.text_channels[1].mention])
+        return agent.executor.stats(), channel
+
+    stats, channel = asyncio.run(scenario())
+    assert stats[f"channel:{channel.id}:send"]["calls"] == 1
+    assert stats[f"channel:{channel.id}:message_edit"]["calls"] == 1
@@ -0,0 +1,50 @@
+import re
+from types import SimpleNamespace
+
+from fast_path import FastPathRouter
+
+BOT_ID = 999999999999999999
+AUTHOR = 111111111111111111
+
+
+def _message(content: str):
+    return SimpleNamespace(content=content, author=SimpleNamespace(id=AUTHOR, mention=f"<@{AUTHOR}>"))
+
+
+def _match(router, content: str):
+    return router.match(_message(f"<@{BOT_ID}> {content}"), BOT_ID)
+
+
+def test_unambiguous_requests_are_routed_locally():
+    router = FastPathRouter()
+    call = _match(router, "mute <@222222222222222222> and me in <#333333333333333333>, <#444444444444444444>.")
+    assert call.name == "mute_member_from_channel"
+    assert call.args == {
+        "user_mentions": ["<@222222222222222222>", f"<@{AUTHOR}>"],
+        "channel_mentions": ["<#333333333333333333>", "<#444444444444444444>"],
+    }
+
+    call = _match(router, "unmute <@222222222222222222> in <#333333333333333333>")
+    assert call.name == "unmute_member_from_channel"
+
+    call = _match(router, "give the Moderators role to <@222222222222222222>")
+    assert call.name == "assign_role"
+    assert call.args == {"member": "<@222222222222222222>", "role_name": "Moderators"}
+    assert router.stats()["hits"] == 3
+
+
+def test_requests_with_anything_extra_fall_through():
+    router = FastPathRouter()
+    assert _match(router, "mute <@222222222222222222> in <#333333333333333333> for an hour") is None
+    assert _match(router, "mute him in <#333333333333333333>") is None
+    assert _match(router, "what's the weather like?") is None
+    assert router.stats()["hits"] == 0
+    assert router.stats()["ambiguous"] == 0
+
+
+def test_requests_matching_more_than_one_route_fall_through():
+    router = FastPathRouter()
+    _, pattern, build = next(route for route in router.routes if route[0] == "create_role")
+    router.routes.append(("create_channel", re.compile(pattern.pattern, re.IGNORECASE), build))
+    assert _match(router, "create a role called helpers") is None
+    assert router.stats()["ambiguous"] == 1
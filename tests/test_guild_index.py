@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from guild_index import GuildLookup
+
+
+def _guild(*role_names):
+    roles = [SimpleNamespace(name=name) for name in role_names]
+    return SimpleNamespace(id=1, roles=roles, categories=[], channels=[])
+
+
+def test_roles_match_ignoring_case_and_punctuation():
+    guild = _guild("@everyone", "Team Lead", "devops")
+    lookup = GuildLookup()
+    assert lookup.role(guild, "team lead").name == "Team Lead"
+    assert lookup.role(guild, "team-lead").name == "Team Lead"
+    assert lookup.role(guild, "DevOps").name == "devops"
+
+
+def test_exact_lookups_skip_the_slug_match():
+    guild = _guild("@everyone", "devops")
+    lookup = GuildLookup()
+    assert lookup.role(guild, "dev-ops").name == "devops"
+    assert lookup.role(guild, "dev-ops", exact=True) is None
+    assert lookup.role(guild, "DEVOPS", exact=True).name == "devops"
+
+
+def test_names_without_letters_or_digits_do_not_collide():
+    guild = _guild("@everyone", "🎉", "✨")
+    lookup = GuildLookup()
+    assert lookup.role(guild, "✨").name == "✨"
+    assert lookup.role(guild, "🚀") is None
+    assert lookup.role(guild, "!!!") is None
+
+
+def test_invalidate_rebuilds_the_index():
+    guild = _guild("@everyone", "mods")
+    lookup = GuildLookup()
+    assert lookup.role(guild, "admins") is None
+    guild.roles.append(SimpleNamespace(name="Admins"))
+    assert lookup.role(guild, "admins") is None
+    lookup.invalidate(guild)
+    assert lookup.role(guild, "admins").name == "Admins"
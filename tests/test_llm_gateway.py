@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llm_gateway import GatewayBusy, LLMGateway
+
+
+class _Client:
+    """Records the peak number of concurrent calls; each call takes `delay` seconds."""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.chat = SimpleNamespace(complete_async=self.complete_async, stream_async=self.stream_async)
+
+    async def complete_async(self, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return "ok"
+
+    async def stream_async(self, **kwargs):
+        return self._events()
+
+    async def _events(self):
+        # First event right away, then a long answer
+        for index in range(5):
+            yield index
+            await asyncio.sleep(self.delay)
+
+
+def test_concurrency_stays_within_the_limit():
+    async def scenario():
+        client = _Client()
+        gateway = LLMGateway(client, initial_limit=2, max_limit=2, max_queue=100)
+        results = await asyncio.gather(*(gateway.complete() for _ in range(10)))
+        return client, gateway, results
+
+    client, gateway, results = asyncio.run(scenario())
+    assert results == ["ok"] * 10
+    assert client.peak == 2
+    assert gateway.in_flight == 0
+
+
+def test_fast_calls_raise_the_limit_and_slow_calls_halve_it():
+    async def scenario(latency_target):
+        gateway = LLMGateway(_Client(), initial_limit=4, latency_target=latency_target)
+        await gateway.complete()
+        return gateway.limit
+
+    assert asyncio.run(scenario(latency_target=10)) == pytest.approx(4.25)
+    assert asyncio.run(scenario(latency_target=0)) == 2
+
+
+def test_full_queue_sheds_requests():
+    async def scenario():
+        gateway = LLMGateway(_Client(delay=0.05), initial_limit=1, max_limit=1, max_queue=1)
+        return await asyncio.gather(*(gateway.complete() for _ in range(3)), return_exceptions=True), gateway
+
+    results, gateway = asyncio.run(scenario())
+    assert sum(isinstance(result, GatewayBusy) for result in results) == 1
+    assert gateway.shed == 1
+
+
+def test_long_streams_are_judged_by_their_first_event():
+    async def scenario():
+        gateway = LLMGateway(_Client(delay=0.02), initial_limit=4, latency_target=0.05)
+        events = [event async for event in gateway.stream()]
+        return events, gateway
+
+    events, gateway = asyncio.run(scenario())
+    assert events == [0, 1, 2, 3, 4]
+    assert gateway.limit == pytest.approx(4.25)
+    assert gateway.in_flight == 0
@@ -0,0 +1,31 @@
+import member_context
+from benchmarks.fakes import FakeMessage, build_world
+from member_context import MemberContextBuilder
+
+
+def _speak(builder, guild, members):
+    channel = guild.text_channels[0]
+    for member in members:
+        message = FakeMessage(member, channel, "hello")
+        builder.observe(message)
+        builder.build(message)
+
+
+def test_member_cache_is_capped_per_guild(monkeypatch):
+    monkeypatch.setattr(member_context, "MAX_CACHED_MEMBERS_PER_GUILD", 30)
+    _, guild = build_world(members=60)
+    builder = MemberContextBuilder()
+    _speak(builder, guild, guild.members)
+    cached = builder._member_cache[guild.id]
+    assert len(cached) == 30
+    # The most recent speakers are the ones kept
+    assert guild.members[-1].id in cached
+
+
+def test_forget_guild_drops_its_caches():
+    _, guild = build_world(members=10)
+    builder = MemberContextBuilder()
+    _speak(builder, guild, guild.members)
+    builder.forget_guild(guild)
+    assert guild.id not in builder._member_cache
+    assert builder._channel_cache == {}
@@ -0,0 +1,41 @@
+from benchmarks.fakes import build_world
+from member_index import MemberDirectory
+
+
+def _member(guild, index: int):
+    return next(m for m in guild.members if m.name.startswith(f"user{index}_"))
+
+
+def test_find_resolves_exact_and_prefix_matches():
+    _, guild = build_world(members=50)
+    directory = MemberDirectory()
+    member = _member(guild, 7)
+    assert directory.find(guild, member.name) is member
+    assert directory.find(guild, member.name.upper()) is member
+    assert directory.find(guild, "user7_") is member
+    assert directory.find(guild, "helperbot", bot=False) is None
+    assert directory.find(guild, "helperbot", bot=True).name == "helperbot"
+
+
+def test_find_never_resolves_a_typo_but_search_offers_it():
+    _, guild = build_world(members=50)
+    directory = MemberDirectory()
+    member = _member(guild, 7)
+    typo = member.name[:-1] + ("0" if member.name[-1] != "0" else "1")
+    assert directory.find(guild, typo) is None
+    assert member in directory.search(guild, typo)
+
+
+def test_index_follows_member_updates_and_removals():
+    _, guild = build_world(members=20)
+    directory = MemberDirectory()
+    member = _member(guild, 4)
+    directory.index(guild)
+
+    member.nick = "captain"
+    directory.member_updated(member)
+    assert directory.find(guild, "captain") is member
+
+    directory.member_removed(member)
+    assert directory.find(guild, "captain") is None
+    assert member.id not in directory.index(guild)
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from response_cache import ResponseCache, depends_on_context, normalize_request
+
+BOT_ID = 999999999999999999
+
+
+def _message(author_id: int, content: str):
+    return SimpleNamespace(author=SimpleNamespace(id=author_id), content=content)
+
+
+def test_make_key_separates_context():
+    key = ResponseCache.make_key("mute <@u0>", "model|tools|v1|False|1|abc")
+    assert key == ResponseCache.make_key("mute <@u0>", "model|tools|v1|False|1|abc")
+    assert key != ResponseCache.make_key("mute <@u0>", "model|tools|v1|False|2|abc")
+    assert key != ResponseCache.make_key("mute <@u0>", "model|tools|v1|False|1|def")
+    assert key != ResponseCache.make_key("unmute <@u0>", "model|tools|v1|False|1|abc")
+
+
+def test_normalize_request_abstracts_mentions_case_and_whitespace():
+    first, first_bindings = normalize_request(
+        _message(111111111111111111, f"<@{BOT_ID}>  Mute <@222222222222222222> in <#333333333333333333>"), BOT_ID
+    )
+    second, second_bindings = normalize_request(
+        _message(444444444444444444, f"<@{BOT_ID}> mute <@555555555555555555>   in <#666666666666666666>"), BOT_ID
+    )
+    assert first == second
+    assert first_bindings["U0"] == "222222222222222222"
+    assert second_bindings["U0"] == "555555555555555555"
+    assert second_bindings["S"] == "444444444444444444"
+
+
+def test_cached_call_is_rebound_to_the_new_mentions():
+    cache = ResponseCache(db_path="")
+    normalized, bindings = normalize_request(_message(111111111111111111, "mute <@222222222222222222>"), BOT_ID)
+    key = ResponseCache.make_key(normalized, "ctx")
+    cache.put(key, "mute_member_from_channel", {"user_mentions": ["<@222222222222222222>"]}, bindings)
+
+    _, other_bindings = normalize_request(_message(111111111111111111, "mute <@777777777777777777>"), BOT_ID)
+    assert cache.get(key, other_bindings) == ("mute_member_from_channel", {"user_mentions": ["<@777777777777777777>"]})
+
+
+def test_calls_referring_to_ids_outside_the_request_are_not_cached():
+    cache = ResponseCache(db_path="")
+    normalized, bindings = normalize_request(_message(111111111111111111, "mute him"), BOT_ID)
+    key = ResponseCache.make_key(normalized, "ctx")
+    cache.put(key, "mute_member_from_channel", {"user_mentions": ["<@888888888888888888>"]}, bindings)
+    assert cache.get(key, bindings) is None
+    assert cache.stats()["uncacheable"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(max_size=1, db_path="")
+    cache.put("a", "create_role", {"role_name": "x"}, {})
+    cache.put("b", "create_role", {"role_name": "y"}, {})
+    assert cache.get("a", {}) is None
+    assert cache.get("b", {}) == ("create_role", {"role_name": "y"})
+
+    expired = ResponseCache(ttl=-1, db_path="")
+    expired.put("a", "create_role", {"role_name": "x"}, {})
+    assert expired.get("a", {}) is None
+
+
+def test_depends_on_context():
+    assert depends_on_context("mute him")
+    assert depends_on_context("<@b> do that again")
+    assert depends_on_context("yes")
+    assert depends_on_context("invite <@u0> to that channel")
+    assert not depends_on_context("<@b> mute <@u0> in <#c0>")
+    assert not depends_on_context("create a role called moderators")
@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import discord
+
+from scheduler import SCHEDULER_MAX_ATTEMPTS, MessageScheduler, ScheduleStore
+
+
+def _http_error(status: int) -> discord.HTTPException:
+    return discord.HTTPException(SimpleNamespace(status=status, reason="test"), "test")
+
+
+class _Store(ScheduleStore):
+    """Counts remove transactions and can make fetch fail."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.removes = []
+        self.fail_fetch = False
+
+    def remove(self, job_ids):
+        self.removes.append(sorted(job_ids))
+        super().remove(job_ids)
+
+    def fetch(self, job_ids):
+        if self.fail_fetch:
+            raise sqlite3.OperationalError("database is locked")
+        return super().fetch(job_ids)
+
+
+class _Channel:
+    def __init__(self, channel_id: int, error: Exception = None):
+        self.id = channel_id
+        self.error = error
+        self.sent = []
+
+    async def send(self, content):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(content)
+
+
+def _scheduler(tmp_path, channels):
+    bot = SimpleNamespace(get_channel={channel.id: channel for channel in channels}.get)
+    return MessageScheduler(bot, store=_Store(str(tmp_path / "scheduler.db")))
+
+
+def test_batch_removes_sent_jobs_in_one_transaction_and_keeps_failures(tmp_path):
+    ok = _Channel(1)
+    forbidden = _Channel(2, _http_error(403))
+    flaky = _Channel(3, _http_error(503))
+    scheduler = _scheduler(tmp_path, [ok, forbidden, flaky])
+    store = scheduler.store
+
+    async def scenario():
+        now = time.time()
+        ids = [store.add(now, "channel", channel.id, "hi") for channel in (ok, ok, forbidden, flaky)]
+        await scheduler._send_batch(ids)
+        return ids
+
+    sent_a, sent_b, failed, retried = asyncio.run(scenario())
+    assert ok.sent == ["hi", "hi"]
+    assert store.removes == [sorted([sent_a, sent_b])]
+    # The 403 is kept but never reloaded; the 503 is retried later
+    assert store.pending() == [(scheduler._heap[0][0], retried)]
+    assert [job_id for _, job_id in scheduler._heap] == [retried]
+    assert scheduler._heap[0][0] > time.time()
+    assert store.fetch([failed])[0][4] == 1
+
+
+def test_job_is_marked_failed_after_max_attempts(tmp_path):
+    flaky = _Channel(3, _http_error(503))
+    scheduler = _scheduler(tmp_path, [flaky])
+    store = scheduler.store
+
+    async def scenario():
+        job_id = store.add(time.time(), "channel", flaky.id, "hi")
+        for _ in range(SCHEDULER_MAX_ATTEMPTS):
+            scheduler._heap.clear()
+            await scheduler._send_batch([job_id])
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert store.pending() == []
+    assert scheduler._heap == []
+    assert store.fetch([job_id])[0][4] == SCHEDULER_MAX_ATTEMPTS
+
+
+def test_fetch_failure_puts_jobs_back_on_the_heap(tmp_path):
+    ok = _Channel(1)
+    scheduler = _scheduler(tmp_path, [ok])
+    store = scheduler.store
+
+    async def scenario():
+        ids = [store.add(time.time(), "channel", ok.id, "hi") for _ in range(3)]
+        store.fail_fetch = True
+        await scheduler._send_batch(ids)
+        return ids
+
+    ids = asyncio.run(scenario())
+    assert sorted(job_id for _, job_id in scheduler._heap) == ids
+    assert all(due > time.time() for due, _ in scheduler._heap)
+    assert ok.sent == []
+    assert store.removes == []
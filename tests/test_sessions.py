@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from sessions import SessionStore
+
+
+def _message(author_id: int, channel_id: int = 1):
+    return SimpleNamespace(guild=SimpleNamespace(id=9), channel=SimpleNamespace(id=channel_id),
+                           author=SimpleNamespace(id=author_id))
+
+
+def test_sessions_are_keyed_per_author_and_channel():
+    async def scenario():
+        store = SessionStore()
+        store.put(_message(1), "create_role_name", 100)
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.get(_message(2)) is None
+    assert store.get(_message(1, channel_id=2)) is None
+    assert store.get(_message(1)).prompt_id == 100
+    # get leaves the session open, pop closes it
+    assert store.pop(_message(1)).kind == "create_role_name"
+    assert store.pop(_message(1)) is None
+
+
+def test_expired_sessions_are_dropped():
+    async def scenario():
+        store = SessionStore(ttl=-1)
+        store.put(_message(1), "create_role_name")
+        store.put(_message(2), "create_role_name")
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.get(_message(1)) is None
+    store.sweep()
+    assert len(store) == 0
+    assert store.stats()["expired"] == 2
+
+
+def test_oldest_sessions_are_dropped_beyond_the_cap():
+    async def scenario():
+        store = SessionStore(max_sessions=2)
+        for author_id in range(3):
+            store.put(_message(author_id), "create_role_name")
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.get(_message(0)) is None
+    assert store.get(_message(2)) is not None
+    assert store.stats()["dropped"] == 1
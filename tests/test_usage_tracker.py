@@ -0,0 +1,63 @@
+import asyncio
+
+import usage_tracker
+from usage_tracker import BUDGET_EXCEEDED, BUDGET_OK, BUDGET_REDUCED, PromptUsage, UsageStore, UsageTracker
+
+
+def _usage(prompt_tokens: int, completion_tokens: int = 0) -> PromptUsage:
+    usage = PromptUsage("mistral-large-latest", message=prompt_tokens)
+    usage.prompt_tokens = prompt_tokens
+    usage.completion_tokens = completion_tokens
+    return usage
+
+
+def _record(tracker: UsageTracker, *calls):
+    async def scenario():
+        for call in calls:
+            tracker.record(*call)
+        tracker._task.cancel()
+        await tracker.flush()
+
+    asyncio.run(scenario())
+
+
+def test_budget_states_follow_the_guilds_spend(tmp_path):
+    # 500k prompt tokens of the large model cost $1
+    tracker = UsageTracker(UsageStore(str(tmp_path / "usage.db")), soft_budget=1.0, hard_budget=2.0)
+    assert tracker.budget_state(1) == BUDGET_OK
+    _record(tracker, (1, 5, "mute", _usage(500_000)))
+    assert tracker.budget_state(1) == BUDGET_REDUCED
+    assert tracker.budget_state(2) == BUDGET_OK
+    _record(tracker, (1, 6, "mute", _usage(500_000)))
+    assert tracker.budget_state(1) == BUDGET_EXCEEDED
+    # DMs aren't budgeted
+    assert tracker.budget_state(None) == BUDGET_OK
+
+
+def test_totals_are_split_by_guild_user_and_command(tmp_path):
+    tracker = UsageTracker(UsageStore(str(tmp_path / "usage.db")))
+    _record(
+        tracker,
+        (1, 5, "mute", _usage(100, 10)),
+        (1, 6, "mute", _usage(200, 20)),
+        (2, 5, "create_role", _usage(300, 30)),
+        (None, 5, "chat", _usage(50)),
+    )
+    assert [key for key, _ in tracker.top("user")] == ["5", "6"]
+    assert tracker.top("command")[0][0] == "create_role"
+    assert [key for key, _ in tracker.top("guild_user", guild_id=1)] == ["6", "5"]
+    guild = dict(tracker.top("guild"))
+    assert guild["1"].prompt_tokens == 300 and guild["1"].requests == 2
+    assert guild["dm"].est_message == 50
+
+
+def test_saved_totals_are_reloaded_and_reset_the_next_day(tmp_path, monkeypatch):
+    path = str(tmp_path / "usage.db")
+    _record(UsageTracker(UsageStore(path)), (1, 5, "mute", _usage(100)), (1, 5, "mute", _usage(100)))
+
+    reloaded = UsageTracker(UsageStore(path))
+    assert dict(reloaded.top("guild"))["1"].prompt_tokens == 200
+
+    monkeypatch.setattr(usage_tracker, "_today", lambda: "2999-01-01")
+    assert reloaded.top("guild") == []
+    assert UsageTracker(UsageStore(path)).top("guild") == []
@@ -0,0 +1,131 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import time
+
+import discord
+
+logger = logging.getLogger("discord")
+
+TRACE_PATH = os.getenv("TRACE_PATH", "")  # Empty disables recording
+TRACE_FLUSH_INTERVAL = 5  # Seconds between writes of buffered events
+TRACE_VERSION = 1
+
+_LINK_RE = re.compile(r"https?://")
+
+# Bits of an event's flags field
+FLAG_MENTIONS_BOT = 1
+FLAG_FROM_BOT = 2
+FLAG_COMMAND = 4
+FLAG_LINK = 8
+FLAG_DM = 16
+
+# Field order of an event row
+EVENT_FIELDS = (
+    "offset_ms", "guild", "channel", "author", "flags",
+    "length", "words", "user_mentions", "channel_mentions", "role_mentions", "attachments",
+)
+
+
+class TraceRecorder:
+    """
+    Records the shape of every message the bot sees, for replay by
+    benchmarks/replay.py. No content or real IDs are written: guilds,
+    channels and authors become small per-trace numbers and messages are
+    reduced to their timing, length, mention counts and flags.
+
+    The trace is gzipped JSON lines, a header object followed by one
+    array per event in EVENT_FIELDS order.
+    """
+
+    def __init__(self, path: str = TRACE_PATH):
+        self.path = path
+        self._started = time.monotonic()
+        self._ids = {}  # (kind, real id) -> anonymous number
+        self._buffer = []
+        self._task = None
+        self.recorded = 0
+        with gzip.open(self.path, "at") as f:
+            f.write(json.dumps({"version": TRACE_VERSION, "fields": EVENT_FIELDS, "started_at": time.time()}) + "\n")
+
+    def _anon(self, kind: str, real_id) -> int:
+        key = (kind, real_id)
+        number = self._ids.get(key)
+        if number is None:
+            number = self._ids[key] = len(self._ids)
+        return number
+
+    def record(self, message: discord.Message, bot_user):
+        content = message.content
+        flags = 0
+        if bot_user is not None and bot_user in message.mentions:
+            flags |= FLAG_MENTIONS_BOT
+        if message.author.bot:
+            flags |= FLAG_FROM_BOT
+        if content.startswith("!"):
+            flags |= FLAG_COMMAND
+        if _LINK_RE.search(content):
+            flags |= FLAG_LINK
+        if message.guild is None:
+            flags |= FLAG_DM
+        self._buffer.append([
+            round((time.monotonic() - self._started) * 1000),
+            self._anon("guild", message.guild.id) if message.guild else -1,
+            self._anon("channel", message.channel.id),
+            self._anon("author", message.author.id),
+            flags,
+            len(content),
+            len(content.split()),
+            len(message.mentions) - (1 if flags & FLAG_MENTIONS_BOT else 0),
+            len(message.channel_mentions),
+            len(message.role_mentions),
+            len(message.attachments),
+        ])
+        self.recorded += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(TRACE_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except OSError as e:
+            logger.warning(f"Failed to write {len(rows)} trace events: {e}")
+
+    def _write(self, rows: list):
+        with gzip.open(self.path, "at") as f:
+            f.write("".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows))
+
+
+def read_trace(path: str):
+    """
+    Returns (header, list of event dicts) from a trace file. A file that
+    was recorded across restarts holds several segments, each starting
+    with its own header; they are joined end to end.
+    """
+    header = None
+    events = []
+    base = 0  # Offset added to the current segment's events
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if isinstance(row, dict):
+                header = header or row
+                base = events[-1]["offset_ms"] if events else 0
+                continue
+            event = dict(zip(EVENT_FIELDS, row))
+            event["offset_ms"] += base
+            events.append(event)
+    return header, events
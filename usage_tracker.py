@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger("discord")
+
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "usage.db")
+USAGE_FLUSH_INTERVAL = 30  # Seconds between writes of new usage to disk
+
+# Daily spend per guild in USD; 0 disables. Past the soft budget requests get
+# a reduced prompt, past the hard budget they are refused.
+GUILD_DAILY_SOFT_BUDGET = float(os.getenv("GUILD_DAILY_SOFT_BUDGET", "0"))
+GUILD_DAILY_HARD_BUDGET = float(os.getenv("GUILD_DAILY_HARD_BUDGET", "0"))
+
+# USD per million (prompt, completion) tokens; unknown models are priced like the large one
+MODEL_PRICES = {
+    "mistral-large-latest": (2.0, 6.0),
+    "mistral-small-latest": (0.2, 0.6),
+}
+DEFAULT_PRICE = MODEL_PRICES["mistral-large-latest"]
+
+# Prompt sections estimated locally with member_context.estimate_tokens
+SECTIONS = ("system", "history", "channel_context", "members", "mentions", "message")
+
+# Budget states returned by UsageTracker.budget_state
+BUDGET_OK = "ok"
+BUDGET_REDUCED = "reduced"
+BUDGET_EXCEEDED = "exceeded"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS llm_usage (
+    day TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    {", ".join(f"est_{section} INTEGER NOT NULL DEFAULT 0" for section in SECTIONS)},
+    PRIMARY KEY (day, scope, key)
+);
+"""
+
+_COLUMNS = ("requests", "prompt_tokens", "completion_tokens", "cost") + tuple(f"est_{s}" for s in SECTIONS)
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def price(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost in USD of one call."""
+    prompt_price, completion_price = MODEL_PRICES.get(model, DEFAULT_PRICE)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+class PromptUsage:
+    """
+    Accounting record of one LLM call: the local per-section prompt
+    estimate, filled in while the prompt is built, and the usage the API
+    reported for it.
+    """
+
+    __slots__ = ("model", "sections", "prompt_tokens", "completion_tokens", "responded")
+
+    def __init__(self, model: str, **sections):
+        self.model = model
+        self.sections = dict.fromkeys(SECTIONS, 0)
+        self.sections.update(sections)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.responded = False
+
+    def set_response(self, usage):
+        """Takes prompt and completion tokens from a response's (or final stream chunk's) usage."""
+        self.responded = True
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens or 0
+            self.completion_tokens = usage.completion_tokens or 0
+
+    @property
+    def cost(self) -> float:
+        return price(self.model, self.prompt_tokens, self.completion_tokens)
+
+
+class _Totals:
+    __slots__ = _COLUMNS
+
+    def __init__(self, row=None):
+        for column, value in zip(_COLUMNS, row or (0,) * len(_COLUMNS)):
+            setattr(self, column, value)
+
+    def add(self, usage: PromptUsage):
+        self.requests += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        self.cost += usage.cost
+        for section, tokens in usage.sections.items():
+            column = f"est_{section}"
+            setattr(self, column, getattr(self, column) + tokens)
+
+    def row(self) -> tuple:
+        return tuple(getattr(self, column) for column in _COLUMNS)
+
+
+class UsageStore:
+    """
+    SQLite store of daily usage totals per guild, user and command. Methods
+    are blocking; callers on the event loop should run them through
+    asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = USAGE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def load_day(self, day: str) -> list:
+        """Returns (scope, key, *totals) rows saved for a day."""
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT scope, key, {', '.join(_COLUMNS)} FROM llm_usage WHERE day = ?", (day,)
+            ).fetchall()
+
+    def add(self, day: str, rows: list):
+        """Adds (scope, key, *deltas) rows onto the day's totals in a single transaction."""
+        updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in _COLUMNS)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO llm_usage (day, scope, key, {', '.join(_COLUMNS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(_COLUMNS))}) "
+                f"ON CONFLICT (day, scope, key) DO UPDATE SET {updates}",
+                [(day, *row) for row in rows],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class UsageTracker:
+    """
+    Today's LLM token usage and cost per guild, user and command, plus the
+    local per-section prompt estimates, saved to a UsageStore. Totals reset
+    at midnight UTC; the guild totals decide the budget state.
+    """
+
+    def __init__(self, store: UsageStore = None, soft_budget: float = GUILD_DAILY_SOFT_BUDGET,
+                 hard_budget: float = GUILD_DAILY_HARD_BUDGET):
+        self.store = store if store is not None else UsageStore(USAGE_DB_PATH)
+        self.soft_budget = soft_budget
+        self.hard_budget = hard_budget
+        self.day = _today()
+        self._totals = {}  # (scope, key) -> _Totals for today
+        self._pending = {}  # day -> {(scope, key) -> _Totals not yet written}
+        self._task = None
+        self.rejected = 0
+        self.reduced = 0
+        for scope, key, *row in self.store.load_day(self.day):
+            self._totals[(scope, key)] = _Totals(row)
+
+    def _roll_over(self):
+        day = _today()
+        if day != self.day:
+            # Unsaved deltas are keyed by day, so yesterday's are still written under it
+            self.day = day
+            self._totals = {}
+
+    def budget_state(self, guild_id: int) -> str:
+        """BUDGET_OK, BUDGET_REDUCED or BUDGET_EXCEEDED for the guild's spend today."""
+        if guild_id is None or not (self.soft_budget or self.hard_budget):
+            return BUDGET_OK
+        self._roll_over()
+        totals = self._totals.get(("guild", str(guild_id)))
+        spent = totals.cost if totals else 0.0
+        if self.hard_budget and spent >= self.hard_budget:
+            return BUDGET_EXCEEDED
+        if self.soft_budget and spent >= self.soft_budget:
+            return BUDGET_REDUCED
+        return BUDGET_OK
+
+    def record(self, guild_id: int, user_id: int, command: str, usage: PromptUsage):
+        """Adds one LLM call to the totals of its guild (None for DMs), user (None for background calls) and command."""
+        self._roll_over()
+        guild = str(guild_id) if guild_id is not None else "dm"
+        # Per-guild copies of the user and command totals back the guild-scoped report
+        keys = [
+            ("guild", guild),
+            ("command", command),
+            ("guild_command", f"{guild}:{command}"),
+        ]
+        if user_id is not None:
+            keys.append(("user", str(user_id)))
+            keys.append(("guild_user", f"{guild}:{user_id}"))
+        for key in keys:
+            totals = self._totals.get(key)
+            if totals is None:
+                totals = self._totals[key] = _Totals()
+            totals.add(usage)
+            pending = self._pending.setdefault(self.day, {}).get(key)
+            if pending is None:
+                pending = self._pending[self.day][key] = _Totals()
+            pending.add(usage)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        """Writes usage recorded since the last flush."""
+        pending, self._pending = self._pending, {}
+        for day, totals in pending.items():
+            rows = [(scope, key, *delta.row()) for (scope, key), delta in totals.items()]
+            try:
+                await asyncio.to_thread(self.store.add, day, rows)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to save LLM usage for {day}: {e}")
+
+    def top(self, scope: str, limit: int = 5, guild_id: int = None) -> list:
+        """Today's (key, _Totals) in a scope, most expensive first; guild_ scopes can be narrowed to one guild."""
+        self._roll_over()
+        prefix = f"{guild_id}:" if guild_id is not None else ""
+        items = [
+            (key[len(prefix):], totals)
+            for (item_scope, key), totals in self._totals.items()
+            if item_scope == scope and key.startswith(prefix)
+        ]
+        return sorted(items, key=lambda item: item[1].cost, reverse=True)[:limit]
+
+    @staticmethod
+    def _line(label: str, totals: _Totals) -> str:
+        return (
+            f"• {label}: {totals.requests} calls, {totals.prompt_tokens} prompt / "
+            f"{totals.completion_tokens} completion tokens, ${totals.cost:.4f}"
+        )
+
+    @staticmethod
+    def _estimate_line(command: str, totals: _Totals) -> str:
+        estimates = ", ".join(
+            f"{section} {getattr(totals, f'est_{section}') / totals.requests:.0f}" for section in SECTIONS
+        )
+        return f"• {command} prompt estimate per call: {estimates}"
+
+    def report_user(self, user_id: int) -> str:
+        """Renders one user's spend today, across all guilds."""
+        self._roll_over()
+        totals = self._totals.get(("user", str(user_id)))
+        if totals is None:
+            return "You haven't used the LLM today."
+        return f"**Your LLM usage** ({self.day} UTC)\n" + self._line("you", totals)
+
+    def report_guild(self, guild_id: int, limit: int = 3) -> str:
+        """Renders one guild's spend today, its budget state and its top users and commands."""
+        self._roll_over()
+        totals = self._totals.get(("guild", str(guild_id)))
+        spent = totals.cost if totals else 0.0
+        budgets = [f"soft ${self.soft_budget:.2f}"] if self.soft_budget else []
+        budgets += [f"hard ${self.hard_budget:.2f}"] if self.hard_budget else []
+        lines = [
+            f"**LLM usage for this server** ({self.day} UTC)",
+            f"• spent: ${spent:.4f} ({', '.join(budgets) or 'no budget'}), state {self.budget_state(guild_id)}",
+        ]
+        for user, user_totals in self.top("guild_user", limit, guild_id):
+            lines.append(self._line(f"<@{user}>", user_totals))
+        commands = self.top("guild_command", limit, guild_id)
+        for command, command_totals in commands:
+            lines.append(self._line(command, command_totals))
+        for command, command_totals in commands:
+            lines.append(self._estimate_line(command, command_totals))
+        return "\n".join(lines)
+
+    def report(self, limit: int = 3) -> str:
+        """Renders today's spend across all guilds, for the bot owner."""
+        self._roll_over()
+        lines = [f"**LLM usage, all servers** ({self.day} UTC)"]
+        for scope in ("guild", "user", "command"):
+            for key, totals in self.top(scope, limit):
+                lines.append(self._line(f"{scope} {key}", totals))
+        for command, totals in self.top("command", limit):
+            lines.append(self._estimate_line(command, totals))
+        lines.append(f"• budget: {self.reduced} reduced, {self.rejected} rejected")
+        return "\n".join(lines)